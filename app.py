@@ -3,53 +3,135 @@
 from elastic_fluent_bit_kibana.stacks.back_end.vpc_stack import VpcStack
 from elastic_fluent_bit_kibana.stacks.back_end.cognito_for_es_stack import CognitoForEsStack
 from elastic_fluent_bit_kibana.stacks.back_end.elasticsearch_stack import ElasticSearchStack
+from elastic_fluent_bit_kibana.stacks.back_end.elasticsearch_stack import ImportedElasticSearch
+from elastic_fluent_bit_kibana.stacks.back_end.fluent_bit_ami_stack import FluentBitAmiStack
+from elastic_fluent_bit_kibana.stacks.back_end.fluent_bit_ami_stack import GlobalArgs as AmiArgs
 from elastic_fluent_bit_kibana.stacks.back_end.fluent_bit_on_ec2_stack import FluentBitOnEc2Stack
+from elastic_fluent_bit_kibana.stacks.back_end.fluent_bit_aggregator_stack import FluentBitAggregatorStack
+from elastic_fluent_bit_kibana.stacks.back_end.fluent_bit_aggregator_stack import ImportedFluentBitAggregator
+from elastic_fluent_bit_kibana.stacks.stack_selection import selected_stacks
 
 
 from aws_cdk import core
 
 app = core.App()
 
+# Only the stacks in `-c stacks=...` are built, the rest are imported from SSM
+stacks = selected_stacks(app.node.try_get_context("stacks"))
+es_domain_name = "yen-theydal"
+
 
 # VPC Stack for hosting Secure API & Other resources
-vpc_stack = VpcStack(
-    app,
-    f"{app.node.try_get_context('service_name')}-vpc-stack",
-    stack_log_level="INFO",
-    description="Miztiik Automation: Custom Multi-AZ VPC"
-)
+vpc_stack = None
+if "vpc" in stacks:
+    vpc_stack = VpcStack(
+        app,
+        f"{app.node.try_get_context('service_name')}-vpc-stack",
+        stack_log_level="INFO",
+        description="Miztiik Automation: Custom Multi-AZ VPC"
+    )
 
 # Deploy Cognito User Pool to provide secure access to ElasticSearch
-cognito_for_es = CognitoForEsStack(
-    app,
-    f"{app.node.try_get_context('service_name')}-cognito-for-stack",
-    cognito_prefix="miztiik-automation",
-    stack_log_level="INFO",
-    description="Miztiik Automation: Deploy Cognito User Pool to provide secure access to ElasticSearch"
-)
+cognito_for_es = None
+if "cognito" in stacks:
+    cognito_for_es = CognitoForEsStack(
+        app,
+        f"{app.node.try_get_context('service_name')}-cognito-for-stack",
+        cognito_prefix="miztiik-automation",
+        stack_log_level="INFO",
+        description="Miztiik Automation: Deploy Cognito User Pool to provide secure access to ElasticSearch"
+    )
 
 # Deploy Elasticsearch
-log_search_in_es = ElasticSearchStack(
-    app,
-    f"{app.node.try_get_context('service_name')}-es-stack",
-    vpc=vpc_stack,
-    cognito_for_es=cognito_for_es,
-    es_domain_name="yen-theydal",
-    stack_log_level="INFO",
-    description="Miztiik Automation: Deploy Elasticsearch"
-)
+log_search_in_es = ImportedElasticSearch(es_domain_name)
+if "es" in stacks:
+    log_search_in_es = ElasticSearchStack(
+        app,
+        f"{app.node.try_get_context('service_name')}-es-stack",
+        vpc=vpc_stack,
+        cognito_for_es=cognito_for_es,
+        es_domain_name=es_domain_name,
+        index_lifecycle=app.node.try_get_context("index_lifecycle"),
+        index_template=app.node.try_get_context("index_template"),
+        index_rollups=app.node.try_get_context("index_rollups"),
+        domain_sizing=app.node.try_get_context("domain_sizing"),
+        stack_log_level="INFO",
+        description="Miztiik Automation: Deploy Elasticsearch"
+    )
+
+# Bake Fluent Bit & the CW Agent into the router AMI with EC2 Image Builder
+router_ami_cfg = app.node.try_get_context("router_ami") or {}
+router_ami = None
+if router_ami_cfg.get("enabled") and "router-ami" in stacks:
+    router_ami = FluentBitAmiStack(
+        app,
+        f"{app.node.try_get_context('service_name')}-router-ami-stack",
+        vpc=vpc_stack.vpc if vpc_stack else None,
+        instance_type=router_ami_cfg.get("instance_type", "t3.small"),
+        revision=int(router_ami_cfg.get("revision", 1)),
+        stack_log_level="INFO",
+        description="Miztiik Automation: Bake the Fluent Bit log router AMI"
+    )
+
+# Deploy FluentBit Aggregators behind an internal NLB, routers forward to them
+log_aggregator_cfg = app.node.try_get_context("log_aggregator") or {}
+fluent_bit_aggregator = None
+if log_aggregator_cfg.get("enabled") and "fluent-bit-aggregator" in stacks:
+    fluent_bit_aggregator = FluentBitAggregatorStack(
+        app,
+        f"{app.node.try_get_context('service_name')}-fluent-bit-aggregator-stack",
+        vpc=vpc_stack.vpc if vpc_stack else None,
+        ec2_instance_type=log_aggregator_cfg.get("instance_type", "t3.small"),
+        es_endpoint_param_name=log_search_in_es.es_endpoint_param_name,
+        es_region_param_name=log_search_in_es.es_region_param_name,
+        es_domain_name=log_search_in_es.es_domain_name,
+        fluent_bit_durable_buffering=str(app.node.try_get_context(
+            "fluent_bit_durable_buffering")).lower() != "false",
+        min_capacity=int(log_aggregator_cfg.get("min_capacity", 2)),
+        max_capacity=int(log_aggregator_cfg.get("max_capacity", 4)),
+        backlog_chunks_target=int(log_aggregator_cfg.get("backlog_chunks_target", 128)),
+        retries_scale_out_threshold=int(log_aggregator_cfg.get("retries_scale_out_threshold", 100)),
+        es_tuning=app.node.try_get_context("es_output"),
+        config_rollout=app.node.try_get_context("config_rollout"),
+        stack_log_level="INFO",
+        description="Miztiik Automation: Deploy FluentBit Aggregators behind an internal NLB"
+    )
+elif log_aggregator_cfg.get("enabled"):
+    fluent_bit_aggregator = ImportedFluentBitAggregator()
 
 # Deploy FluentBit on EC2
-fluent_bit_on_ec2 = FluentBitOnEc2Stack(
-    app,
-    f"{app.node.try_get_context('service_name')}-fluent-bit-on-ec2-stack",
-    vpc=vpc_stack.vpc,
-    ec2_instance_type="t2.micro",
-    es_endpoint_param_name=log_search_in_es.es_endpoint_param_name,
-    es_region_param_name=log_search_in_es.es_region_param_name,
-    stack_log_level="INFO",
-    description="Miztiik Automation: Deploy FluentBit on EC2"
-)
+if "fluent-bit" in stacks:
+    fluent_bit_on_ec2 = FluentBitOnEc2Stack(
+        app,
+        f"{app.node.try_get_context('service_name')}-fluent-bit-on-ec2-stack",
+        vpc=vpc_stack.vpc if vpc_stack else None,
+        ec2_instance_type="t2.micro",
+        es_endpoint_param_name=log_search_in_es.es_endpoint_param_name,
+        es_region_param_name=log_search_in_es.es_region_param_name,
+        es_domain_name=log_search_in_es.es_domain_name,
+        fluent_bit_profile=app.node.try_get_context("fluent_bit_profile") or "default",
+        fluent_bit_durable_buffering=str(app.node.try_get_context(
+            "fluent_bit_durable_buffering")).lower() != "false",
+        router_fleet=app.node.try_get_context("router_fleet"),
+        ingest_canary=str(app.node.try_get_context("ingest_canary")).lower() == "true",
+        es_tuning=app.node.try_get_context("es_output"),
+        delivery=app.node.try_get_context("delivery"),
+        log_archive=app.node.try_get_context("log_archive"),
+        config_rollout=app.node.try_get_context("config_rollout"),
+        multiline=app.node.try_get_context("multiline"),
+        sampling=app.node.try_get_context("sampling"),
+        log_metrics=app.node.try_get_context("log_metrics"),
+        router_ami_param_name=AmiArgs.ROUTER_AMI_PARAM_NAME if router_ami_cfg.get("enabled") else None,
+        aggregator_endpoint_param_name=(
+            fluent_bit_aggregator.get_aggregator_endpoint_param_name if fluent_bit_aggregator else None
+        ),
+        stack_log_level="INFO",
+        description="Miztiik Automation: Deploy FluentBit on EC2"
+    )
+    if isinstance(fluent_bit_aggregator, core.Stack):
+        fluent_bit_on_ec2.add_dependency(fluent_bit_aggregator)
+    if router_ami:
+        fluent_bit_on_ec2.add_dependency(router_ami)
 
 
 # Stack Level Tagging
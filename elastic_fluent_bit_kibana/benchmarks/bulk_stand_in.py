@@ -0,0 +1,318 @@
+import argparse
+import asyncio
+import gzip
+import json
+import re
+import time
+
+from elastic_fluent_bit_kibana.benchmarks.stats import rate
+from elastic_fluent_bit_kibana.benchmarks.stats import summarize_latencies_ms
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    HOST = "127.0.0.1"
+    PORT = 9200
+    # Fluent Bit may escape `/` as `\/` when it packs the record to JSON
+    MARKER_PATTERN = re.compile(
+        rb"\\?/bench\\?/(?P<run>[\w-]+)\\?/(?P<seq>\d+)\?t=(?P<emit_ns>\d+)")
+    CLUSTER_INFO = {
+        "name": "bulk-stand-in",
+        "cluster_name": "miztiik-automation-local",
+        "version": {"number": "7.9.1", "lucene_version": "8.6.2"},
+        "tagline": "You Know, for Search",
+    }
+
+
+def marker_of(source: bytes):
+    """
+    :return: ((run_id, seq), emit_ns) of a generated line, (None, None) for other documents
+    """
+    marker = GlobalArgs.MARKER_PATTERN.search(source)
+    if marker is None:
+        return None, None
+    return (marker.group("run").decode(), int(marker.group("seq"))), int(marker.group("emit_ns"))
+
+
+REJECTED_EXECUTION_ERROR = {
+    "type": "es_rejected_execution_exception",
+    # What a `t3.small` data node answers once its write queue of 200 is full
+    "reason": "rejected execution of processing of [indices:data/write/bulk[s][p]] on "
+              "EsThreadPoolExecutor[name = data-node/write, queue capacity = 200, "
+              "active threads = 2, queued tasks = 200]",
+}
+
+
+# A search over an empty index, so query tools can run against the stand-in
+EMPTY_SEARCH_RESPONSE = {
+    "took": 0,
+    "timed_out": False,
+    "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+    "hits": {"total": {"value": 0, "relation": "eq"}, "max_score": None, "hits": []},
+}
+
+
+class BulkStats:
+    """
+    What the stand-in saw, keyed by the `/bench/<run>/<seq>` marker in each document
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.records = 0
+        self.rejected = 0
+        self.bytes = 0
+        self.wire_bytes = 0
+        self.latencies_ns = []
+        self.attempts = {}
+        self.deliveries = {}
+        self.first_at = None
+        self.last_at = None
+
+    def record_document(self, source: bytes, received_ns: int, indexed: bool = True):
+        """
+        :param indexed: False when the document was rejected, so only the attempt counts
+        """
+        key, emit_ns = marker_of(source)
+        if key is not None:
+            self.attempts[key] = self.attempts.get(key, 0) + 1
+        if not indexed:
+            self.rejected += 1
+            return
+        self.records += 1
+        if key is None:
+            return
+        self.deliveries[key] = self.deliveries.get(key, 0) + 1
+        if self.deliveries[key] == 1:
+            self.latencies_ns.append(received_ns - emit_ns)
+
+    @property
+    def unique_records(self) -> int:
+        return len(self.deliveries)
+
+    @property
+    def retried_records(self) -> int:
+        """
+        Sends of a record after its first attempt, whatever happened to it
+        """
+        return sum(n - 1 for n in self.attempts.values())
+
+    @property
+    def duplicate_records(self) -> int:
+        """
+        Extra copies indexed because a retry re-sent records that had already been accepted
+        """
+        return sum(n - 1 for n in self.deliveries.values())
+
+    def report(self) -> dict:
+        seconds = (self.last_at - self.first_at) if self.first_at else 0.0
+        return {
+            "bulk_requests": self.requests,
+            "records_indexed": self.records,
+            "records_rejected": self.rejected,
+            "unique_records": self.unique_records,
+            "retried_records": self.retried_records,
+            "duplicate_records": self.duplicate_records,
+            "records_per_sec": rate(self.records, seconds),
+            "bytes_per_sec": rate(self.bytes, seconds),
+            "wire_bytes_per_sec": rate(self.wire_bytes, seconds),
+            "avg_docs_per_bulk": rate(self.records, self.requests),
+            "avg_bulk_kb": rate(self.bytes / 1024.0, self.requests),
+            "avg_wire_bulk_kb": rate(self.wire_bytes / 1024.0, self.requests),
+            "latency": summarize_latencies_ms(self.latencies_ns),
+        }
+
+
+class ConnectionReset(Exception):
+    """
+    Raised while handling a request to drop the client connection without a response
+    """
+
+
+class HttpRequest:
+    def __init__(self, method: str, path: str, headers: dict, body: bytes):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+
+async def read_request(reader: asyncio.StreamReader):
+    """
+    Minimal HTTP/1.1 request parser, enough for Fluent Bit & curl.
+    :return: HttpRequest, None when the client closed the connection
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        body = b""
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            body += await reader.readexactly(size)
+            await reader.readline()
+    else:
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return HttpRequest(method, path, headers, body)
+
+
+def write_response(writer: asyncio.StreamWriter, status: int, payload: dict, reason: str = "OK"):
+    body = json.dumps(payload).encode()
+    writer.write(
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Type: application/json; charset=UTF-8\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+
+
+def parse_bulk(body: bytes) -> list:
+    """
+    :return: List of (action, metadata, source bytes) from a `_bulk` NDJSON body
+    """
+    operations = []
+    lines = iter(body.splitlines())
+    for line in lines:
+        if not line.strip():
+            continue
+        header = json.loads(line)
+        action, metadata = next(iter(header.items()))
+        source = next(lines, b"") if action != "delete" else b""
+        operations.append((action, metadata, source))
+    return operations
+
+
+class BulkStandIn:
+    """
+    Local stand-in for the Elasticsearch `_bulk` API. It acknowledges every
+    document and measures throughput & end to end latency of the generated lines.
+    """
+
+    def __init__(self, host: str = GlobalArgs.HOST, port: int = GlobalArgs.PORT):
+        self.host = host
+        self.port = port
+        self.stats = BulkStats()
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        # Port 0 asks the OS for a free port
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                await self.dispatch(request, writer)
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except ConnectionReset:
+            writer.transport.abort()
+            return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        writer.close()
+
+    async def dispatch(self, request: HttpRequest, writer: asyncio.StreamWriter):
+        if request.path.split("?")[0].endswith("/_bulk"):
+            status, payload = await self.handle_bulk(request)
+            write_response(writer, status, payload)
+        elif request.path.split("?")[0].endswith("/_search"):
+            write_response(writer, 200, EMPTY_SEARCH_RESPONSE)
+        elif request.path.split("?")[0] == "/":
+            write_response(writer, 200, GlobalArgs.CLUSTER_INFO)
+        else:
+            write_response(writer, 200, {"acknowledged": True})
+
+    def decode_bulk(self, request: HttpRequest) -> list:
+        """
+        Account for the request on the wire and parse its operations
+        """
+        body = request.body
+        self.stats.wire_bytes += len(body)
+        if request.headers.get("content-encoding", "").lower() == "gzip":
+            body = gzip.decompress(body)
+        self.stats.requests += 1
+        self.stats.bytes += len(body)
+        now = time.time()
+        self.stats.first_at = self.stats.first_at or now
+        self.stats.last_at = now
+        return parse_bulk(body)
+
+    def bulk_response(self, operations: list, received_ns: int, reject_item=None) -> dict:
+        """
+        :param reject_item: Optional callable, True for items to fail with a 429
+        :return: `_bulk` response body, with per item results
+        """
+        items = []
+        for action, metadata, source in operations:
+            rejected = reject_item is not None and reject_item()
+            self.stats.record_document(source, received_ns, indexed=not rejected)
+            result = {
+                "_index": metadata.get("_index", "miztiik_automation"),
+                "_type": metadata.get("_type", "_doc"),
+            }
+            if rejected:
+                result.update({"status": 429, "error": REJECTED_EXECUTION_ERROR})
+            else:
+                result.update({"result": "created", "status": 201})
+            items.append({action: result})
+        took = int((time.time() * 1e9 - received_ns) / 1e6)
+        errors = any(next(iter(i.values()))["status"] >= 300 for i in items)
+        return {"took": took, "errors": errors, "items": items}
+
+    async def handle_bulk(self, request: HttpRequest):
+        received_ns = int(time.time() * 1e9)
+        operations = self.decode_bulk(request)
+        return 200, self.bulk_response(operations, received_ns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Elasticsearch `_bulk` stand-in")
+    parser.add_argument("--host", default=GlobalArgs.HOST)
+    parser.add_argument("--port", type=int, default=GlobalArgs.PORT)
+    parser.add_argument("--report-every", type=float, default=10)
+    args = parser.parse_args()
+
+    async def serve():
+        stand_in = await BulkStandIn(args.host, args.port).start()
+        print(f"Listening on http://{args.host}:{args.port}")
+        while True:
+            await asyncio.sleep(args.report_every)
+            print(json.dumps(stand_in.stats.report()))
+
+    try:
+        asyncio.new_event_loop().run_until_complete(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+
+from elastic_fluent_bit_kibana.benchmarks.pipeline_benchmark import GlobalArgs as BenchmarkArgs
+from elastic_fluent_bit_kibana.benchmarks.pipeline_benchmark import run_benchmark
+from elastic_fluent_bit_kibana.fluent_bit.profiles import PIPELINE_PROFILES
+from elastic_fluent_bit_kibana.fluent_bit.router_config import build_router_pipeline
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    CONTEXT_KEY = "es_output"
+    # Around the middle of the 5-15MB bulk size Elasticsearch recommends,
+    # leaves heap to spare on the small data nodes
+    MAX_BULK_KB = 5120
+
+
+def tuning_grid(flushes: list, workers: list, compresses: list) -> list:
+    return [
+        {"flush": f, "workers": w, "compress": c}
+        for f, w, c in itertools.product(flushes, workers, compresses)
+    ]
+
+
+def score(report: dict, max_bulk_kb: float, max_p99_ms: float = None):
+    """
+    Fewest & fullest `_bulk` requests wins, then the fewest bytes on the wire,
+    then the lowest p99 latency.
+    :return: Sort key, lower is better. None when the run lost records or broke a limit.
+    """
+    delivered = report["delivered"]
+    p99_ms = delivered["latency"]["p99_ms"]
+    if report["missing_records"] > 0 or not delivered["bulk_requests"] or p99_ms is None:
+        return None
+    if delivered["avg_bulk_kb"] > max_bulk_kb:
+        return None
+    if max_p99_ms is not None and p99_ms > max_p99_ms:
+        return None
+    return (-delivered["avg_docs_per_bulk"], delivered["wire_bytes_per_sec"], p99_ms)
+
+
+async def sweep(
+    grid: list,
+    profile: str,
+    rate_spec: str,
+    duration: float,
+    work_dir: str,
+    fluent_bit_bin: str,
+    drain_timeout: float
+) -> list:
+    """
+    Benchmark every setting of the grid, one after the other, each with a
+    fresh agent, stand-in & work dir
+    """
+    results = []
+    for i, tuning in enumerate(grid):
+        pipeline = build_router_pipeline(
+            es_endpoint="127.0.0.1",
+            es_region="local",
+            profile=profile,
+            es_tuning=tuning
+        )
+        report = await run_benchmark(
+            profile=profile,
+            rate_spec=rate_spec,
+            duration=duration,
+            work_dir=os.path.join(work_dir, f"run-{i}"),
+            port=0,
+            fluent_bit_bin=fluent_bit_bin,
+            drain_timeout=drain_timeout,
+            pipeline=pipeline
+        )
+        report["tuning"] = tuning
+        results.append(report)
+    return results
+
+
+def write_context(cdk_json_path: str, tuning: dict):
+    """
+    Store the chosen tuning in the `es_output` context key of `cdk.json`,
+    the next `cdk deploy` renders it into the pipeline
+    """
+    with open(cdk_json_path, encoding="utf-8") as f:
+        cdk_json = json.load(f)
+    cdk_json.setdefault("context", {})[GlobalArgs.CONTEXT_KEY] = tuning
+    with open(cdk_json_path, encoding="utf-8", mode="w") as f:
+        f.write(json.dumps(cdk_json, indent=2) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sweep flush interval, workers & compression of the es output against the `_bulk` stand-in")
+    parser.add_argument("--profile", default="default", choices=sorted(PIPELINE_PROFILES))
+    parser.add_argument("--rate", default="constant:2000")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--drain-timeout", type=float, default=BenchmarkArgs.DRAIN_TIMEOUT_SECONDS)
+    parser.add_argument("--flush", default="1,3,5", help="Comma separated Flush seconds")
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated es output Workers")
+    parser.add_argument("--compress", default="gzip,none", help="Comma separated, gzip or none")
+    parser.add_argument("--max-bulk-kb", type=int, default=GlobalArgs.MAX_BULK_KB,
+                        help="Skip settings whose average _bulk request is larger")
+    parser.add_argument("--max-p99-ms", type=float, default=None,
+                        help="Skip settings whose p99 log to indexed latency is higher")
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--fluent-bit-bin", default=BenchmarkArgs.FLUENT_BIT_BIN)
+    parser.add_argument("--write-context", metavar="CDK_JSON", default=None,
+                        help="Write the best settings to the es_output context key of this cdk.json")
+    args = parser.parse_args()
+
+    grid = tuning_grid(
+        flushes=[float(f) if "." in f else int(f) for f in args.flush.split(",")],
+        workers=[int(w) for w in args.workers.split(",")],
+        compresses=args.compress.split(",")
+    )
+    results = asyncio.new_event_loop().run_until_complete(sweep(
+        grid,
+        profile=args.profile,
+        rate_spec=args.rate,
+        duration=args.duration,
+        work_dir=args.work_dir or tempfile.mkdtemp(prefix="flb-bulk-tuning-"),
+        fluent_bit_bin=args.fluent_bit_bin,
+        drain_timeout=args.drain_timeout
+    ))
+
+    ranked = sorted(
+        (r for r in results if score(r, args.max_bulk_kb, args.max_p99_ms) is not None),
+        key=lambda r: score(r, args.max_bulk_kb, args.max_p99_ms)
+    )
+    summary = [{
+        "tuning": r["tuning"],
+        "missing_records": r["missing_records"],
+        "bulk_requests": r["delivered"]["bulk_requests"],
+        "avg_docs_per_bulk": r["delivered"]["avg_docs_per_bulk"],
+        "avg_bulk_kb": r["delivered"]["avg_bulk_kb"],
+        "avg_wire_bulk_kb": r["delivered"]["avg_wire_bulk_kb"],
+        "p99_ms": r["delivered"]["latency"]["p99_ms"],
+        "eligible": r in ranked,
+    } for r in results]
+    best = ranked[0]["tuning"] if ranked else None
+    print(json.dumps({
+        "profile": args.profile,
+        "rate": args.rate,
+        "max_bulk_kb": args.max_bulk_kb,
+        "results": summary,
+        "best": best
+    }, indent=2))
+
+    if best is None:
+        raise SystemExit("No setting delivered every record within the limits, nothing written")
+    if args.write_context:
+        write_context(args.write_context, best)
+        print(f"Wrote {GlobalArgs.CONTEXT_KEY} to {args.write_context}")
+
+
+if __name__ == "__main__":
+    main()
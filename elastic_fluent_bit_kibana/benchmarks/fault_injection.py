@@ -0,0 +1,174 @@
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+
+from elastic_fluent_bit_kibana.benchmarks.bulk_stand_in import BulkStandIn
+from elastic_fluent_bit_kibana.benchmarks.bulk_stand_in import ConnectionReset
+from elastic_fluent_bit_kibana.benchmarks.bulk_stand_in import HttpRequest
+from elastic_fluent_bit_kibana.benchmarks.bulk_stand_in import REJECTED_EXECUTION_ERROR
+from elastic_fluent_bit_kibana.benchmarks.bulk_stand_in import write_response
+from elastic_fluent_bit_kibana.benchmarks.pipeline_benchmark import GlobalArgs as BenchmarkArgs
+from elastic_fluent_bit_kibana.benchmarks.pipeline_benchmark import run_benchmark
+from elastic_fluent_bit_kibana.fluent_bit.profiles import PIPELINE_PROFILES
+
+
+# reject:         the whole `_bulk` request gets a 429 es_rejected_execution_exception
+# partial:        the request succeeds but this fraction of items get a 429
+# slow:           the response is delayed by `value` seconds
+# reset:          the connection is reset before any document is indexed
+# lost-response:  documents are indexed, then the connection is reset before the answer
+FAULT_KINDS = ("reject", "partial", "slow", "reset", "lost-response")
+
+
+class FaultWindow:
+    """
+    Inject `kind` between `start` & `end` seconds after the stand-in started.
+    `value` is the probability per request, the fraction of failed items for
+    `partial` or the delay in seconds for `slow`.
+    """
+
+    def __init__(self, kind: str, start: float, end: float, value: float):
+        if kind not in FAULT_KINDS:
+            raise ValueError(f"Unknown fault '{kind}', choose one of {FAULT_KINDS}")
+        if end <= start:
+            raise ValueError(f"Fault window {kind}@{start}-{end} ends before it starts")
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.value = value
+
+    def active(self, elapsed: float) -> bool:
+        return self.start <= elapsed < self.end
+
+
+def parse_fault_schedule(spec: str) -> list:
+    """
+    :param spec: Comma separated `<kind>@<start_s>-<end_s>:<value>`, for example
+        `reject@10-20:0.5,partial@20-40:0.3,slow@40-50:2.5,reset@50-55:0.2`
+    """
+    windows = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        try:
+            kind, rest = part.split("@")
+            span, value = rest.split(":")
+            start, end = span.split("-")
+            windows.append(FaultWindow(kind, float(start), float(end), float(value)))
+        except ValueError as e:
+            raise ValueError(f"Invalid fault '{part}': {e}")
+    return windows
+
+
+class FaultInjectingBulkStandIn(BulkStandIn):
+    """
+    `_bulk` stand-in that misbehaves like an overloaded domain on a schedule,
+    to see how the router's retries, buffers & limits cope with backpressure.
+    """
+
+    def __init__(self, schedule: list, seed: int = None, **kwargs):
+        super().__init__(**kwargs)
+        self.schedule = schedule
+        self.random = random.Random(seed)
+        self.started = None
+        self.injected = {kind: 0 for kind in FAULT_KINDS}
+
+    async def start(self):
+        self.started = time.time()
+        return await super().start()
+
+    def active_faults(self) -> list:
+        elapsed = time.time() - self.started
+        return [w for w in self.schedule if w.active(elapsed)]
+
+    def _hit(self, window: FaultWindow) -> bool:
+        return self.random.random() < window.value
+
+    async def dispatch(self, request: HttpRequest, writer):
+        if not request.path.split("?")[0].endswith("/_bulk"):
+            return await super().dispatch(request, writer)
+
+        received_ns = int(time.time() * 1e9)
+        faults = {w.kind: w for w in self.active_faults()}
+
+        if "slow" in faults:
+            self.injected["slow"] += 1
+            await asyncio.sleep(faults["slow"].value)
+
+        if "reset" in faults and self._hit(faults["reset"]):
+            self.injected["reset"] += 1
+            raise ConnectionReset()
+
+        operations = self.decode_bulk(request)
+
+        if "reject" in faults and self._hit(faults["reject"]):
+            self.injected["reject"] += 1
+            for _, _, source in operations:
+                self.stats.record_document(source, received_ns, indexed=False)
+            write_response(writer, 429, {"error": {
+                "root_cause": [REJECTED_EXECUTION_ERROR],
+                **REJECTED_EXECUTION_ERROR
+            }, "status": 429}, reason="Too Many Requests")
+            return
+
+        reject = None
+        if "partial" in faults:
+            self.injected["partial"] += 1
+            fraction = faults["partial"].value
+
+            def _reject():
+                return self.random.random() < fraction
+            reject = _reject
+
+        payload = self.bulk_response(operations, received_ns, reject_item=reject)
+
+        if "lost-response" in faults and self._hit(faults["lost-response"]):
+            self.injected["lost-response"] += 1
+            raise ConnectionReset()
+
+        write_response(writer, 200, payload)
+
+    def report(self) -> dict:
+        return {
+            "faults_injected": dict(self.injected),
+            "schedule": [f"{w.kind}@{w.start:g}-{w.end:g}:{w.value:g}" for w in self.schedule],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the router pipeline against a `_bulk` stand-in that injects faults")
+    parser.add_argument("--faults", required=True,
+                        help="for example reject@10-20:0.5,partial@20-40:0.3,slow@40-50:2.5,reset@50-55:0.2")
+    parser.add_argument("--profile", default="default", choices=sorted(PIPELINE_PROFILES))
+    parser.add_argument("--rate", default="constant:500")
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--drain-timeout", type=float, default=120)
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--fluent-bit-bin", default=BenchmarkArgs.FLUENT_BIT_BIN)
+    parser.add_argument("--memory-buffering", action="store_true")
+    args = parser.parse_args()
+
+    stand_in = FaultInjectingBulkStandIn(
+        parse_fault_schedule(args.faults), seed=args.seed, port=args.port)
+    report = asyncio.new_event_loop().run_until_complete(run_benchmark(
+        profile=args.profile,
+        rate_spec=args.rate,
+        duration=args.duration,
+        work_dir=args.work_dir or tempfile.mkdtemp(prefix="flb-faults-"),
+        port=args.port,
+        fluent_bit_bin=args.fluent_bit_bin,
+        durable_buffering=not args.memory_buffering,
+        drain_timeout=args.drain_timeout,
+        stand_in=stand_in
+    ))
+    report.update(stand_in.report())
+    report["dropped_records"] = report.pop("missing_records")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
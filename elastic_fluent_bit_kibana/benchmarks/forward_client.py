@@ -0,0 +1,108 @@
+import asyncio
+import struct
+import time
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    HOST = "127.0.0.1"
+    PORT = 24224
+
+
+def packb(obj) -> bytes:
+    """
+    Minimal MessagePack encoder for the types found in log records, so the
+    tools do not need the `msgpack` package.
+    Ref: https://github.com/msgpack/msgpack/blob/master/spec.md
+    """
+    if obj is None:
+        return b"\xc0"
+    if obj is True:
+        return b"\xc3"
+    if obj is False:
+        return b"\xc2"
+    if isinstance(obj, EventTime):
+        return b"\xd7\x00" + struct.pack(">II", obj.seconds, obj.nanoseconds)
+    if isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            return struct.pack("B", obj)
+        if -0x20 <= obj < 0:
+            return struct.pack("b", obj)
+        if 0 <= obj <= 0xFFFFFFFFFFFFFFFF:
+            return b"\xcf" + struct.pack(">Q", obj)
+        return b"\xd3" + struct.pack(">q", obj)
+    if isinstance(obj, float):
+        return b"\xcb" + struct.pack(">d", obj)
+    if isinstance(obj, str):
+        data = obj.encode("utf-8")
+        size = len(data)
+        if size < 32:
+            return struct.pack("B", 0xA0 | size) + data
+        if size <= 0xFF:
+            return b"\xd9" + struct.pack("B", size) + data
+        if size <= 0xFFFF:
+            return b"\xda" + struct.pack(">H", size) + data
+        return b"\xdb" + struct.pack(">I", size) + data
+    if isinstance(obj, (bytes, bytearray)):
+        return b"\xc6" + struct.pack(">I", len(obj)) + bytes(obj)
+    if isinstance(obj, (list, tuple)):
+        size = len(obj)
+        head = struct.pack("B", 0x90 | size) if size < 16 else b"\xdd" + struct.pack(">I", size)
+        return head + b"".join(packb(o) for o in obj)
+    if isinstance(obj, dict):
+        size = len(obj)
+        head = struct.pack("B", 0x80 | size) if size < 16 else b"\xdf" + struct.pack(">I", size)
+        return head + b"".join(packb(f"{k}") + packb(v) for k, v in obj.items())
+    # Timestamps, decimals... anything else goes as its string form
+    return packb(f"{obj}")
+
+
+class EventTime:
+    """
+    Forward protocol EventTime extension (type 0), keeps sub-second precision
+    """
+
+    def __init__(self, epoch: float):
+        self.seconds = int(epoch)
+        self.nanoseconds = int(round((epoch - self.seconds) * 1e9)) % 1000000000
+
+
+class ForwardClient:
+    """
+    Send records to a Fluent Bit/Fluentd `forward` input in Forward mode,
+    `[tag, [[time, record], ...]]`, one message per batch.
+    Ref: https://github.com/fluent/fluentd/wiki/Forward-Protocol-Specification-v1
+    """
+
+    def __init__(self, host: str = GlobalArgs.HOST, port: int = GlobalArgs.PORT, tag: str = "replay"):
+        self.host = host
+        self.port = port
+        self.tag = tag
+        self._writer = None
+
+    async def connect(self):
+        _, self._writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def send(self, records: list, epoch: float = None) -> int:
+        """
+        :param records: List of dict records, or of (epoch, record) tuples
+        :return: Bytes written
+        """
+        now = time.time() if epoch is None else epoch
+        entries = [
+            [EventTime(r[0]), r[1]] if isinstance(r, tuple) else [EventTime(now), r]
+            for r in records
+        ]
+        payload = packb([self.tag, entries])
+        self._writer.write(payload)
+        await self._writer.drain()
+        return len(payload)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
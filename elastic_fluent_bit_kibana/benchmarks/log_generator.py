@@ -0,0 +1,208 @@
+import argparse
+import asyncio
+import os
+import random
+import time
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    ACCESS_LOG = "access_log"
+    ERROR_LOG = "error_log"
+    # Every generated line carries `/bench/<run_id>/<seq>?t=<emit_ns>` so the
+    # `_bulk` stand-in can match deliveries back to the line & its emit time
+    MARKER_PATH = "/bench/{run_id}/{seq}?t={emit_ns}"
+    TICK_SECONDS = 0.05
+
+
+USER_AGENTS = [
+    "Mozilla/5.0 (X11; Linux x86_64; rv:82.0) Gecko/20100101 Firefox/82.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.0 Safari/605.1.15",
+    "ApacheBench/2.3",
+    "curl/7.61.1",
+]
+REFERERS = ["-", "https://www.example.com/", "https://www.example.com/products"]
+# Weighted like a healthy site, `GenerateFailedTraffic` style 404s included
+STATUS_WEIGHTS = [(200, 80), (304, 6), (301, 3), (404, 8), (500, 2), (503, 1)]
+
+
+class ConstantRate:
+    def __init__(self, rate: float):
+        self.rate = float(rate)
+
+    def rate_at(self, elapsed: float, duration: float) -> float:
+        return self.rate
+
+
+class RampRate:
+    """
+    Linear ramp from `start` to `end` records/sec over the whole run
+    """
+
+    def __init__(self, start: float, end: float):
+        self.start = float(start)
+        self.end = float(end)
+
+    def rate_at(self, elapsed: float, duration: float) -> float:
+        progress = min(1.0, elapsed / duration) if duration > 0 else 1.0
+        return self.start + (self.end - self.start) * progress
+
+
+class BurstRate:
+    """
+    `base` records/sec with `burst` records/sec for `burst_seconds` of every `period`
+    """
+
+    def __init__(self, base: float, burst: float, period: float = 30, burst_seconds: float = 5):
+        self.base = float(base)
+        self.burst = float(burst)
+        self.period = float(period)
+        self.burst_seconds = float(burst_seconds)
+
+    def rate_at(self, elapsed: float, duration: float) -> float:
+        if elapsed % self.period < self.burst_seconds:
+            return self.burst
+        return self.base
+
+
+RATE_SHAPES = {
+    "constant": ConstantRate,
+    "ramp": RampRate,
+    "burst": BurstRate,
+}
+
+
+def parse_rate_shape(spec: str):
+    """
+    :param spec: `constant:<rps>`, `ramp:<start_rps>:<end_rps>` or
+        `burst:<base_rps>:<burst_rps>[:<period_s>[:<burst_s>]]`
+    """
+    name, *args = spec.split(":")
+    if name not in RATE_SHAPES:
+        raise ValueError(f"Unknown rate shape '{name}', choose one of {sorted(RATE_SHAPES)}")
+    try:
+        return RATE_SHAPES[name](*[float(a) for a in args])
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid rate shape '{spec}': {e}")
+
+
+def access_line(run_id: str, seq: int, emit_ns: int, rnd: random.Random) -> str:
+    status = rnd.choices([s for s, _ in STATUS_WEIGHTS], weights=[w for _, w in STATUS_WEIGHTS])[0]
+    path = GlobalArgs.MARKER_PATH.format(run_id=run_id, seq=seq, emit_ns=emit_ns)
+    ts = time.strftime("%d/%b/%Y:%H:%M:%S +0000", time.gmtime(emit_ns / 1e9))
+    size = "-" if status == 304 else rnd.randint(200, 20000)
+    return (
+        f'10.10.{rnd.randint(0, 255)}.{rnd.randint(1, 254)} - - [{ts}] "GET {path} HTTP/1.1" '
+        f'{status} {size} "{rnd.choice(REFERERS)}" "{rnd.choice(USER_AGENTS)}"\n'
+    )
+
+
+def error_line(run_id: str, seq: int, emit_ns: int, rnd: random.Random) -> str:
+    path = GlobalArgs.MARKER_PATH.format(run_id=run_id, seq=seq, emit_ns=emit_ns)
+    secs = emit_ns / 1e9
+    ts = time.strftime("%a %b %d %H:%M:%S", time.gmtime(secs)) + \
+        f".{int(secs % 1 * 1e6):06d} " + time.strftime("%Y", time.gmtime(secs))
+    return (
+        f"[{ts}] [core:error] [pid {rnd.randint(1000, 32000)}] "
+        f"[client 10.10.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}:{rnd.randint(1024, 65535)}] "
+        f"AH00128: File does not exist: /var/www/html{path}\n"
+    )
+
+
+class GeneratorStats:
+    def __init__(self):
+        self.records = 0
+        self.bytes = 0
+        self.per_file = {}
+        self.started = None
+        self.ended = None
+
+    def as_dict(self) -> dict:
+        return {
+            "records": self.records,
+            "bytes": self.bytes,
+            "per_file": dict(self.per_file),
+            "seconds": round((self.ended or time.time()) - (self.started or time.time()), 3),
+        }
+
+
+async def generate_logs(
+    target_dir: str,
+    shape,
+    duration: float,
+    run_id: str,
+    error_ratio: float = 0.05,
+    seed: int = None,
+    stats: GeneratorStats = None
+) -> GeneratorStats:
+    """
+    Append Apache style access & error lines to `target_dir` at the rate
+    given by `shape`, until `duration` seconds have passed.
+    :return: GeneratorStats of what was written
+    """
+    rnd = random.Random(seed)
+    stats = stats or GeneratorStats()
+    os.makedirs(target_dir, exist_ok=True)
+    files = {
+        name: open(os.path.join(target_dir, name), mode="a", encoding="utf-8")
+        for name in (GlobalArgs.ACCESS_LOG, GlobalArgs.ERROR_LOG)
+    }
+    loop = asyncio.get_event_loop()
+    stats.started = time.time()
+    start = loop.time()
+    owed = 0.0
+    last = start
+    try:
+        while True:
+            now = loop.time()
+            elapsed = now - start
+            if elapsed >= duration:
+                break
+            owed += shape.rate_at(elapsed, duration) * (now - last)
+            last = now
+            due = int(owed)
+            owed -= due
+            for _ in range(due):
+                emit_ns = int(time.time() * 1e9)
+                if rnd.random() < error_ratio:
+                    name, line = GlobalArgs.ERROR_LOG, error_line(run_id, stats.records, emit_ns, rnd)
+                else:
+                    name, line = GlobalArgs.ACCESS_LOG, access_line(run_id, stats.records, emit_ns, rnd)
+                files[name].write(line)
+                stats.records += 1
+                stats.bytes += len(line)
+                stats.per_file[name] = stats.per_file.get(name, 0) + 1
+            for f in files.values():
+                f.flush()
+            await asyncio.sleep(GlobalArgs.TICK_SECONDS)
+    finally:
+        stats.ended = time.time()
+        for f in files.values():
+            f.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write Apache access/error logs at a configurable rate")
+    parser.add_argument("--target-dir", default="/var/log/httpd")
+    parser.add_argument("--rate", default="constant:100", help="constant:<rps> | ramp:<a>:<b> | burst:<base>:<burst>[:<period>[:<len>]]")
+    parser.add_argument("--duration", type=float, default=60)
+    parser.add_argument("--error-ratio", type=float, default=0.05)
+    parser.add_argument("--run-id", default=f"run{int(time.time())}")
+    args = parser.parse_args()
+
+    stats = asyncio.new_event_loop().run_until_complete(generate_logs(
+        target_dir=args.target_dir,
+        shape=parse_rate_shape(args.rate),
+        duration=args.duration,
+        run_id=args.run_id,
+        error_ratio=args.error_ratio
+    ))
+    print(stats.as_dict())
+
+
+if __name__ == "__main__":
+    main()
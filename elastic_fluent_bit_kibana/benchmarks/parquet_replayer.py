@@ -0,0 +1,229 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from elastic_fluent_bit_kibana.benchmarks.forward_client import ForwardClient
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    SAMPLE_DATA = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "stacks", "back_end", "bootstrap_scripts", "sample_data",
+        "json-to-parquet_20Nov2020_1605900547837_part00000.parquet.snappy"
+    )
+    TIME_COLUMN = "timestamp"
+    BATCH_SIZE = 500
+    # Rows this far behind schedule are sent together instead of one by one
+    SEND_SLACK_SECONDS = 0.01
+
+
+def epoch_seconds(value) -> float:
+    """
+    Normalise epoch seconds, milliseconds, microseconds or nanoseconds to seconds
+    """
+    if hasattr(value, "timestamp"):
+        return value.timestamp()
+    value = float(value)
+    if value > 1e17:
+        return value / 1e9
+    if value > 1e14:
+        return value / 1e6
+    if value > 1e11:
+        return value / 1e3
+    return value
+
+
+def iter_parquet_batches(path: str, batch_size: int = GlobalArgs.BATCH_SIZE, columns: list = None):
+    """
+    Stream a Parquet file as lists of dict rows, holding one batch in memory at a time.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("The replayer needs pyarrow, install it with `pip3 install pyarrow`")
+
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        columns_ = batch.to_pydict()
+        names = list(columns_)
+        yield [dict(zip(names, row)) for row in zip(*columns_.values())]
+
+
+class TailFileSink:
+    """
+    Append rows as JSON lines to a file the router tails
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    async def open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, mode="a", encoding="utf-8")
+        return self
+
+    async def send(self, records: list) -> int:
+        data = "".join(json.dumps(r, default=str) + "\n" for _, r in records)
+        self._file.write(data)
+        self._file.flush()
+        return len(data)
+
+    async def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class ForwardSink:
+    """
+    Send rows to a `forward` input, stamped with their original timestamps
+    """
+
+    def __init__(self, host: str, port: int, tag: str):
+        self.client = ForwardClient(host, port, tag)
+
+    async def open(self):
+        await self.client.connect()
+        return self
+
+    async def send(self, records: list) -> int:
+        return await self.client.send(records)
+
+    async def close(self):
+        await self.client.close()
+
+
+class ReplayStats:
+    def __init__(self):
+        self.records = 0
+        self.bytes = 0
+        self.loops = 0
+        self.max_behind_seconds = 0.0
+        self.started = time.time()
+
+    def as_dict(self) -> dict:
+        seconds = time.time() - self.started
+        return {
+            "records": self.records,
+            "bytes": self.bytes,
+            "loops": self.loops,
+            "seconds": round(seconds, 3),
+            "records_per_sec": round(self.records / seconds, 2) if seconds else 0.0,
+            "max_behind_schedule_seconds": round(self.max_behind_seconds, 3),
+        }
+
+
+async def replay(
+    path: str,
+    sink,
+    speedup: float = 1.0,
+    loop: bool = False,
+    time_column: str = GlobalArgs.TIME_COLUMN,
+    batch_size: int = GlobalArgs.BATCH_SIZE,
+    max_records: int = None,
+    stats: ReplayStats = None
+) -> ReplayStats:
+    """
+    Replay rows at the pace of their original timestamps, `speedup` times faster.
+
+    The first row fixes time zero. Rows older than the replay clock, the
+    dataset is not sorted, go out straight away. In loop mode every pass is
+    shifted by the span of the previous one so time keeps moving forward.
+    """
+    if speedup <= 0:
+        raise ValueError("speedup must be greater than 0")
+    stats = stats or ReplayStats()
+    loop_clock = asyncio.get_event_loop()
+    wall_start = loop_clock.time()
+    offset = 0.0
+    first_ts = None
+
+    while True:
+        pass_first, pass_last = None, None
+        for rows in iter_parquet_batches(path, batch_size):
+            pending = []
+            for row in rows:
+                raw_ts = row.get(time_column)
+                if raw_ts is None:
+                    # Rows without a time go out with the previous one
+                    raw_ts = pass_last if pass_last is not None else time.time()
+                ts = epoch_seconds(raw_ts)
+                first_ts = ts if first_ts is None else first_ts
+                pass_first = ts if pass_first is None else min(pass_first, ts)
+                pass_last = ts if pass_last is None else max(pass_last, ts)
+                due = (ts - first_ts + offset) / speedup
+                ahead = due - (loop_clock.time() - wall_start)
+                if ahead > GlobalArgs.SEND_SLACK_SECONDS:
+                    if pending:
+                        stats.bytes += await sink.send(pending)
+                        pending = []
+                    await asyncio.sleep(ahead)
+                else:
+                    stats.max_behind_seconds = max(stats.max_behind_seconds, -ahead)
+                pending.append((ts + offset, row))
+                stats.records += 1
+                if max_records is not None and stats.records >= max_records:
+                    stats.bytes += await sink.send(pending)
+                    return stats
+            if pending:
+                stats.bytes += await sink.send(pending)
+        stats.loops += 1
+        if not loop or pass_first is None:
+            return stats
+        # +1s so the first row of the next pass does not collide with the last one
+        offset += pass_last - pass_first + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay the bundled Parquet sample to the router at its original pace")
+    parser.add_argument("--file", default=GlobalArgs.SAMPLE_DATA)
+    parser.add_argument("--sink", choices=("tail", "forward"), default="tail")
+    parser.add_argument("--tail-path", default="/var/log/httpd/parquet_replay_log")
+    parser.add_argument("--forward-host", default="127.0.0.1")
+    parser.add_argument("--forward-port", type=int, default=24224)
+    parser.add_argument("--tag", default="automate_log_replay")
+    parser.add_argument("--speedup", type=float, default=1.0)
+    parser.add_argument("--loop", action="store_true", help="Replay the file over and over")
+    parser.add_argument("--time-column", default=GlobalArgs.TIME_COLUMN)
+    parser.add_argument("--batch-size", type=int, default=GlobalArgs.BATCH_SIZE)
+    parser.add_argument("--max-records", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.sink == "tail":
+        sink = TailFileSink(args.tail_path)
+    else:
+        sink = ForwardSink(args.forward_host, args.forward_port, args.tag)
+
+    async def run():
+        await sink.open()
+        stats = ReplayStats()
+        try:
+            await replay(
+                args.file, sink,
+                speedup=args.speedup,
+                loop=args.loop,
+                time_column=args.time_column,
+                batch_size=args.batch_size,
+                max_records=args.max_records,
+                stats=stats
+            )
+        finally:
+            await sink.close()
+        return stats
+
+    try:
+        stats = asyncio.new_event_loop().run_until_complete(run())
+        print(json.dumps(stats.as_dict()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
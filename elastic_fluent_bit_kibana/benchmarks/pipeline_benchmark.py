@@ -0,0 +1,182 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import tempfile
+import time
+
+from elastic_fluent_bit_kibana.benchmarks.bulk_stand_in import BulkStandIn
+from elastic_fluent_bit_kibana.benchmarks.log_generator import GeneratorStats
+from elastic_fluent_bit_kibana.benchmarks.log_generator import generate_logs
+from elastic_fluent_bit_kibana.benchmarks.log_generator import parse_rate_shape
+from elastic_fluent_bit_kibana.fluent_bit.profiles import PIPELINE_PROFILES
+from elastic_fluent_bit_kibana.fluent_bit.router_config import build_router_pipeline
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    FLUENT_BIT_BIN = "fluent-bit"
+    STARTUP_SECONDS = 2
+    DRAIN_TIMEOUT_SECONDS = 60
+
+
+def localize_router_pipeline(pipeline, work_dir: str, host: str, port: int):
+    """
+    Point the router pipeline from `FluentBitOnEc2Stack` at a local tail
+    directory & `_bulk` stand-in, keeping every tuning setting as is.
+    :param pipeline: FluentBitPipeline built by `build_router_pipeline`
+    :return: The same pipeline, to allow chaining
+    """
+    logs_dir = os.path.join(work_dir, "logs")
+    state_dir = os.path.join(work_dir, "state")
+    os.makedirs(logs_dir, exist_ok=True)
+    os.makedirs(state_dir, exist_ok=True)
+
+    pipeline.variables["HOSTNAME"] = socket.gethostname()
+    if pipeline.service.get("storage.path"):
+        pipeline.service.set("storage.path", os.path.join(state_dir, "flb-storage/"))
+    for i, section in enumerate(pipeline.inputs):
+        if section.plugin != "tail":
+            continue
+        # Keep the file pattern of each priority lane
+        for key in ("Path", "Exclude_Path"):
+            if section.get(key):
+                section.set(key, os.path.join(logs_dir, os.path.basename(section.get(key))))
+        # Lines written before the agent discovered the file count too
+        section.set("Read_from_Head", True)
+        if section.get("DB"):
+            section.set("DB", os.path.join(state_dir, f"tail-{i}.db"))
+    for section in pipeline.outputs:
+        if section.plugin != "es":
+            continue
+        section.update({
+            "Host": host,
+            "Port": port,
+            "tls": False,
+            "AWS_Auth": False,
+            "AWS_Region": None,
+        })
+    return pipeline
+
+
+def write_pipeline(pipeline, work_dir: str) -> str:
+    """
+    :return: Path of the main config file to pass to `fluent-bit -c`
+    """
+    pipeline_path = os.path.join(work_dir, "es.conf")
+    parsers_path = os.path.join(work_dir, "parsers.conf")
+    main_path = os.path.join(work_dir, "fluent-bit.conf")
+    with open(pipeline_path, encoding="utf-8", mode="w") as f:
+        f.write(pipeline.render_pipeline())
+    with open(parsers_path, encoding="utf-8", mode="w") as f:
+        f.write(pipeline.render_parsers())
+    with open(main_path, encoding="utf-8", mode="w") as f:
+        f.write(pipeline.render_main(pipeline_path, parsers_path))
+    return main_path
+
+
+async def wait_for_drain(stand_in: BulkStandIn, generated: GeneratorStats, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline and stand_in.stats.unique_records < generated.records:
+        await asyncio.sleep(0.5)
+
+
+async def run_benchmark(
+    profile: str,
+    rate_spec: str,
+    duration: float,
+    work_dir: str,
+    port: int,
+    fluent_bit_bin: str = GlobalArgs.FLUENT_BIT_BIN,
+    start_agent: bool = True,
+    durable_buffering: bool = True,
+    drain_timeout: float = GlobalArgs.DRAIN_TIMEOUT_SECONDS,
+    stand_in: BulkStandIn = None,
+    pipeline=None
+) -> dict:
+    """
+    Run the router pipeline against the local `_bulk` stand-in and report
+    what went in, what came out and how long it took.
+    """
+    stand_in = await (stand_in or BulkStandIn(port=port)).start()
+    pipeline = pipeline or build_router_pipeline(
+        es_endpoint="127.0.0.1",
+        es_region="local",
+        profile=profile,
+        durable_buffering=durable_buffering
+    )
+    localize_router_pipeline(pipeline, work_dir, "127.0.0.1", stand_in.port)
+    main_config = write_pipeline(pipeline, work_dir)
+
+    agent = None
+    try:
+        if start_agent:
+            agent = await asyncio.create_subprocess_exec(
+                fluent_bit_bin, "-c", main_config,
+                stdout=open(os.path.join(work_dir, "fluent-bit.log"), "wb"),
+                stderr=asyncio.subprocess.STDOUT
+            )
+            await asyncio.sleep(GlobalArgs.STARTUP_SECONDS)
+
+        generated = await generate_logs(
+            target_dir=os.path.join(work_dir, "logs"),
+            shape=parse_rate_shape(rate_spec),
+            duration=duration,
+            run_id=f"run{int(time.time())}"
+        )
+        await wait_for_drain(stand_in, generated, drain_timeout)
+    finally:
+        if agent is not None and agent.returncode is None:
+            agent.send_signal(signal.SIGTERM)
+            await agent.wait()
+        await stand_in.stop()
+
+    delivered = stand_in.stats.report()
+    return {
+        "profile": profile,
+        "rate": rate_spec,
+        "work_dir": work_dir,
+        "generated": generated.as_dict(),
+        "delivered": delivered,
+        "missing_records": generated.records - stand_in.stats.unique_records,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the router pipeline end to end on a laptop")
+    parser.add_argument("--profile", default="default", choices=sorted(PIPELINE_PROFILES))
+    parser.add_argument("--rate", default="constant:500",
+                        help="constant:<rps> | ramp:<a>:<b> | burst:<base>:<burst>[:<period>[:<len>]]")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--drain-timeout", type=float, default=GlobalArgs.DRAIN_TIMEOUT_SECONDS)
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--fluent-bit-bin", default=GlobalArgs.FLUENT_BIT_BIN)
+    parser.add_argument("--no-agent", action="store_true",
+                        help="Do not start Fluent Bit, run it yourself with the config in --work-dir")
+    parser.add_argument("--memory-buffering", action="store_true",
+                        help="Benchmark without the durable filesystem buffering")
+    args = parser.parse_args()
+
+    report = asyncio.new_event_loop().run_until_complete(run_benchmark(
+        profile=args.profile,
+        rate_spec=args.rate,
+        duration=args.duration,
+        work_dir=args.work_dir or tempfile.mkdtemp(prefix="flb-bench-"),
+        port=args.port,
+        fluent_bit_bin=args.fluent_bit_bin,
+        start_agent=not args.no_agent,
+        durable_buffering=not args.memory_buffering,
+        drain_timeout=args.drain_timeout
+    ))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+import argparse
+import asyncio
+import http.client
+import json
+import re
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+from elastic_fluent_bit_kibana.benchmarks.bulk_stand_in import BulkStandIn
+from elastic_fluent_bit_kibana.benchmarks.stats import rate
+from elastic_fluent_bit_kibana.benchmarks.stats import summarize_latencies_ms
+from elastic_fluent_bit_kibana.es_config.index_lifecycle import index_pattern
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    ENDPOINT = "http://127.0.0.1:9200"
+    INDEX = index_pattern()
+    CONCURRENCY = 4
+    DURATION_SECONDS = 30
+    # Queries answered while the caches of a fresh node warm up are not counted
+    WARMUP_SECONDS = 5
+    TIMEOUT_SECONDS = 30
+    # The time picker of the dashboards, & the histogram bucket Kibana picks for it
+    LOOKBACK_HOURS = 24
+    HISTOGRAM_INTERVAL = "30m"
+    # Discover shows the newest 500 documents of a search
+    DISCOVER_SIZE = 500
+    TIME_FIELD = "@timestamp"
+    # `<domain>.<region>.es.amazonaws.com`, these need SigV4
+    AWS_HOST_PATTERN = re.compile(r"\.(?P<region>[a-z]{2}(-gov)?-[a-z]+-\d)\.es\.amazonaws\.com$")
+    SIGV4_SERVICE = "es"
+    # A median this much slower than the baseline is a regression
+    TOLERANCE = 0.25
+
+
+def _time_range(lookback_hours: float) -> dict:
+    # Absolute bounds down to the millisecond, like Kibana sends them, so no
+    # two requests hit the same request cache entry
+    now = datetime.now(timezone.utc)
+    return {
+        "range": {
+            GlobalArgs.TIME_FIELD: {
+                "gte": (now - timedelta(hours=lookback_hours)).isoformat(timespec="milliseconds"),
+                "lte": now.isoformat(timespec="milliseconds"),
+                "format": "strict_date_optional_time",
+            }
+        }
+    }
+
+
+def _date_histogram(interval: str) -> dict:
+    return {
+        "date_histogram": {
+            "field": GlobalArgs.TIME_FIELD,
+            "fixed_interval": interval,
+            "time_zone": "UTC",
+            "min_doc_count": 1,
+        }
+    }
+
+
+def _aggregation_body(aggs: dict, lookback_hours: float, query: dict = None) -> dict:
+    """
+    What a Kibana visualization sends, no hits, only the aggregations
+    """
+    return {
+        "size": 0,
+        "track_total_hits": True,
+        "query": {"bool": {"must": [query or {"match_all": {}}], "filter": [_time_range(lookback_hours)]}},
+        "aggs": aggs,
+    }
+
+
+def _discover_body(query: dict, lookback_hours: float, interval: str) -> dict:
+    """
+    What Discover sends, the newest hits & their histogram
+    """
+    return {
+        "size": GlobalArgs.DISCOVER_SIZE,
+        "track_total_hits": True,
+        "sort": [{GlobalArgs.TIME_FIELD: {"order": "desc", "unmapped_type": "boolean"}}],
+        "query": {"bool": {"must": [query], "filter": [_time_range(lookback_hours)]}},
+        "aggs": {"hits_over_time": _date_histogram(interval)},
+    }
+
+
+# Dashboard queries over the fields of `es_config/index_templates.py`. Each
+# builds its `_search` body when it is sent, from the lookback & histogram interval.
+QUERY_LIBRARY = {
+    "hits_over_time": lambda lookback, interval: _aggregation_body(
+        {"hits": dict(_date_histogram(interval), aggs={"requests": {"sum": {"field": "sample_weight"}}})},
+        lookback),
+    "status_codes": lambda lookback, interval: _aggregation_body(
+        {"codes": {"terms": {"field": "code", "size": 10, "order": {"_count": "desc"}}}},
+        lookback),
+    "top_hosts": lambda lookback, interval: _aggregation_body(
+        {"hosts": {
+            "terms": {"field": "hostname", "size": 10, "order": {"_count": "desc"}},
+            "aggs": {"bytes": {"sum": {"field": "size"}}},
+        }},
+        lookback),
+    "status_over_time": lambda lookback, interval: _aggregation_body(
+        {"hits": dict(_date_histogram(interval), aggs={"codes": {"terms": {"field": "code", "size": 5}}})},
+        lookback),
+    "latency_over_time": lambda lookback, interval: _aggregation_body(
+        {"hits": dict(
+            _date_histogram(interval),
+            aggs={"latency": {"percentiles": {"field": "duration_us", "percents": [50, 95, 99]}}}
+        )},
+        lookback),
+    "full_text": lambda lookback, interval: _discover_body(
+        {"query_string": {"query": "error OR timeout OR refused", "default_field": "log"}},
+        lookback, interval),
+    "full_text_phrase": lambda lookback, interval: _discover_body(
+        {"match_phrase": {"log": "Mozilla/5.0 (X11; Linux x86_64"}},
+        lookback, interval),
+}
+
+
+def aws_region_of(host: str):
+    """
+    :return: Region of an Amazon Elasticsearch Service endpoint, None for other hosts
+    """
+    found = GlobalArgs.AWS_HOST_PATTERN.search(host)
+    return found.group("region") if found else None
+
+
+class SigV4Signer:
+    """
+    Sign requests for the `es` service with the default AWS credential chain
+    """
+
+    def __init__(self, region: str):
+        try:
+            import boto3
+            from botocore.auth import SigV4Auth
+            from botocore.awsrequest import AWSRequest
+        except ImportError:
+            raise SystemExit("SigV4 signing needs boto3, install it with `pip3 install boto3`")
+        credentials = boto3.session.Session().get_credentials()
+        if credentials is None:
+            raise SystemExit("SigV4 signing found no AWS credentials, configure them or use `--auth none`")
+        self._auth = SigV4Auth(credentials, GlobalArgs.SIGV4_SERVICE, region)
+        self._request = AWSRequest
+
+    def headers(self, method: str, url: str, body: bytes, headers: dict) -> dict:
+        request = self._request(method=method, url=url, data=body, headers=headers)
+        self._auth.add_auth(request)
+        return dict(request.headers)
+
+
+class SearchClient:
+    """
+    One keep-alive connection to the endpoint, like a Kibana server keeps per node
+    """
+
+    def __init__(self, endpoint: str, signer: SigV4Signer = None, timeout: float = GlobalArgs.TIMEOUT_SECONDS):
+        self.endpoint = endpoint.rstrip("/")
+        url = urllib.parse.urlsplit(self.endpoint)
+        connection = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._connection = connection(url.hostname, url.port, timeout=timeout)
+        self.signer = signer
+
+    def search(self, index: str, body: dict) -> dict:
+        """
+        :raises RuntimeError: On a response that is not a 2xx
+        """
+        path = f"/{index}/_search"
+        data = json.dumps(body).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        if self.signer is not None:
+            headers = self.signer.headers("POST", self.endpoint + path, data, headers)
+        try:
+            self._connection.request("POST", path, body=data, headers=headers)
+            response = self._connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            # The next request reconnects
+            self._connection.close()
+            raise
+        if not 200 <= response.status < 300:
+            raise RuntimeError(f"{response.status}: {payload[:200].decode('utf-8', 'replace')}")
+        return json.loads(payload) if payload else {}
+
+    def close(self):
+        self._connection.close()
+
+
+class QueryStats:
+    def __init__(self):
+        self.latencies_ns = []
+        self.took_ns = []
+        self.errors = 0
+        self.last_error = None
+
+    def report(self, seconds: float) -> dict:
+        return {
+            "queries": len(self.latencies_ns),
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "queries_per_sec": rate(len(self.latencies_ns), seconds),
+            "latency": summarize_latencies_ms(self.latencies_ns),
+            # What ES spent on the query, the rest is network, queueing & TLS
+            "took": summarize_latencies_ms(self.took_ns),
+        }
+
+
+def run_worker(
+    worker: int,
+    client: SearchClient,
+    queries: list,
+    index: str,
+    stats: dict,
+    lock: threading.Lock,
+    measure_from: float,
+    deadline: float,
+    lookback_hours: float,
+    interval: str
+):
+    """
+    Send the queries one after the other in a closed loop until the deadline,
+    each worker starting at a different query so the mix stays even
+    """
+    sent = worker
+    while time.monotonic() < deadline:
+        name = queries[sent % len(queries)]
+        sent += 1
+        body = QUERY_LIBRARY[name](lookback_hours, interval)
+        started = time.monotonic()
+        try:
+            response = client.search(index, body)
+            error = None
+        except (OSError, http.client.HTTPException, RuntimeError, ValueError) as e:
+            response, error = {}, f"{type(e).__name__}: {e}"
+        elapsed_ns = int((time.monotonic() - started) * 1e9)
+        if started < measure_from:
+            continue
+        with lock:
+            if error is not None:
+                stats[name].errors += 1
+                stats[name].last_error = error
+                continue
+            stats[name].latencies_ns.append(elapsed_ns)
+            stats[name].took_ns.append(int(response.get("took", 0) * 1e6))
+    client.close()
+
+
+def run_query_benchmark(
+    endpoint: str,
+    queries: list,
+    index: str = GlobalArgs.INDEX,
+    concurrency: int = GlobalArgs.CONCURRENCY,
+    duration: float = GlobalArgs.DURATION_SECONDS,
+    warmup: float = GlobalArgs.WARMUP_SECONDS,
+    lookback_hours: float = GlobalArgs.LOOKBACK_HOURS,
+    interval: str = GlobalArgs.HISTOGRAM_INTERVAL,
+    signer: SigV4Signer = None
+) -> dict:
+    """
+    Replay the dashboard queries with `concurrency` clients for `warmup` +
+    `duration` seconds and report latency & throughput per query
+    """
+    unknown = sorted(set(queries) - set(QUERY_LIBRARY))
+    if unknown:
+        raise ValueError(f"Unknown queries {unknown}, choose from {sorted(QUERY_LIBRARY)}")
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    stats = {name: QueryStats() for name in queries}
+    lock = threading.Lock()
+    measure_from = time.monotonic() + warmup
+    deadline = measure_from + duration
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        workers = [
+            pool.submit(
+                run_worker, worker, SearchClient(endpoint, signer), queries, index, stats, lock,
+                measure_from, deadline, lookback_hours, interval
+            )
+            for worker in range(concurrency)
+        ]
+        for w in workers:
+            w.result()
+
+    measured = sum(len(s.latencies_ns) for s in stats.values())
+    return {
+        "endpoint": endpoint,
+        "index": index,
+        "concurrency": concurrency,
+        "seconds": duration,
+        "queries_per_sec": rate(measured, duration),
+        "errors": sum(s.errors for s in stats.values()),
+        "results": {name: s.report(duration) for name, s in stats.items()},
+    }
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    """
+    :param baseline: `{<query>: <p50 ms>}` from an earlier `--write-baseline`
+    :return: One message per query whose median grew past the tolerance
+    """
+    found = []
+    for name, result in report["results"].items():
+        before, after = baseline.get(name), result["latency"]["p50_ms"]
+        if before and after is not None and after > before * (1 + tolerance):
+            found.append(f"{name}: p50 {after}ms, baseline {before}ms, over the {tolerance:.0%} tolerance")
+    return found
+
+
+def start_stand_in(port: int) -> BulkStandIn:
+    """
+    The `_bulk` stand-in on its own event loop thread, its empty search
+    answers measure the client & HTTP overhead only
+    """
+    loop = asyncio.new_event_loop()
+    stand_in = loop.run_until_complete(BulkStandIn(port=port).start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return stand_in
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay Kibana style dashboard queries against an Elasticsearch endpoint & report latency per query")
+    parser.add_argument("--endpoint", default=GlobalArgs.ENDPOINT,
+                        help="http(s)://host[:port], the `ESDomainEndpoint` output of the ES stack with https://")
+    parser.add_argument("--index", default=GlobalArgs.INDEX)
+    parser.add_argument("--queries", default=",".join(QUERY_LIBRARY),
+                        help=f"Comma separated queries to replay, from {', '.join(QUERY_LIBRARY)}")
+    parser.add_argument("--concurrency", type=int, default=GlobalArgs.CONCURRENCY)
+    parser.add_argument("--duration", type=float, default=GlobalArgs.DURATION_SECONDS)
+    parser.add_argument("--warmup", type=float, default=GlobalArgs.WARMUP_SECONDS)
+    parser.add_argument("--lookback-hours", type=float, default=GlobalArgs.LOOKBACK_HOURS)
+    parser.add_argument("--interval", default=GlobalArgs.HISTOGRAM_INTERVAL, help="Date histogram bucket, like `30m`")
+    parser.add_argument("--auth", choices=("auto", "sigv4", "none"), default="auto",
+                        help="`auto` signs requests to `*.es.amazonaws.com` endpoints with SigV4")
+    parser.add_argument("--region", default=None, help="SigV4 region, read from the endpoint by default")
+    parser.add_argument("--stand-in", action="store_true",
+                        help="Start the local `_bulk` stand-in on the endpoint port & query it")
+    parser.add_argument("--baseline", default=None, help="Fail when a p50 is slower than in this file")
+    parser.add_argument("--tolerance", type=float, default=GlobalArgs.TOLERANCE)
+    parser.add_argument("--write-baseline", metavar="BASELINE_JSON", default=None,
+                        help="Store the p50 of every query of this run as the new baseline")
+    args = parser.parse_args()
+
+    endpoint = args.endpoint if "://" in args.endpoint else f"https://{args.endpoint}"
+    host = urllib.parse.urlsplit(endpoint).hostname
+    region = args.region or aws_region_of(host)
+    signer = None
+    if args.auth == "sigv4" or (args.auth == "auto" and aws_region_of(host)):
+        if region is None:
+            raise SystemExit(f"No region in '{host}', set it with --region")
+        signer = SigV4Signer(region)
+    if args.stand_in:
+        start_stand_in(urllib.parse.urlsplit(endpoint).port or 80)
+
+    report = run_query_benchmark(
+        endpoint,
+        [q.strip() for q in args.queries.split(",") if q.strip()],
+        index=args.index,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        warmup=args.warmup,
+        lookback_hours=args.lookback_hours,
+        interval=args.interval,
+        signer=signer
+    )
+    print(json.dumps(report, indent=2))
+
+    if args.write_baseline:
+        with open(args.write_baseline, encoding="utf-8", mode="w") as f:
+            f.write(json.dumps({n: r["latency"]["p50_ms"] for n, r in report["results"].items()}, indent=2) + "\n")
+        print(f"Wrote baseline to {args.write_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        if found:
+            raise SystemExit("Query latency regressed\n" + "\n".join(found))
+
+
+if __name__ == "__main__":
+    main()
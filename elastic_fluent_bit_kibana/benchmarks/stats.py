@@ -0,0 +1,33 @@
+import math
+
+
+def percentile(values: list, pct: float):
+    """
+    Nearest-rank percentile.
+    :param values: Samples, they do not need to be sorted
+    :param pct: Percentile between 0 and 100
+    :return: The sample at the percentile, None when there are no samples
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize_latencies_ms(latencies_ns: list, percentiles=(50, 95, 99)) -> dict:
+    """
+    :param latencies_ns: Latency samples in nanoseconds
+    :return: Percentiles & max in milliseconds, rounded for reports
+    """
+    ordered = sorted(latencies_ns)
+    summary = {"count": len(ordered)}
+    for pct in percentiles:
+        value = percentile(ordered, pct)
+        summary[f"p{pct}_ms"] = None if value is None else round(value / 1e6, 2)
+    summary["max_ms"] = round(ordered[-1] / 1e6, 2) if ordered else None
+    return summary
+
+
+def rate(count: float, seconds: float) -> float:
+    return round(count / seconds, 2) if seconds > 0 else 0.0
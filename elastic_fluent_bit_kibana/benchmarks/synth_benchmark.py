@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from elastic_fluent_bit_kibana.benchmarks.stats import percentile
+from elastic_fluent_bit_kibana.stacks.stack_selection import GlobalArgs as SelectionArgs
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    # `app.py` opens the bootstrap scripts relative to the project root
+    PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    SELECTIONS = ["all", "vpc", "es", "fluent-bit"]
+    REPEAT = 3
+    # A median this much slower than the baseline is a regression
+    TOLERANCE = 0.25
+
+
+def app_context(cdk_json_path: str, overrides: dict) -> dict:
+    """
+    The context `cdk synth` hands to the app, from `cdk.json` with `-c` style overrides
+    """
+    with open(cdk_json_path, encoding="utf-8") as f:
+        context = dict(json.load(f).get("context", {}))
+    context.update(overrides)
+    return context
+
+
+def synth_once(context: dict, python_bin: str = sys.executable) -> dict:
+    """
+    Run `app.py` the way the CDK CLI does, into a throwaway cloud assembly
+    :return: Wall clock seconds & the templates written
+    """
+    with tempfile.TemporaryDirectory(prefix="synth-bench-") as out_dir:
+        env = dict(os.environ, CDK_CONTEXT_JSON=json.dumps(context), CDK_OUTDIR=out_dir)
+        started = time.monotonic()
+        result = subprocess.run(
+            [python_bin, "app.py"],
+            cwd=GlobalArgs.PROJECT_ROOT,
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT
+        )
+        elapsed = time.monotonic() - started
+        if result.returncode != 0:
+            raise SystemExit(
+                f"Synth of stacks '{context.get(SelectionArgs.CONTEXT_KEY)}' failed\n"
+                + result.stdout.decode("utf-8", "replace")[-2000:])
+        templates = sorted(f for f in os.listdir(out_dir) if f.endswith(".template.json"))
+    return {"seconds": elapsed, "templates": templates}
+
+
+def benchmark_selection(selection: str, base_context: dict, repeat: int, python_bin: str = sys.executable) -> dict:
+    context = dict(base_context, **{SelectionArgs.CONTEXT_KEY: selection})
+    runs = [synth_once(context, python_bin) for _ in range(repeat)]
+    seconds = [r["seconds"] for r in runs]
+    return {
+        "stacks": selection,
+        "runs": repeat,
+        "templates": runs[-1]["templates"],
+        "median_s": round(percentile(seconds, 50), 2),
+        "p90_s": round(percentile(seconds, 90), 2),
+        "max_s": round(max(seconds), 2),
+    }
+
+
+def regressions(results: list, baseline: dict, tolerance: float) -> list:
+    """
+    :param baseline: `{<stacks>: <median seconds>}` from an earlier `--write-baseline`
+    :return: One message per selection whose median grew past the tolerance
+    """
+    found = []
+    for r in results:
+        before = baseline.get(r["stacks"])
+        if before and r["median_s"] > before * (1 + tolerance):
+            found.append(
+                f"stacks={r['stacks']}: median {r['median_s']}s, baseline {before}s, "
+                f"over the {tolerance:.0%} tolerance")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time `cdk synth` of the app, for every stack selection, to catch synth latency regressions")
+    parser.add_argument("--stacks", default=",".join(GlobalArgs.SELECTIONS),
+                        help="Comma separated selections to time, `es+fluent-bit` selects two stacks together")
+    parser.add_argument("--repeat", type=int, default=GlobalArgs.REPEAT)
+    parser.add_argument("--context", default="{}", help="JSON context overrides, like `cdk synth -c`")
+    parser.add_argument("--cdk-json", default=os.path.join(GlobalArgs.PROJECT_ROOT, "cdk.json"))
+    parser.add_argument("--python", default=sys.executable, help="Interpreter with aws-cdk installed")
+    parser.add_argument("--baseline", default=None, help="Fail when a median is slower than in this file")
+    parser.add_argument("--tolerance", type=float, default=GlobalArgs.TOLERANCE)
+    parser.add_argument("--write-baseline", metavar="BASELINE_JSON", default=None,
+                        help="Store the medians of this run as the new baseline")
+    args = parser.parse_args()
+
+    base_context = app_context(args.cdk_json, json.loads(args.context))
+    results = [
+        benchmark_selection(selection.replace("+", ","), base_context, args.repeat, args.python)
+        for selection in args.stacks.split(",")
+    ]
+    print(json.dumps({"repeat": args.repeat, "results": results}, indent=2))
+
+    if args.write_baseline:
+        with open(args.write_baseline, encoding="utf-8", mode="w") as f:
+            f.write(json.dumps({r["stacks"]: r["median_s"] for r in results}, indent=2) + "\n")
+        print(f"Wrote baseline to {args.write_baseline}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        if found:
+            raise SystemExit("Synth latency regressed\n" + "\n".join(found))
+
+
+if __name__ == "__main__":
+    main()
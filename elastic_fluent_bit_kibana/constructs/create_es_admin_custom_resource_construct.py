@@ -0,0 +1,92 @@
+import json
+
+from aws_cdk import aws_iam as _iam
+from aws_cdk import aws_lambda as _lambda
+from aws_cdk import aws_logs as _logs
+from aws_cdk import core
+from aws_cdk import custom_resources as _cr
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    OWNER = "MystiqueAutomation"
+    ENVIRONMENT = "production"
+    REPO_NAME = "es_admin_custom_resource_construct"
+    VERSION = "2020_11_22"
+    MIZTIIK_SUPPORT_EMAIL = ["mystique@example.com", ]
+
+
+class CreateEsAdminCustomResource(core.Construct):
+    """
+    AWS CDK Construct that applies index templates, ISM policies & other admin
+    requests to an Elasticsearch domain at deploy time, with SigV4 signed requests.
+    """
+
+    def __init__(
+        self,
+        scope: core.Construct,
+        construct_id: str,
+        es_endpoint: str,
+        es_domain_arn: str,
+        steps: list,
+        **kwargs
+    ) -> None:
+
+        super().__init__(scope, construct_id, **kwargs)
+        """
+        :param steps: Ordered list of dict, `{"kind": "request", "method", "path", "body"}`
+                      or `{"kind": "ism_policy" | "rollup_job", "path", "body"}`.
+                      Optional `skip_if_exists` & `fail_if_exists` paths are checked with HEAD first.
+        """
+
+        es_admin_fn = _lambda.Function(
+            self,
+            "esAdminFn",
+            description="Apply index templates & policies to the Elasticsearch domain",
+            # boto3 & botocore for the SigV4 signing come with the runtime
+            runtime=_lambda.Runtime.PYTHON_3_7,
+            code=_lambda.Code.from_asset(
+                "elastic_fluent_bit_kibana/stacks/back_end/lambda_src/es_admin"
+            ),
+            handler="index.lambda_handler",
+            timeout=core.Duration.minutes(5),
+            environment={
+                "LOG_LEVEL": "INFO",
+            }
+        )
+
+        es_admin_fn.add_to_role_policy(_iam.PolicyStatement(
+            actions=[
+                "es:ESHttpGet",
+                "es:ESHttpHead",
+                "es:ESHttpPost",
+                "es:ESHttpPut",
+            ],
+            resources=[es_domain_arn, f"{es_domain_arn}/*"]
+        ))
+
+        es_admin_provider = _cr.Provider(
+            self,
+            "esAdminProvider",
+            on_event_handler=es_admin_fn,
+            log_retention=_logs.RetentionDays.ONE_WEEK
+        )
+
+        # Steps travel as one JSON string, CloudFormation would turn numbers & booleans to strings
+        self.es_admin = core.CustomResource(
+            self,
+            "esAdminResource",
+            service_token=es_admin_provider.service_token,
+            properties={
+                "Endpoint": es_endpoint,
+                "Steps": json.dumps(steps, sort_keys=True),
+            }
+        )
+
+    # properties to share with other stacks
+    @property
+    def get_resource(self):
+        return self.es_admin
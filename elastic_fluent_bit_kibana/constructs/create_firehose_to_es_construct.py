@@ -0,0 +1,168 @@
+from aws_cdk import aws_iam as _iam
+from aws_cdk import aws_kinesisfirehose as _firehose
+from aws_cdk import aws_logs as _logs
+from aws_cdk import aws_s3 as _s3
+from aws_cdk import core
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    OWNER = "MystiqueAutomation"
+    ENVIRONMENT = "production"
+    REPO_NAME = "firehose_to_es_construct"
+    VERSION = "2020_11_22"
+    MIZTIIK_SUPPORT_EMAIL = ["mystique@example.com", ]
+    # Firehose limits, buffering 60-900s & 1-100MB, retries 0-7200s
+    MIN_BUFFER_SECONDS = 60
+    MAX_BUFFER_SECONDS = 900
+    MAX_BUFFER_MB = 100
+    MAX_RETRY_SECONDS = 7200
+    BACKUP_PREFIX = "failed-to-es"
+
+
+class CreateFirehoseToEs(core.Construct):
+    """
+    AWS CDK Construct with one Kinesis Data Firehose delivery stream per
+    priority lane, delivering to the Elasticsearch domain. Documents the
+    domain rejects or that run out of retries land in a shared S3 bucket.
+    """
+
+    def __init__(
+        self,
+        scope: core.Construct,
+        construct_id: str,
+        es_domain_name: str,
+        streams: dict,
+        backup_retention_days: int = 14,
+        **kwargs
+    ) -> None:
+
+        super().__init__(scope, construct_id, **kwargs)
+        """
+        :param es_domain_name: Name of the domain the streams deliver to
+        :param streams: `{<lane>: {"index", "buffer_seconds", "buffer_mb", "retry_seconds"}}`,
+                        `index` is the write alias of the lane
+        :param backup_retention_days: Days the failed documents are kept in S3
+        """
+        es_domain_arn = f"arn:aws:es:{core.Aws.REGION}:{core.Aws.ACCOUNT_ID}:domain/{es_domain_name}"
+
+        self.backup_bucket = _s3.Bucket(
+            self,
+            "failedDocumentsBucket",
+            encryption=_s3.BucketEncryption.S3_MANAGED,
+            block_public_access=_s3.BlockPublicAccess.BLOCK_ALL,
+            lifecycle_rules=[
+                _s3.LifecycleRule(expiration=core.Duration.days(backup_retention_days))
+            ],
+            removal_policy=core.RemovalPolicy.DESTROY
+        )
+
+        delivery_log_group = _logs.LogGroup(
+            self,
+            "deliveryLogGroup",
+            retention=_logs.RetentionDays.ONE_WEEK,
+            removal_policy=core.RemovalPolicy.DESTROY
+        )
+
+        # Ref: https://docs.aws.amazon.com/firehose/latest/dev/controlling-access.html#using-iam-es
+        delivery_role = _iam.Role(
+            self,
+            "deliveryRole",
+            assumed_by=_iam.ServicePrincipal("firehose.amazonaws.com")
+        )
+        delivery_role.add_to_policy(_iam.PolicyStatement(
+            actions=[
+                "es:DescribeElasticsearchDomain",
+                "es:DescribeElasticsearchDomains",
+                "es:DescribeElasticsearchDomainConfig",
+                "es:ESHttpPost",
+                "es:ESHttpPut",
+                "es:ESHttpGet",
+            ],
+            resources=[es_domain_arn, f"{es_domain_arn}/*"]
+        ))
+        self.backup_bucket.grant_read_write(delivery_role)
+
+        self.stream_names = {}
+        self.stream_arns = []
+        for lane, stream in streams.items():
+            buffer_seconds = int(stream.get("buffer_seconds", 300))
+            buffer_mb = int(stream.get("buffer_mb", 5))
+            retry_seconds = int(stream.get("retry_seconds", 300))
+            if not GlobalArgs.MIN_BUFFER_SECONDS <= buffer_seconds <= GlobalArgs.MAX_BUFFER_SECONDS:
+                raise ValueError(
+                    f"{lane}: buffer_seconds '{buffer_seconds}' must be between "
+                    f"{GlobalArgs.MIN_BUFFER_SECONDS} and {GlobalArgs.MAX_BUFFER_SECONDS}")
+            if not 1 <= buffer_mb <= GlobalArgs.MAX_BUFFER_MB:
+                raise ValueError(f"{lane}: buffer_mb '{buffer_mb}' must be between 1 and {GlobalArgs.MAX_BUFFER_MB}")
+            if not 0 <= retry_seconds <= GlobalArgs.MAX_RETRY_SECONDS:
+                raise ValueError(
+                    f"{lane}: retry_seconds '{retry_seconds}' must be between 0 and {GlobalArgs.MAX_RETRY_SECONDS}")
+
+            for log_stream_id, log_stream_name in (("EsDelivery", f"{lane}-es-delivery"),
+                                                   ("S3Backup", f"{lane}-s3-backup")):
+                _logs.LogStream(
+                    self,
+                    f"{lane}{log_stream_id}LogStream",
+                    log_group=delivery_log_group,
+                    log_stream_name=log_stream_name,
+                    removal_policy=core.RemovalPolicy.DESTROY
+                )
+
+            # No `type_name`, the ES 7 indices are typeless. `NoRotation` keeps
+            # writing to the rollover alias, ISM rolls the indices behind it.
+            delivery_stream = _firehose.CfnDeliveryStream(
+                self,
+                f"{lane}DeliveryStream",
+                delivery_stream_type="DirectPut",
+                elasticsearch_destination_configuration=_firehose.CfnDeliveryStream.ElasticsearchDestinationConfigurationProperty(
+                    domain_arn=es_domain_arn,
+                    index_name=stream["index"],
+                    index_rotation_period="NoRotation",
+                    role_arn=delivery_role.role_arn,
+                    buffering_hints=_firehose.CfnDeliveryStream.ElasticsearchBufferingHintsProperty(
+                        interval_in_seconds=buffer_seconds,
+                        size_in_m_bs=buffer_mb
+                    ),
+                    retry_options=_firehose.CfnDeliveryStream.ElasticsearchRetryOptionsProperty(
+                        duration_in_seconds=retry_seconds
+                    ),
+                    s3_backup_mode="FailedDocumentsOnly",
+                    s3_configuration=_firehose.CfnDeliveryStream.S3DestinationConfigurationProperty(
+                        bucket_arn=self.backup_bucket.bucket_arn,
+                        role_arn=delivery_role.role_arn,
+                        prefix=f"{GlobalArgs.BACKUP_PREFIX}/{lane}/",
+                        error_output_prefix=f"{GlobalArgs.BACKUP_PREFIX}/{lane}-errors/",
+                        compression_format="GZIP",
+                        buffering_hints=_firehose.CfnDeliveryStream.BufferingHintsProperty(
+                            interval_in_seconds=300,
+                            size_in_m_bs=5
+                        ),
+                        cloud_watch_logging_options=_firehose.CfnDeliveryStream.CloudWatchLoggingOptionsProperty(
+                            enabled=True,
+                            log_group_name=delivery_log_group.log_group_name,
+                            log_stream_name=f"{lane}-s3-backup"
+                        )
+                    ),
+                    cloud_watch_logging_options=_firehose.CfnDeliveryStream.CloudWatchLoggingOptionsProperty(
+                        enabled=True,
+                        log_group_name=delivery_log_group.log_group_name,
+                        log_stream_name=f"{lane}-es-delivery"
+                    )
+                )
+            )
+            # The role must be able to write before Firehose validates the destination
+            delivery_stream.node.add_dependency(delivery_role)
+
+            self.stream_names[lane] = delivery_stream.ref
+            self.stream_arns.append(delivery_stream.attr_arn)
+
+        delivery_log_group.grant_write(delivery_role)
+
+    # properties to share with other stacks
+    @property
+    def get_backup_bucket_name(self):
+        return self.backup_bucket.bucket_name
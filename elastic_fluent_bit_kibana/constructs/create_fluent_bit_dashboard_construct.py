@@ -0,0 +1,189 @@
+from aws_cdk import aws_cloudwatch as _cloudwatch
+from aws_cdk import core
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    OWNER = "MystiqueAutomation"
+    ENVIRONMENT = "production"
+    REPO_NAME = "fluent_bit_dashboard_construct"
+    VERSION = "2020_11_22"
+    MIZTIIK_SUPPORT_EMAIL = ["mystique@example.com", ]
+
+
+class CreateFluentBitDashboard(core.Construct):
+    """
+    AWS CDK Construct with a CloudWatch dashboard & alarms for a Fluent Bit tier.
+    Plots records in & out, retries, errors and the on disk backlog next to the
+    write thread pool of the Elasticsearch domain, to tell whether the routers
+    or the domain are the bottleneck.
+    """
+
+    def __init__(
+        self,
+        scope: core.Construct,
+        construct_id: str,
+        dashboard_name: str,
+        metric_namespace: str,
+        tier_dimensions: dict,
+        input_aliases: list,
+        output_aliases: dict,
+        metric_names: dict,
+        es_domain_name: str = None,
+        backlog_growth_periods: int = 5,
+        retries_alarm_threshold: int = 50,
+        **kwargs
+    ) -> None:
+
+        super().__init__(scope, construct_id, **kwargs)
+        """
+        :param tier_dimensions: `AutoScalingGroupName` or `InstanceId` of the tier, the dimension of the
+                                metrics from `publish_fluent_bit_metrics.py` & the scrape label of the
+                                Prometheus metrics, so other tiers & stacks do not blend in
+        :param input_aliases: Fluent Bit `Alias` of the inputs, the `name` dimension of their Prometheus metrics
+        :param output_aliases: Fluent Bit `Alias` of the output of each lane, keyed by lane name.
+                               Retries & dropped records raise an alarm per lane.
+        :param metric_names: Metric names keyed by `backlog`, `input_records`, `output_records`,
+                             `retries`, `retries_failed`, `errors` & `dropped`
+        :param backlog_growth_periods: Minutes of uninterrupted backlog growth that raise the alarm
+        :param retries_alarm_threshold: Output retries per 5 minutes that raise the alarm
+        """
+
+        def _fluent_bit_metric(metric_name, alias, statistic="Sum", label=None):
+            return _cloudwatch.Metric(
+                namespace=metric_namespace,
+                metric_name=metric_name,
+                dimensions=dict({"name": alias}, **tier_dimensions),
+                statistic=statistic,
+                label=label or metric_name,
+                period=core.Duration.minutes(1)
+            )
+
+        backlog = _cloudwatch.Metric(
+            namespace=metric_namespace,
+            metric_name=metric_names["backlog"],
+            dimensions=tier_dimensions,
+            statistic="Maximum",
+            label="Buffered chunks",
+            period=core.Duration.minutes(1)
+        )
+        records_in = [
+            _fluent_bit_metric(metric_names["input_records"], a, label=f"{a} in") for a in input_aliases
+        ]
+        records_out, retries, retries_failed, errors, dropped = [], [], [], [], []
+        for lane, alias in output_aliases.items():
+            records_out.append(_fluent_bit_metric(metric_names["output_records"], alias, label=f"{lane} out"))
+            retries.append(_fluent_bit_metric(metric_names["retries"], alias, label=f"{lane} retries"))
+            retries_failed.append(
+                _fluent_bit_metric(metric_names["retries_failed"], alias, label=f"{lane} retries failed"))
+            errors.append(_fluent_bit_metric(metric_names["errors"], alias, label=f"{lane} errors"))
+            dropped.append(_fluent_bit_metric(metric_names["dropped"], alias, label=f"{lane} dropped records"))
+
+        # Backlog went up every minute of the window, the output can not keep up
+        self.backlog_growth_alarm = _cloudwatch.Alarm(
+            self,
+            "backlogGrowthAlarm",
+            alarm_description=f"Fluent Bit backlog of {dashboard_name} keeps growing",
+            metric=_cloudwatch.MathExpression(
+                expression="DIFF(backlog)",
+                using_metrics={"backlog": backlog},
+                label="Backlog growth",
+                period=core.Duration.minutes(1)
+            ),
+            threshold=0,
+            comparison_operator=_cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            evaluation_periods=backlog_growth_periods,
+            datapoints_to_alarm=backlog_growth_periods,
+            treat_missing_data=_cloudwatch.TreatMissingData.NOT_BREACHING
+        )
+
+        self.retries_alarms = []
+        self.dropped_records_alarms = []
+        for lane, lane_retries, lane_dropped in zip(output_aliases, retries, dropped):
+            self.retries_alarms.append(_cloudwatch.Alarm(
+                self,
+                f"{lane}OutputRetriesAlarm",
+                alarm_description=f"Fluent Bit output retries of the {lane} lane of {dashboard_name} are high",
+                metric=lane_retries.with_(period=core.Duration.minutes(5)),
+                threshold=retries_alarm_threshold,
+                comparison_operator=_cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+                evaluation_periods=1,
+                treat_missing_data=_cloudwatch.TreatMissingData.NOT_BREACHING
+            ))
+            self.dropped_records_alarms.append(_cloudwatch.Alarm(
+                self,
+                f"{lane}DroppedRecordsAlarm",
+                alarm_description=(
+                    f"Fluent Bit {lane} lane of {dashboard_name} gave up on records after exhausting retries"),
+                metric=lane_dropped.with_(period=core.Duration.minutes(5)),
+                threshold=0,
+                comparison_operator=_cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+                evaluation_periods=1,
+                treat_missing_data=_cloudwatch.TreatMissingData.NOT_BREACHING
+            ))
+
+        self.dashboard_name = dashboard_name
+        self.dashboard = _cloudwatch.Dashboard(
+            self,
+            "fluentBitDashboard",
+            dashboard_name=dashboard_name
+        )
+        self.dashboard.add_widgets(
+            _cloudwatch.GraphWidget(
+                title="Records in / out per minute",
+                left=records_in + records_out,
+                width=12
+            ),
+            _cloudwatch.GraphWidget(
+                title="Buffered chunks",
+                left=[backlog],
+                width=12
+            )
+        )
+        self.dashboard.add_widgets(
+            _cloudwatch.GraphWidget(
+                title="Output retries & errors",
+                left=retries + retries_failed + errors,
+                right=dropped,
+                width=12
+            ),
+            _cloudwatch.AlarmStatusWidget(
+                title="Pipeline alarms",
+                alarms=[self.backlog_growth_alarm] + self.retries_alarms + self.dropped_records_alarms,
+                width=12
+            )
+        )
+
+        if es_domain_name:
+            # Rejections & a full write queue point at the domain, not the routers
+            def _es_metric(metric_name, statistic):
+                return _cloudwatch.Metric(
+                    namespace="AWS/ES",
+                    metric_name=metric_name,
+                    dimensions={"DomainName": es_domain_name, "ClientId": core.Aws.ACCOUNT_ID},
+                    statistic=statistic,
+                    period=core.Duration.minutes(1)
+                )
+
+            self.dashboard.add_widgets(
+                _cloudwatch.GraphWidget(
+                    title="Domain write thread pool",
+                    left=[_es_metric("ThreadpoolWriteQueue", "Maximum")],
+                    right=[_es_metric("ThreadpoolWriteRejected", "Sum")],
+                    width=12
+                ),
+                _cloudwatch.GraphWidget(
+                    title="Domain indexing",
+                    left=[_es_metric("IndexingRate", "Average")],
+                    right=[_es_metric("IndexingLatency", "Average"), _es_metric("CPUUtilization", "Maximum")],
+                    width=12
+                )
+            )
+
+    # properties to share with other stacks
+    @property
+    def get_dashboard_name(self):
+        return self.dashboard_name
@@ -0,0 +1,124 @@
+from aws_cdk import aws_cloudwatch as _cloudwatch
+from aws_cdk import aws_events as _events
+from aws_cdk import aws_events_targets as _events_targets
+from aws_cdk import aws_iam as _iam
+from aws_cdk import aws_lambda as _lambda
+from aws_cdk import aws_logs as _logs
+from aws_cdk import core
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    OWNER = "MystiqueAutomation"
+    ENVIRONMENT = "production"
+    REPO_NAME = "ingest_canary_probe_construct"
+    VERSION = "2020_11_22"
+    MIZTIIK_SUPPORT_EMAIL = ["mystique@example.com", ]
+
+
+class CreateIngestCanaryProbe(core.Construct):
+    """
+    AWS CDK Construct with a scheduled Lambda that looks for the canary markers
+    emitted by the log routers in Elasticsearch and publishes the
+    log-to-searchable latency per router.
+    """
+
+    def __init__(
+        self,
+        scope: core.Construct,
+        construct_id: str,
+        es_endpoint_param_name: str,
+        es_index: str,
+        canary_marker: str,
+        metric_namespace: str,
+        max_canary_age_seconds: int = 300,
+        **kwargs
+    ) -> None:
+
+        super().__init__(scope, construct_id, **kwargs)
+        """
+        :param es_endpoint_param_name: SSM parameter holding the Elasticsearch Domain Endpoint
+        :param canary_marker: Text that identifies the canary records
+        :param max_canary_age_seconds: Alarm when the newest searchable marker is older than this
+        """
+
+        self.probe_fn = _lambda.Function(
+            self,
+            "ingestCanaryProbeFn",
+            description="Measure the log-to-searchable latency of the log router canaries",
+            runtime=_lambda.Runtime.PYTHON_3_7,
+            code=_lambda.Code.from_asset(
+                "elastic_fluent_bit_kibana/stacks/back_end/lambda_src/ingest_canary_probe"
+            ),
+            handler="index.lambda_handler",
+            timeout=core.Duration.seconds(70),
+            reserved_concurrent_executions=1,
+            environment={
+                "LOG_LEVEL": "INFO",
+                "ES_ENDPOINT_PARAM_NAME": es_endpoint_param_name,
+                "ES_INDEX": es_index,
+                "CANARY_MARKER": canary_marker,
+                "METRIC_NAMESPACE": metric_namespace,
+            }
+        )
+
+        self.probe_fn.add_to_role_policy(_iam.PolicyStatement(
+            actions=["ssm:GetParameter"],
+            resources=[
+                f"arn:aws:ssm:{core.Aws.REGION}:{core.Aws.ACCOUNT_ID}:parameter{es_endpoint_param_name}"
+            ]
+        ))
+        self.probe_fn.add_to_role_policy(_iam.PolicyStatement(
+            actions=[
+                "es:ESHttpGet",
+                "es:ESHttpPost",
+            ],
+            resources=["*"]
+        ))
+        self.probe_fn.add_to_role_policy(_iam.PolicyStatement(
+            actions=["cloudwatch:PutMetricData"],
+            resources=["*"]
+        ))
+
+        # Create Custom Loggroup
+        _logs.LogGroup(
+            self,
+            "ingestCanaryProbeLogGroup",
+            log_group_name=f"/aws/lambda/{self.probe_fn.function_name}",
+            removal_policy=core.RemovalPolicy.DESTROY,
+            retention=_logs.RetentionDays.ONE_WEEK
+        )
+
+        # Run the probe every minute, the routers emit one marker a minute
+        _events.Rule(
+            self,
+            "ingestCanaryProbeSchedule",
+            schedule=_events.Schedule.rate(core.Duration.minutes(1)),
+            targets=[_events_targets.LambdaFunction(self.probe_fn)]
+        )
+
+        self.canary_age_alarm = _cloudwatch.Alarm(
+            self,
+            "canaryAgeAlarm",
+            alarm_description="The newest searchable ingest canary is too old, logs are lagging",
+            metric=_cloudwatch.Metric(
+                namespace=metric_namespace,
+                metric_name="FreshestCanaryAge",
+                statistic="Maximum",
+                period=core.Duration.minutes(1)
+            ),
+            threshold=max_canary_age_seconds,
+            comparison_operator=_cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            evaluation_periods=3,
+            datapoints_to_alarm=3,
+            # No datapoints means the probe finds no marker at all
+            treat_missing_data=_cloudwatch.TreatMissingData.BREACHING
+        )
+
+    # properties to share with other stacks
+    @property
+    def get_probe_fn_name(self):
+        return self.probe_fn.function_name
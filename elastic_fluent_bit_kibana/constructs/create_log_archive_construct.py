@@ -0,0 +1,230 @@
+from aws_cdk import aws_glue as _glue
+from aws_cdk import aws_iam as _iam
+from aws_cdk import aws_kinesisfirehose as _firehose
+from aws_cdk import aws_logs as _logs
+from aws_cdk import aws_s3 as _s3
+from aws_cdk import core
+
+from elastic_fluent_bit_kibana.log_archive.archive_schema import GlobalArgs as SchemaArgs
+from elastic_fluent_bit_kibana.log_archive.archive_schema import PARTITION_KEYS
+from elastic_fluent_bit_kibana.log_archive.archive_schema import archive_columns
+from elastic_fluent_bit_kibana.log_archive.archive_schema import error_prefix
+from elastic_fluent_bit_kibana.log_archive.archive_schema import json_key_mappings
+from elastic_fluent_bit_kibana.log_archive.archive_schema import object_prefix
+from elastic_fluent_bit_kibana.log_archive.archive_schema import projection_parameters
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    OWNER = "MystiqueAutomation"
+    ENVIRONMENT = "production"
+    REPO_NAME = "log_archive_construct"
+    VERSION = "2020_11_22"
+    MIZTIIK_SUPPORT_EMAIL = ["mystique@example.com", ]
+    # Firehose needs at least 64MB of buffer to convert to Parquet
+    MIN_BUFFER_MB = 64
+    MAX_BUFFER_MB = 128
+    MIN_BUFFER_SECONDS = 60
+    MAX_BUFFER_SECONDS = 900
+    # Archived logs are scanned rarely, move them to Infrequent Access after a month
+    INFREQUENT_ACCESS_AFTER_DAYS = 30
+
+
+class CreateLogArchive(core.Construct):
+    """
+    AWS CDK Construct with the S3 archive of the router logs. One Firehose
+    delivery stream per priority lane converts the JSON records to Snappy
+    compressed Parquet, partitioned by lane & day, described by a Glue table
+    Athena can query.
+    """
+
+    def __init__(
+        self,
+        scope: core.Construct,
+        construct_id: str,
+        lanes: list,
+        buffer_seconds: int = 900,
+        buffer_mb: int = 128,
+        retention_days: int = 365,
+        **kwargs
+    ) -> None:
+
+        super().__init__(scope, construct_id, **kwargs)
+        """
+        :param lanes: Names of the priority lanes, one delivery stream & `lane` partition each
+        :param buffer_seconds: Firehose buffer interval, larger files scan faster
+        :param buffer_mb: Firehose buffer size, 64 to 128 with Parquet conversion
+        :param retention_days: Days the archived logs are kept
+        """
+        if not GlobalArgs.MIN_BUFFER_SECONDS <= int(buffer_seconds) <= GlobalArgs.MAX_BUFFER_SECONDS:
+            raise ValueError(
+                f"buffer_seconds '{buffer_seconds}' must be between "
+                f"{GlobalArgs.MIN_BUFFER_SECONDS} and {GlobalArgs.MAX_BUFFER_SECONDS}")
+        if not GlobalArgs.MIN_BUFFER_MB <= int(buffer_mb) <= GlobalArgs.MAX_BUFFER_MB:
+            raise ValueError(
+                f"buffer_mb '{buffer_mb}' must be between {GlobalArgs.MIN_BUFFER_MB} and {GlobalArgs.MAX_BUFFER_MB}")
+        if int(retention_days) <= GlobalArgs.INFREQUENT_ACCESS_AFTER_DAYS:
+            raise ValueError(
+                f"retention_days '{retention_days}' must be over {GlobalArgs.INFREQUENT_ACCESS_AFTER_DAYS}")
+
+        self.archive_bucket = _s3.Bucket(
+            self,
+            "logArchiveBucket",
+            encryption=_s3.BucketEncryption.S3_MANAGED,
+            block_public_access=_s3.BlockPublicAccess.BLOCK_ALL,
+            lifecycle_rules=[
+                _s3.LifecycleRule(
+                    prefix=f"{SchemaArgs.OBJECT_PREFIX}/",
+                    transitions=[
+                        _s3.Transition(
+                            storage_class=_s3.StorageClass.INFREQUENT_ACCESS,
+                            transition_after=core.Duration.days(GlobalArgs.INFREQUENT_ACCESS_AFTER_DAYS)
+                        )
+                    ],
+                    expiration=core.Duration.days(int(retention_days))
+                ),
+                _s3.LifecycleRule(
+                    prefix=f"{SchemaArgs.ERROR_PREFIX}/",
+                    expiration=core.Duration.days(GlobalArgs.INFREQUENT_ACCESS_AFTER_DAYS)
+                )
+            ],
+            removal_policy=core.RemovalPolicy.RETAIN
+        )
+
+        archive_db = _glue.CfnDatabase(
+            self,
+            "logArchiveDatabase",
+            catalog_id=core.Aws.ACCOUNT_ID,
+            database_input=_glue.CfnDatabase.DatabaseInputProperty(
+                name=SchemaArgs.DATABASE_NAME,
+                description="Miztiik Automation: Archived router logs"
+            )
+        )
+
+        # Partition projection, no crawler needed to find the new days
+        archive_table = _glue.CfnTable(
+            self,
+            "logArchiveTable",
+            catalog_id=core.Aws.ACCOUNT_ID,
+            database_name=SchemaArgs.DATABASE_NAME,
+            table_input=_glue.CfnTable.TableInputProperty(
+                name=SchemaArgs.TABLE_NAME,
+                description="Router logs as Snappy compressed Parquet, partitioned by lane & arrival day",
+                table_type="EXTERNAL_TABLE",
+                parameters=projection_parameters(self.archive_bucket.bucket_name, lanes),
+                partition_keys=[_glue.CfnTable.ColumnProperty(**k) for k in PARTITION_KEYS],
+                storage_descriptor=_glue.CfnTable.StorageDescriptorProperty(
+                    columns=[_glue.CfnTable.ColumnProperty(**c) for c in archive_columns()],
+                    location=f"s3://{self.archive_bucket.bucket_name}/{SchemaArgs.OBJECT_PREFIX}/",
+                    input_format="org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat",
+                    output_format="org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat",
+                    compressed=True,
+                    serde_info=_glue.CfnTable.SerdeInfoProperty(
+                        serialization_library="org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe"
+                    )
+                )
+            )
+        )
+        archive_table.add_depends_on(archive_db)
+
+        delivery_log_group = _logs.LogGroup(
+            self,
+            "archiveDeliveryLogGroup",
+            retention=_logs.RetentionDays.ONE_WEEK,
+            removal_policy=core.RemovalPolicy.DESTROY
+        )
+
+        # Ref: https://docs.aws.amazon.com/firehose/latest/dev/controlling-access.html#using-iam-s3
+        delivery_role = _iam.Role(
+            self,
+            "archiveDeliveryRole",
+            assumed_by=_iam.ServicePrincipal("firehose.amazonaws.com")
+        )
+        # Firehose reads the schema of the Parquet files from the Glue table
+        delivery_role.add_to_policy(_iam.PolicyStatement(
+            actions=[
+                "glue:GetTable",
+                "glue:GetTableVersion",
+                "glue:GetTableVersions",
+            ],
+            resources=[
+                f"arn:aws:glue:{core.Aws.REGION}:{core.Aws.ACCOUNT_ID}:catalog",
+                f"arn:aws:glue:{core.Aws.REGION}:{core.Aws.ACCOUNT_ID}:database/{SchemaArgs.DATABASE_NAME}",
+                f"arn:aws:glue:{core.Aws.REGION}:{core.Aws.ACCOUNT_ID}:table/{SchemaArgs.DATABASE_NAME}/{SchemaArgs.TABLE_NAME}",
+            ]
+        ))
+        self.archive_bucket.grant_read_write(delivery_role)
+        delivery_log_group.grant_write(delivery_role)
+
+        self.stream_names = {}
+        self.stream_arns = []
+        for lane in lanes:
+            _logs.LogStream(
+                self,
+                f"{lane}ArchiveLogStream",
+                log_group=delivery_log_group,
+                log_stream_name=f"{lane}-s3-archive",
+                removal_policy=core.RemovalPolicy.DESTROY
+            )
+
+            # Parquet conversion requires UNCOMPRESSED here, Snappy is set on the serializer
+            delivery_stream = _firehose.CfnDeliveryStream(
+                self,
+                f"{lane}ArchiveStream",
+                delivery_stream_type="DirectPut",
+                extended_s3_destination_configuration=_firehose.CfnDeliveryStream.ExtendedS3DestinationConfigurationProperty(
+                    bucket_arn=self.archive_bucket.bucket_arn,
+                    role_arn=delivery_role.role_arn,
+                    prefix=object_prefix(lane),
+                    error_output_prefix=error_prefix(lane),
+                    compression_format="UNCOMPRESSED",
+                    buffering_hints=_firehose.CfnDeliveryStream.BufferingHintsProperty(
+                        interval_in_seconds=int(buffer_seconds),
+                        size_in_m_bs=int(buffer_mb)
+                    ),
+                    data_format_conversion_configuration=_firehose.CfnDeliveryStream.DataFormatConversionConfigurationProperty(
+                        enabled=True,
+                        input_format_configuration=_firehose.CfnDeliveryStream.InputFormatConfigurationProperty(
+                            deserializer=_firehose.CfnDeliveryStream.DeserializerProperty(
+                                open_x_json_ser_de=_firehose.CfnDeliveryStream.OpenXJsonSerDeProperty(
+                                    case_insensitive=True,
+                                    column_to_json_key_mappings=json_key_mappings()
+                                )
+                            )
+                        ),
+                        output_format_configuration=_firehose.CfnDeliveryStream.OutputFormatConfigurationProperty(
+                            serializer=_firehose.CfnDeliveryStream.SerializerProperty(
+                                parquet_ser_de=_firehose.CfnDeliveryStream.ParquetSerDeProperty(
+                                    compression="SNAPPY"
+                                )
+                            )
+                        ),
+                        schema_configuration=_firehose.CfnDeliveryStream.SchemaConfigurationProperty(
+                            catalog_id=core.Aws.ACCOUNT_ID,
+                            database_name=SchemaArgs.DATABASE_NAME,
+                            table_name=SchemaArgs.TABLE_NAME,
+                            region=core.Aws.REGION,
+                            role_arn=delivery_role.role_arn,
+                            version_id="LATEST"
+                        )
+                    ),
+                    cloud_watch_logging_options=_firehose.CfnDeliveryStream.CloudWatchLoggingOptionsProperty(
+                        enabled=True,
+                        log_group_name=delivery_log_group.log_group_name,
+                        log_stream_name=f"{lane}-s3-archive"
+                    )
+                )
+            )
+            delivery_stream.node.add_dependency(delivery_role)
+            delivery_stream.add_depends_on(archive_table)
+
+            self.stream_names[lane] = delivery_stream.ref
+            self.stream_arns.append(delivery_stream.attr_arn)
+
+    # properties to share with other stacks
+    @property
+    def get_archive_bucket_name(self):
+        return self.archive_bucket.bucket_name
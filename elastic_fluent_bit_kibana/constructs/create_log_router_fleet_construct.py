@@ -0,0 +1,185 @@
+from aws_cdk import aws_autoscaling as _autoscaling
+from aws_cdk import aws_cloudwatch as _cloudwatch
+from aws_cdk import aws_ec2 as _ec2
+from aws_cdk import aws_iam as _iam
+from aws_cdk import core
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    OWNER = "MystiqueAutomation"
+    ENVIRONMENT = "production"
+    REPO_NAME = "log_router_fleet_construct"
+    VERSION = "2020_11_22"
+    MIZTIIK_SUPPORT_EMAIL = ["mystique@example.com", ]
+
+
+class CreateLogRouterFleet(core.Construct):
+    """
+    AWS CDK Construct that runs the Fluent Bit log routers in an Auto Scaling group.
+    The fleet scales out on the Fluent Bit backlog (target tracking on the
+    average buffered chunks per router) and on bursts of output retries.
+    """
+
+    def __init__(
+        self,
+        scope: core.Construct,
+        construct_id: str,
+        vpc,
+        instance_type: str,
+        machine_image,
+        role: _iam.Role,
+        security_group: _ec2.SecurityGroup,
+        user_data: str,
+        fleet_tag: dict,
+        metric_namespace: str,
+        backlog_metric_name: str,
+        retries_metric_name: str,
+        min_capacity: int = 1,
+        max_capacity: int = 4,
+        backlog_chunks_target: int = 64,
+        retries_scale_out_threshold: int = 100,
+        name_tag: str = "fluent_bit_log_router",
+        target_group_arns: list = None,
+        **kwargs
+    ) -> None:
+
+        super().__init__(scope, construct_id, **kwargs)
+        """
+        :param fleet_tag: Tag, `{"key": ..., "value": ...}` put on every router, SSM associations target it
+        :param backlog_chunks_target: Average Fluent Bit chunks per router to keep the fleet at
+        :param retries_scale_out_threshold: Output retries per minute, across the fleet, that add a router
+        :param target_group_arns: Load balancer target groups to register the routers with
+        """
+
+        _instance_profile = _iam.CfnInstanceProfile(
+            self,
+            "logRouterInstanceProfile",
+            roles=[role.role_name]
+        )
+
+        _router_tags = [
+            {"key": "Name", "value": name_tag},
+            fleet_tag,
+        ]
+
+        self.launch_template = _ec2.CfnLaunchTemplate(
+            self,
+            "logRouterLaunchTemplate",
+            launch_template_data=_ec2.CfnLaunchTemplate.LaunchTemplateDataProperty(
+                image_id=machine_image.get_image(self).image_id,
+                instance_type=instance_type,
+                iam_instance_profile=_ec2.CfnLaunchTemplate.IamInstanceProfileProperty(
+                    arn=_instance_profile.attr_arn
+                ),
+                # No NAT Gateway in our VPC, routers need a public ip to reach the internet
+                network_interfaces=[
+                    _ec2.CfnLaunchTemplate.NetworkInterfaceProperty(
+                        device_index=0,
+                        associate_public_ip_address=True,
+                        groups=[security_group.security_group_id]
+                    )
+                ],
+                user_data=core.Fn.base64(user_data),
+                tag_specifications=[
+                    _ec2.CfnLaunchTemplate.TagSpecificationProperty(
+                        resource_type="instance",
+                        tags=[core.CfnTag(key=t["key"], value=t["value"]) for t in _router_tags]
+                    )
+                ]
+            )
+        )
+
+        self.asg = _autoscaling.CfnAutoScalingGroup(
+            self,
+            "logRouterAsg",
+            min_size=f"{min_capacity}",
+            max_size=f"{max_capacity}",
+            vpc_zone_identifier=vpc.select_subnets(
+                subnet_type=_ec2.SubnetType.PUBLIC
+            ).subnet_ids,
+            launch_template=_autoscaling.CfnAutoScalingGroup.LaunchTemplateSpecificationProperty(
+                launch_template_id=self.launch_template.ref,
+                version=self.launch_template.attr_latest_version_number
+            ),
+            target_group_arns=target_group_arns,
+            health_check_grace_period=300,
+            metrics_collection=[
+                _autoscaling.CfnAutoScalingGroup.MetricsCollectionProperty(granularity="1Minute")
+            ]
+        )
+        # Replace routers a few at a time when the launch template changes
+        self.asg.cfn_options.update_policy = core.CfnUpdatePolicy(
+            auto_scaling_rolling_update=core.CfnAutoScalingRollingUpdate(
+                max_batch_size=1,
+                min_instances_in_service=min_capacity,
+                pause_time="PT2M"
+            )
+        )
+
+        _fleet_dimension = [{"name": "AutoScalingGroupName", "value": self.asg.ref}]
+
+        # Keep the average backlog per router around the target
+        _autoscaling.CfnScalingPolicy(
+            self,
+            "scaleOnBacklog",
+            auto_scaling_group_name=self.asg.ref,
+            policy_type="TargetTrackingScaling",
+            estimated_instance_warmup=180,
+            target_tracking_configuration=_autoscaling.CfnScalingPolicy.TargetTrackingConfigurationProperty(
+                target_value=backlog_chunks_target,
+                customized_metric_specification=_autoscaling.CfnScalingPolicy.CustomizedMetricSpecificationProperty(
+                    namespace=metric_namespace,
+                    metric_name=backlog_metric_name,
+                    statistic="Average",
+                    dimensions=_fleet_dimension
+                )
+            )
+        )
+
+        # Add a router when retries keep climbing, the routers can not drain fast enough
+        retries_policy = _autoscaling.CfnScalingPolicy(
+            self,
+            "scaleOutOnRetries",
+            auto_scaling_group_name=self.asg.ref,
+            policy_type="StepScaling",
+            adjustment_type="ChangeInCapacity",
+            metric_aggregation_type="Sum",
+            estimated_instance_warmup=180,
+            step_adjustments=[
+                _autoscaling.CfnScalingPolicy.StepAdjustmentProperty(
+                    metric_interval_lower_bound=0,
+                    metric_interval_upper_bound=retries_scale_out_threshold * 4,
+                    scaling_adjustment=1
+                ),
+                _autoscaling.CfnScalingPolicy.StepAdjustmentProperty(
+                    metric_interval_lower_bound=retries_scale_out_threshold * 4,
+                    scaling_adjustment=2
+                ),
+            ]
+        )
+
+        self.retries_alarm = _cloudwatch.CfnAlarm(
+            self,
+            "logRouterRetriesAlarm",
+            alarm_description="Fluent Bit output retries are climbing across the log router fleet",
+            namespace=metric_namespace,
+            metric_name=retries_metric_name,
+            dimensions=[_cloudwatch.CfnAlarm.DimensionProperty(name="AutoScalingGroupName", value=self.asg.ref)],
+            statistic="Sum",
+            period=60,
+            evaluation_periods=3,
+            datapoints_to_alarm=2,
+            threshold=retries_scale_out_threshold,
+            comparison_operator="GreaterThanOrEqualToThreshold",
+            treat_missing_data="notBreaching",
+            alarm_actions=[retries_policy.ref]
+        )
+
+    # properties to share with other stacks
+    @property
+    def get_asg_name(self):
+        return self.asg.ref
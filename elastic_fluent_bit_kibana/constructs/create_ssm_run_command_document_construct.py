@@ -24,10 +24,14 @@ class CreateSsmRunCommandDocument(core.Construct):
         _doc_desc: str,
         bash_commands_to_run: str,
         enable_log: bool,
+        execution_timeout_seconds: int = 60,
         **kwargs
     ) -> None:
 
         super().__init__(scope, construct_id, **kwargs)
+        """
+        :param execution_timeout_seconds: Time the script may run on an instance before it is failed
+        """
 
         # SSM Run Command Document should be JSON Syntax
         # Ref: https://docs.aws.amazon.com/AWSCloudFormation/latest/UserGuide/aws-resource-ssm-document.html#cfn-ssm-document-content
@@ -47,7 +51,7 @@ class CreateSsmRunCommandDocument(core.Construct):
                     "action": "aws:runShellScript",
                     "name": "runCommands",
                     "inputs": {
-                        "timeoutSeconds": "60",
+                        "timeoutSeconds": f"{execution_timeout_seconds}",
                         "runCommand": [
                             "{{ commands }}"
                         ]
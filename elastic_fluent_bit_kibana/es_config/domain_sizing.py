@@ -0,0 +1,209 @@
+import math
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    # Replicas, indexing overhead 10%, OS reserved 5% & the 20% ES keeps for
+    # merges & recovery, from the AWS sizing guide
+    # Ref: https://docs.aws.amazon.com/elasticsearch-service/latest/developerguide/sizing-domains.html
+    STORAGE_OVERHEAD = 1.45
+    # Free disk on top, for growth & for the shards of a lost node to move to
+    DISK_HEADROOM = 1.25
+    MIN_VOLUME_GB = 10
+    # Zone awareness over 2 AZs needs an even number of data nodes
+    AZ_COUNT = 2
+    MAX_DATA_NODES = 10
+    # Dedicated masters once the cluster is big enough to lose a quorum to a busy data node
+    DEDICATED_MASTER_FROM_NODES = 4
+    DEDICATED_MASTER_COUNT = 3
+    # Shards a node can hold per GB of JVM heap
+    SHARDS_PER_HEAP_GB = 20
+    # Provisioned IOPS per GB for io1, AWS allows up to 50
+    IO1_IOPS_PER_GB = 10
+    IO1_MAX_IOPS_PER_GB = 50
+    IO1_MIN_IOPS = 1000
+    IO1_MAX_IOPS = 16000
+
+
+# Data node types ES 7.9 runs on, smallest first. `max_ebs_gb` is the largest
+# EBS volume AWS allows per node of the type.
+# Ref: https://docs.aws.amazon.com/elasticsearch-service/latest/developerguide/aes-limits.html
+INSTANCE_TYPES = {
+    "t3.small.elasticsearch": {"vcpu": 2, "memory_gb": 2, "max_ebs_gb": 100},
+    "t3.medium.elasticsearch": {"vcpu": 2, "memory_gb": 4, "max_ebs_gb": 200},
+    "m5.large.elasticsearch": {"vcpu": 2, "memory_gb": 8, "max_ebs_gb": 512},
+    "m5.xlarge.elasticsearch": {"vcpu": 4, "memory_gb": 16, "max_ebs_gb": 1024},
+    "m5.2xlarge.elasticsearch": {"vcpu": 8, "memory_gb": 32, "max_ebs_gb": 1536},
+    "r5.large.elasticsearch": {"vcpu": 2, "memory_gb": 16, "max_ebs_gb": 1024},
+    "r5.xlarge.elasticsearch": {"vcpu": 4, "memory_gb": 32, "max_ebs_gb": 1536},
+    "r5.2xlarge.elasticsearch": {"vcpu": 8, "memory_gb": 64, "max_ebs_gb": 3072},
+}
+
+# Candidate data node types per query load, in order of preference. Heavy
+# dashboards & aggregations want heap, so they start on the memory optimised r5.
+QUERY_LOADS = {
+    "light": {
+        "instance_types": [
+            "t3.small.elasticsearch", "t3.medium.elasticsearch",
+            "m5.large.elasticsearch", "m5.xlarge.elasticsearch", "m5.2xlarge.elasticsearch",
+        ],
+        "volume_type": "gp2",
+    },
+    "medium": {
+        "instance_types": [
+            "m5.large.elasticsearch", "m5.xlarge.elasticsearch", "m5.2xlarge.elasticsearch",
+            "r5.xlarge.elasticsearch", "r5.2xlarge.elasticsearch",
+        ],
+        "volume_type": "gp2",
+    },
+    "heavy": {
+        "instance_types": [
+            "r5.large.elasticsearch", "r5.xlarge.elasticsearch", "r5.2xlarge.elasticsearch",
+        ],
+        "volume_type": "io1",
+    },
+}
+
+# Master node type by data node count, from the AWS dedicated master guide
+# Ref: https://docs.aws.amazon.com/elasticsearch-service/latest/developerguide/es-managedomains-dedicatedmasternodes.html
+MASTER_TYPES = [
+    (10, "m5.large.elasticsearch"),
+    (30, "c5.xlarge.elasticsearch"),
+    (75, "c5.2xlarge.elasticsearch"),
+]
+
+
+class DomainSizingError(ValueError):
+    """
+    Raised when no domain in `INSTANCE_TYPES` fits the declared workload
+    """
+
+
+def _round_up_even(n: int) -> int:
+    return n + (n % GlobalArgs.AZ_COUNT)
+
+
+def heap_gb(instance_type: str) -> float:
+    # Half the memory, capped below the compressed oops limit
+    return min(INSTANCE_TYPES[instance_type]["memory_gb"] / 2.0, 31)
+
+
+def _live_shards(retention_days: int, nodes: int, replicas: int, single_shard_indices_per_day: int) -> int:
+    # Daily rollover, one primary per data node for the main index as the index templates do
+    return int(retention_days) * (nodes + single_shard_indices_per_day) * (1 + int(replicas))
+
+
+def _shard_capacity(instance_type: str, nodes: int) -> float:
+    return GlobalArgs.SHARDS_PER_HEAP_GB * heap_gb(instance_type) * nodes
+
+
+def size_domain(
+    gb_per_day: float,
+    retention_days: int,
+    replicas: int = 1,
+    query_load: str = "light",
+    single_shard_indices_per_day: int = 1
+) -> dict:
+    """
+    Derive the data nodes, EBS volumes & dedicated masters of the domain from
+    the declared workload.
+    :param gb_per_day: Raw log volume shipped per day, all lanes together
+    :param retention_days: Days an index lives before ISM deletes it
+    :param replicas: Replicas of every primary shard
+    :param query_load: `light`, `medium` or `heavy`, see `QUERY_LOADS`
+    :param single_shard_indices_per_day: Daily indices with one primary next to the
+                                         main index, the errors lane
+    :return: Sizing plan, with `warnings` for limits the plan is close to
+    :raises DomainSizingError: When no type holds the storage & the shards on `MAX_DATA_NODES`
+    """
+    if query_load not in QUERY_LOADS:
+        raise DomainSizingError(f"query_load '{query_load}' must be one of {sorted(QUERY_LOADS)}")
+    if float(gb_per_day) <= 0 or int(retention_days) < 1 or int(replicas) < 0:
+        raise DomainSizingError(
+            f"gb_per_day '{gb_per_day}' must be positive, retention_days '{retention_days}' at least 1 "
+            f"and replicas '{replicas}' not negative")
+    load = QUERY_LOADS[query_load]
+    storage_gb = float(gb_per_day) * int(retention_days) * (1 + int(replicas)) * GlobalArgs.STORAGE_OVERHEAD
+
+    # Per type, the even node count that holds the storage, grown until the
+    # heap holds the live shards too
+    candidates = []
+    for instance_type in load["instance_types"]:
+        max_ebs_gb = INSTANCE_TYPES[instance_type]["max_ebs_gb"]
+        disk_nodes = max(GlobalArgs.AZ_COUNT, math.ceil(storage_gb * GlobalArgs.DISK_HEADROOM / max_ebs_gb))
+        disk_nodes = nodes = _round_up_even(disk_nodes)
+        while nodes <= GlobalArgs.MAX_DATA_NODES and (
+                _live_shards(retention_days, nodes, replicas, single_shard_indices_per_day)
+                > _shard_capacity(instance_type, nodes)):
+            nodes += GlobalArgs.AZ_COUNT
+        if nodes <= GlobalArgs.MAX_DATA_NODES:
+            candidates.append((instance_type, nodes, disk_nodes))
+    if not candidates:
+        raise DomainSizingError(
+            f"{storage_gb:.0f}GB & its shards need more than {GlobalArgs.MAX_DATA_NODES} data nodes of the "
+            f"'{query_load}' types, shorten the retention, roll over less often or split the domain")
+    # Shard pressure moves to a type with more heap before it adds nodes
+    instance_type, nodes, disk_nodes = next((c for c in candidates if c[1] == c[2]), candidates[0])
+
+    max_ebs_gb = INSTANCE_TYPES[instance_type]["max_ebs_gb"]
+    volume_size = max(GlobalArgs.MIN_VOLUME_GB, math.ceil(storage_gb * GlobalArgs.DISK_HEADROOM / nodes))
+    volume_size = min(volume_size, max_ebs_gb)
+    ebs = {"volume_type": load["volume_type"], "volume_size": volume_size}
+    if load["volume_type"] == "io1":
+        ebs["iops"] = min(
+            GlobalArgs.IO1_MAX_IOPS,
+            max(GlobalArgs.IO1_MIN_IOPS, volume_size * GlobalArgs.IO1_IOPS_PER_GB)
+        )
+        # io1 caps the IOPS per GB, a volume too small for the minimum IOPS grows
+        ebs["volume_size"] = max(volume_size, math.ceil(ebs["iops"] / GlobalArgs.IO1_MAX_IOPS_PER_GB))
+
+    dedicated_master = nodes >= GlobalArgs.DEDICATED_MASTER_FROM_NODES
+    master_type = next(t for limit, t in MASTER_TYPES if nodes <= limit) if dedicated_master else None
+
+    shards = _live_shards(retention_days, nodes, replicas, single_shard_indices_per_day)
+    warnings = []
+    if nodes > disk_nodes:
+        warnings.append(
+            f"{nodes} data nodes so the heap holds {shards} shards, {disk_nodes} would hold the data, "
+            f"roll over less often or shorten the retention")
+    if instance_type.startswith("t3."):
+        warnings.append("T3 nodes run on CPU credits, fine for a demo, not for steady production ingest")
+    if int(replicas) == 0:
+        warnings.append("No replicas, losing a node loses data")
+
+    return {
+        "gb_per_day": float(gb_per_day),
+        "retention_days": int(retention_days),
+        "replicas": int(replicas),
+        "query_load": query_load,
+        "storage_gb": round(storage_gb, 1),
+        "instance_type": instance_type,
+        "instance_count": nodes,
+        "ebs": ebs,
+        "dedicated_master_enabled": dedicated_master,
+        "dedicated_master_type": master_type,
+        "dedicated_master_count": GlobalArgs.DEDICATED_MASTER_COUNT if dedicated_master else None,
+        "shards": shards,
+        "warnings": warnings,
+    }
+
+
+def sizing_report(plan: dict) -> str:
+    lines = [
+        "Elasticsearch domain sizing",
+        f"  workload     {plan['gb_per_day']:g}GB/day kept {plan['retention_days']} days, "
+        f"{plan['replicas']} replica(s), {plan['query_load']} query load",
+        f"  storage      {plan['storage_gb']:g}GB with replicas & overhead",
+        f"  data nodes   {plan['instance_count']} x {plan['instance_type']}",
+        f"  ebs          {plan['ebs']['volume_size']}GB {plan['ebs']['volume_type']} per node"
+        + (f", {plan['ebs']['iops']} IOPS" if plan["ebs"].get("iops") else ""),
+        "  masters      " + (
+            f"{plan['dedicated_master_count']} x {plan['dedicated_master_type']}"
+            if plan["dedicated_master_enabled"] else "none, data nodes elect the master"),
+        f"  shards       {plan['shards']} live",
+    ]
+    lines += [f"  WARNING      {w}" for w in plan["warnings"]]
+    return "\n".join(lines)
@@ -0,0 +1,137 @@
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    # Fluent Bit keeps writing to `Index miztiik_automation`, now the write alias
+    WRITE_ALIAS = "miztiik_automation"
+    # Index of the errors priority lane of the routers
+    ERROR_WRITE_ALIAS = "miztiik_automation_errors"
+    # Index of the per-window request summaries of the routers
+    METRICS_WRITE_ALIAS = "miztiik_automation_metrics"
+    WRITE_ALIASES = [WRITE_ALIAS, ERROR_WRITE_ALIAS, METRICS_WRITE_ALIAS]
+    # One policy for every alias, the rollover alias comes from the index settings
+    POLICY_ID = "miztiik_automation_lifecycle"
+    TEMPLATE_SUFFIX = "_lifecycle"
+    # Sized for the 2 x 10GB EBS domain
+    ROLLOVER_MIN_SIZE = "2gb"
+    ROLLOVER_MIN_INDEX_AGE = "1d"
+    WARM_AFTER = "2d"
+    DELETE_AFTER = "7d"
+
+
+def index_pattern(alias: str = GlobalArgs.WRITE_ALIAS) -> str:
+    return f"{alias}-*"
+
+
+def first_index(alias: str = GlobalArgs.WRITE_ALIAS) -> str:
+    # Rollover increments the trailing number, it must be zero padded
+    return f"{alias}-000001"
+
+
+def ism_policy(
+    alias: str = GlobalArgs.WRITE_ALIAS,
+    rollover_min_size: str = GlobalArgs.ROLLOVER_MIN_SIZE,
+    rollover_min_index_age: str = GlobalArgs.ROLLOVER_MIN_INDEX_AGE,
+    warm_after: str = GlobalArgs.WARM_AFTER,
+    delete_after: str = GlobalArgs.DELETE_AFTER
+) -> dict:
+    """
+    Index State Management policy: roll the write index over, force merge &
+    drop the replicas of indices that stopped taking writes, then delete them.
+    Ref: https://docs.aws.amazon.com/elasticsearch-service/latest/developerguide/ism.html
+    """
+    return {
+        "policy": {
+            "description": f"Rollover, shrink & expire the {alias} indices",
+            "default_state": "hot",
+            "states": [
+                {
+                    "name": "hot",
+                    "actions": [
+                        {
+                            "rollover": {
+                                "min_size": rollover_min_size,
+                                "min_index_age": rollover_min_index_age,
+                            }
+                        }
+                    ],
+                    "transitions": [
+                        {"state_name": "warm", "conditions": {"min_index_age": warm_after}}
+                    ],
+                },
+                {
+                    "name": "warm",
+                    "actions": [
+                        {"replica_count": {"number_of_replicas": 0}},
+                        {"force_merge": {"max_num_segments": 1}},
+                    ],
+                    "transitions": [
+                        {"state_name": "delete", "conditions": {"min_index_age": delete_after}}
+                    ],
+                },
+                {
+                    "name": "delete",
+                    "actions": [{"delete": {}}],
+                    "transitions": [],
+                },
+            ],
+        }
+    }
+
+
+def lifecycle_template(alias: str = GlobalArgs.WRITE_ALIAS, policy_id: str = GlobalArgs.POLICY_ID) -> dict:
+    """
+    Index template that attaches the ISM policy & the rollover alias to every
+    index created by a rollover
+    """
+    return {
+        "index_patterns": [index_pattern(alias)],
+        "order": 0,
+        "settings": {
+            "opendistro.index_state_management.policy_id": policy_id,
+            "opendistro.index_state_management.rollover_alias": alias,
+        },
+    }
+
+
+def lifecycle_admin_steps(
+    aliases: list = GlobalArgs.WRITE_ALIASES,
+    policy_id: str = GlobalArgs.POLICY_ID,
+    **policy_kwargs
+) -> list:
+    """
+    Steps for the `es_admin` custom resource. Order matters, the template must
+    exist before the first index, so the index picks up the policy.
+    :param aliases: Write aliases, each gets its own lifecycle template & first index
+    """
+    steps = [
+        {
+            "kind": "ism_policy",
+            "path": f"/_opendistro/_ism/policies/{policy_id}",
+            "body": ism_policy(", ".join(aliases), **policy_kwargs),
+        },
+    ]
+    for alias in aliases:
+        steps += alias_admin_steps(alias, policy_id)
+    return steps
+
+
+def alias_admin_steps(alias: str, policy_id: str = GlobalArgs.POLICY_ID) -> list:
+    return [
+        {
+            "kind": "request",
+            "method": "PUT",
+            "path": f"/_template/{alias}{GlobalArgs.TEMPLATE_SUFFIX}",
+            "body": lifecycle_template(alias, policy_id),
+        },
+        {
+            # Bootstrap the first index behind the write alias, once
+            "kind": "request",
+            "method": "PUT",
+            "path": f"/{first_index(alias)}",
+            "body": {"aliases": {alias: {"is_write_index": True}}},
+            "skip_if_exists": f"/_alias/{alias}",
+            "fail_if_exists": f"/{alias}",
+        },
+    ]
@@ -0,0 +1,108 @@
+from elastic_fluent_bit_kibana.es_config.index_lifecycle import GlobalArgs as LifecycleArgs
+from elastic_fluent_bit_kibana.es_config.index_lifecycle import index_pattern
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    # `rollup_<write alias>_<interval>`, outside the `miztiik_automation*` pattern
+    # of the raw indices, Kibana can not search raw & rolled up indices together
+    TARGET_PREFIX = "rollup_"
+    TIME_FIELD = "@timestamp"
+    # Schedules need a start, the first day logs can exist
+    SCHEDULE_START_MS = 1604188800000
+    # Minutes a window waits for late documents before it is rolled up
+    DELAY_MINUTES = 15
+    PAGE_SIZE = 1000
+
+
+# Rollup jobs per interval. Source, target, dimensions & metrics of a job can
+# not change once it exists, delete the job & its target index to change them.
+ROLLUP_INTERVALS = {
+    "hourly": {"fixed_interval": "1h", "schedule_unit": "Hours"},
+    "daily": {"fixed_interval": "1d", "schedule_unit": "Days"},
+}
+
+# Keyword fields long range views split by, each adds a bucket per value. The
+# app lane shares the index but has no `code` or `method`, a filter on `code` leaves it out.
+ROLLUP_DIMENSIONS = ["hostname", "tag", "code", "method"]
+
+# Numeric fields & their aggregations. A rolled up document stands for many
+# requests, count them with the sum of `sample_weight`, not the document count.
+# The routers give every record a weight, 1 when it was not sampled.
+ROLLUP_METRICS = {
+    "sample_weight": ["sum", "value_count"],
+    "size": ["sum", "avg", "max"],
+    "duration_us": ["sum", "avg", "max"],
+}
+
+
+def rollup_target(interval: str, alias: str = LifecycleArgs.WRITE_ALIAS) -> str:
+    return f"{GlobalArgs.TARGET_PREFIX}{alias}_{interval}"
+
+
+def rollup_job(
+    interval: str,
+    alias: str = LifecycleArgs.WRITE_ALIAS,
+    delay_minutes: int = GlobalArgs.DELAY_MINUTES,
+    page_size: int = GlobalArgs.PAGE_SIZE
+) -> dict:
+    """
+    Continuous rollup job summarising the raw indices behind `alias` into
+    `interval` buckets, every `interval`
+    Ref: https://opendistro.github.io/for-elasticsearch-docs/docs/im/index-rollups/
+    :param interval: Key of `ROLLUP_INTERVALS`
+    """
+    if interval not in ROLLUP_INTERVALS:
+        raise ValueError(f"rollup interval '{interval}' must be one of {sorted(ROLLUP_INTERVALS)}")
+    if int(delay_minutes) < 0:
+        raise ValueError(f"delay_minutes '{delay_minutes}' can not be negative")
+    settings = ROLLUP_INTERVALS[interval]
+    dimensions = [{
+        "date_histogram": {
+            "source_field": GlobalArgs.TIME_FIELD,
+            "fixed_interval": settings["fixed_interval"],
+            "timezone": "UTC",
+        }
+    }]
+    dimensions += [{"terms": {"source_field": field}} for field in ROLLUP_DIMENSIONS]
+    return {
+        "rollup": {
+            "source_index": index_pattern(alias),
+            "target_index": rollup_target(interval, alias),
+            "description": f"{interval.capitalize()} rollup of the {alias} indices",
+            "enabled": True,
+            "continuous": True,
+            "schedule": {
+                "interval": {
+                    "period": 1,
+                    "unit": settings["schedule_unit"],
+                    "start_time": GlobalArgs.SCHEDULE_START_MS,
+                }
+            },
+            "delay": int(delay_minutes) * 60 * 1000,
+            "page_size": int(page_size),
+            "dimensions": dimensions,
+            "metrics": [
+                {"source_field": field, "metrics": [{m: {}} for m in metrics]}
+                for field, metrics in ROLLUP_METRICS.items()
+            ],
+        }
+    }
+
+
+def rollup_admin_steps(alias: str = LifecycleArgs.WRITE_ALIAS, **job_kwargs) -> list:
+    """
+    Steps for the `es_admin` custom resource, run them once the first index exists.
+    Kibana sits behind Cognito, not SigV4, so its index patterns are created in Kibana.
+    """
+    return [
+        {
+            "kind": "rollup_job",
+            "path": f"/_opendistro/_rollup/jobs/{rollup_target(interval, alias)}",
+            "body": rollup_job(interval, alias, **job_kwargs),
+        }
+        for interval in ROLLUP_INTERVALS
+    ]
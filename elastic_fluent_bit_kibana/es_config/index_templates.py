@@ -0,0 +1,150 @@
+from elastic_fluent_bit_kibana.es_config.index_lifecycle import GlobalArgs as LifecycleArgs
+from elastic_fluent_bit_kibana.es_config.index_lifecycle import index_pattern
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    # `<write alias>_ingest`
+    TEMPLATE_SUFFIX = "_ingest"
+    # Refresh less often than the 1s default, Fluent Bit flushes every few seconds anyway
+    REFRESH_INTERVAL = "30s"
+    NUMBER_OF_REPLICAS = 1
+    # Unknown fields reject the document, `false` keeps them in `_source` only
+    DYNAMIC = "strict"
+
+
+# Fields written by the log routers: the tailed line, `Path_Key`, the
+# `record_modifier` records, the `Tag_Key` of the `es` output & the weight of a sampled record. Fields we only read back in
+# the `_source` are neither indexed nor kept in doc values.
+FIELD_MAPPINGS = {
+    "@timestamp": {"type": "date"},
+    "log": {"type": "text", "norms": False},
+    "filename": {"type": "keyword"},
+    "hostname": {"type": "keyword"},
+    "tag": {"type": "keyword"},
+    "project": {"type": "keyword", "index": False, "doc_values": False},
+    "user": {"type": "keyword", "index": False, "doc_values": False},
+    # Records the kept one stands for, sum it to count requests, see `fluent_bit/sampling.py`
+    "sample_weight": {"type": "float"},
+}
+
+# Fields of the regex parsers in `fluent_bit/parsers.py`. A `json` parsed
+# record brings its own keys, map them before routing it to a `strict` index.
+PARSED_FIELD_MAPPINGS = {
+    # apache2
+    "remote": {"type": "keyword"},
+    "auth_user": {"type": "keyword"},
+    "method": {"type": "keyword"},
+    "path": {"type": "keyword", "ignore_above": 2048},
+    "code": {"type": "short", "ignore_malformed": True},
+    "size": {"type": "long", "ignore_malformed": True},
+    "duration_us": {"type": "long", "ignore_malformed": True},
+    "referer": {"type": "keyword", "ignore_above": 2048},
+    "agent": {"type": "keyword", "ignore_above": 512},
+    # apache_error & syslog
+    "module": {"type": "keyword"},
+    "level": {"type": "keyword"},
+    "pid": {"type": "keyword"},
+    "client": {"type": "keyword"},
+    "source_host": {"type": "keyword"},
+    "ident": {"type": "keyword"},
+    "message": {"type": "text", "norms": False},
+}
+
+# Fields of the request summaries in `fluent_bit/log_metrics.py`, next to the
+# `record_modifier` records & `Tag_Key`. Sum `requests` & `errors`,
+# the percentiles are per window & path, average them with care.
+METRIC_FIELD_MAPPINGS = {
+    "@timestamp": {"type": "date"},
+    "hostname": {"type": "keyword"},
+    "tag": {"type": "keyword"},
+    "project": {"type": "keyword", "index": False, "doc_values": False},
+    "user": {"type": "keyword", "index": False, "doc_values": False},
+    "window_seconds": {"type": "integer"},
+    "path": {"type": "keyword", "ignore_above": 2048},
+    "code": {"type": "short"},
+    "requests": {"type": "long"},
+    "errors": {"type": "long"},
+    "bytes": {"type": "long"},
+    "duration_us_sum": {"type": "long"},
+    "duration_us_max": {"type": "long"},
+    "duration_us_p50": {"type": "long"},
+    "duration_us_p90": {"type": "long"},
+    "duration_us_p99": {"type": "long"},
+}
+
+
+def alias_field_mappings(alias: str = LifecycleArgs.WRITE_ALIAS) -> dict:
+    """
+    Default mappings of the indices behind `alias`, as the ES stack installs them
+    """
+    if alias == LifecycleArgs.METRICS_WRITE_ALIAS:
+        return METRIC_FIELD_MAPPINGS
+    return {**FIELD_MAPPINGS, **PARSED_FIELD_MAPPINGS}
+
+
+def ingest_template(
+    number_of_shards: int,
+    number_of_replicas: int = GlobalArgs.NUMBER_OF_REPLICAS,
+    refresh_interval: str = GlobalArgs.REFRESH_INTERVAL,
+    dynamic: str = GlobalArgs.DYNAMIC,
+    alias: str = LifecycleArgs.WRITE_ALIAS,
+    field_mappings: dict = None
+) -> dict:
+    """
+    Index template tuned for ingest, applied next to the lifecycle template.
+    :param number_of_shards: Match the data node count, one primary per node
+    :param dynamic: `strict`, `false` or `true`, what to do with unmapped fields
+    """
+    if str(dynamic).lower() not in ("strict", "false", "true"):
+        raise ValueError(f"dynamic '{dynamic}' must be strict, false or true")
+    if int(number_of_shards) < 1:
+        raise ValueError(f"number_of_shards '{number_of_shards}' must be at least 1")
+    return {
+        "index_patterns": [index_pattern(alias)],
+        # Above the lifecycle template, so its settings win on a clash
+        "order": 1,
+        "settings": {
+            "index.number_of_shards": int(number_of_shards),
+            "index.number_of_replicas": int(number_of_replicas),
+            "index.refresh_interval": refresh_interval,
+        },
+        "mappings": {
+            "dynamic": str(dynamic).lower(),
+            "properties": field_mappings or {**FIELD_MAPPINGS, **PARSED_FIELD_MAPPINGS},
+        },
+    }
+
+
+def template_admin_steps(number_of_shards: int, alias: str = LifecycleArgs.WRITE_ALIAS, **kwargs) -> list:
+    """
+    Steps for the `es_admin` custom resource, run them before the first index is created
+    """
+    return [
+        {
+            "kind": "request",
+            "method": "PUT",
+            "path": f"/_template/{alias}{GlobalArgs.TEMPLATE_SUFFIX}",
+            "body": ingest_template(number_of_shards, alias=alias, **kwargs),
+        },
+    ]
+
+
+def mapping_admin_steps(alias: str = LifecycleArgs.WRITE_ALIAS, field_mappings: dict = None) -> list:
+    """
+    Steps for the `es_admin` custom resource, run them once the alias exists.
+    A template only shapes the next index, without this a `strict` write index
+    rejects a newly mapped field until it rolls over. Existing fields can not
+    change type, a type change still waits for the rollover or a reindex.
+    """
+    return [
+        {
+            "kind": "request",
+            "method": "PUT",
+            "path": f"/{alias}/_mapping",
+            "body": {"properties": field_mappings or {**FIELD_MAPPINGS, **PARSED_FIELD_MAPPINGS}},
+        },
+    ]
@@ -0,0 +1,79 @@
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import FluentBitPipeline
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import Input
+from elastic_fluent_bit_kibana.fluent_bit.monitoring import enable_http_metrics
+from elastic_fluent_bit_kibana.fluent_bit.profiles import apply_es_tuning
+from elastic_fluent_bit_kibana.fluent_bit.profiles import apply_profile
+from elastic_fluent_bit_kibana.fluent_bit.router_config import GlobalArgs as RouterArgs
+from elastic_fluent_bit_kibana.fluent_bit.router_config import ROUTER_LANES
+from elastic_fluent_bit_kibana.fluent_bit.router_config import es_output
+from elastic_fluent_bit_kibana.fluent_bit.router_config import lane_alias
+from elastic_fluent_bit_kibana.fluent_bit.storage import enable_filesystem_buffering
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    LISTEN = "0.0.0.0"
+    FORWARD_PORT = RouterArgs.FORWARD_PORT
+    # Plugin aliases, the `name` dimension of the exported Prometheus metrics,
+    # outputs are suffixed with the lane name
+    INPUT_ALIAS = "aggregator_forward"
+    ES_OUTPUT_ALIAS = "aggregator_es"
+
+
+def build_aggregator_pipeline(
+    es_endpoint: str,
+    es_region: str,
+    profile: str = "aggregator",
+    durable_buffering: bool = True,
+    lanes: dict = None,
+    es_tuning: dict = None
+) -> FluentBitPipeline:
+    """
+    Fluent Bit pipeline run by the aggregators: receive records from the
+    routers over `forward` and ship them to the Elasticsearch domain. Records
+    from many routers land in the same chunks, so each flush sends fewer,
+    fuller `_bulk` requests than the routers would on their own.
+    :param es_endpoint: Domain endpoint, usually a token resolved from SSM
+    :param es_region: Region of the domain, usually a token resolved from SSM
+    :param profile: Tuning profile from `PIPELINE_PROFILES`
+    :param durable_buffering: Buffer chunks on disk, survives agent restarts
+    :param lanes: Priority lanes of the routers, `ROUTER_LANES` by default.
+                  Each lane keeps its own output here too.
+    :param es_tuning: Bulk tuning of the `es` outputs, see `apply_es_tuning`
+    """
+    lanes = lanes or ROUTER_LANES
+    pipeline = FluentBitPipeline()
+    # Records keep the tag the routers gave them
+    pipeline.upstream_tags.extend(lane["tag"] for lane in lanes.values())
+
+    pipeline.add_input(Input(
+        "forward",
+        tag=None,
+        properties={
+            "Alias": GlobalArgs.INPUT_ALIAS,
+            "Listen": GlobalArgs.LISTEN,
+            "Port": GlobalArgs.FORWARD_PORT,
+        }
+    ))
+
+    lane_outputs = {}
+    for name, lane in lanes.items():
+        lane_outputs[name] = pipeline.add_output(es_output(
+            es_endpoint,
+            es_region,
+            match=lane["tag"],
+            alias=lane_alias(GlobalArgs.ES_OUTPUT_ALIAS, name),
+            index=lane["index"]
+        ))
+
+    apply_profile(pipeline, profile)
+    apply_es_tuning(pipeline, es_tuning or {})
+    for name, lane_output in lane_outputs.items():
+        lane_output.update(lanes[name].get("output", {}))
+    enable_http_metrics(pipeline)
+    if durable_buffering:
+        enable_filesystem_buffering(pipeline)
+    return pipeline
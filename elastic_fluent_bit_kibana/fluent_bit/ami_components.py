@@ -0,0 +1,60 @@
+import hashlib
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    SCHEMA_VERSION = "1.0"
+    # Inline component documents are limited to 16000 characters
+    MAX_COMPONENT_DATA_CHARS = 16000
+    # Image Builder versions are `major.minor.patch`, each part below 2^30
+    MAJOR_VERSION = 1
+    PATCH_HEX_DIGITS = 7
+
+
+def _indent(text: str, spaces: int) -> str:
+    pad = " " * spaces
+    return "".join(f"{pad}{line}" if line.strip() else "\n" for line in text.splitlines(True))
+
+
+def component_document(name: str, description: str, phases: dict) -> str:
+    """
+    Image Builder component document running bash scripts.
+    :param phases: `{<phase>: [(<step name>, <bash script>), ...]}`, phases
+                   are `build`, `validate` or `test`
+    """
+    doc = (
+        f"name: {name}\n"
+        f"description: {description}\n"
+        f"schemaVersion: {GlobalArgs.SCHEMA_VERSION}\n"
+        "phases:\n"
+    )
+    for phase, steps in phases.items():
+        doc += f"  - name: {phase}\n    steps:\n"
+        for step_name, script in steps:
+            if "\t" in script:
+                raise ValueError(f"{name}/{step_name}: tabs are not allowed in a YAML block")
+            doc += (
+                f"      - name: {step_name}\n"
+                "        action: ExecuteBash\n"
+                "        inputs:\n"
+                "          commands:\n"
+                "            - |\n"
+                + _indent(script.strip("\n") + "\n", 14)
+            )
+    if len(doc) > GlobalArgs.MAX_COMPONENT_DATA_CHARS:
+        raise ValueError(
+            f"Component {name} is {len(doc)} characters, over the "
+            f"{GlobalArgs.MAX_COMPONENT_DATA_CHARS} Image Builder accepts inline")
+    return doc
+
+
+def content_version(*parts: str) -> str:
+    """
+    Semantic version derived from the content. Components & recipes can not be
+    changed once created, a new version is needed whenever the scripts change.
+    """
+    digest = hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+    return f"{GlobalArgs.MAJOR_VERSION}.0.{int(digest[:GlobalArgs.PATCH_HEX_DIGITS], 16)}"
@@ -0,0 +1,317 @@
+import posixpath
+
+from elastic_fluent_bit_kibana.fluent_bit.monitoring import GlobalArgs as MonitoringArgs
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import FluentBitPipeline
+from elastic_fluent_bit_kibana.fluent_bit.storage import state_directories
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    # Hot reload, `--enable-hot-reload` & `/api/v2/reload`, needs Fluent Bit 2.1 or
+    # later. The `td-agent-bit` package stops at 1.9, 2.x ships as `fluent-bit`.
+    FLUENT_BIT_PACKAGE = "fluent-bit"
+    FLUENT_BIT_VERSION = "2.2.3"
+    FLUENT_BIT_SERVICE = "fluent-bit"
+    # Agent of earlier deployments, it would hold on to the HTTP server port
+    LEGACY_SERVICE = "td-agent-bit"
+    MAIN_CONFIG = "/etc/fluent-bit/fluent-bit.conf"
+    FLUENT_BIT_BIN = "/opt/fluent-bit/bin/fluent-bit"
+    # Heredoc delimiter, must never appear as a line of a rendered config
+    HEREDOC_EOF = "FLUENT_BIT_CONF"
+    # Every config lives in `releases/<sha256 prefix>`, `current` links the live one
+    RELEASES_DIR = "${APP_DIR}/releases"
+    CURRENT_LINK = "${APP_DIR}/current"
+    KEEP_RELEASES = 5
+    HOT_RELOAD_DROP_IN = "/etc/systemd/system/fluent-bit.service.d/hot-reload.conf"
+    # Bounded waits, their sum stays well under the Run Command timeout
+    DRAIN_TIMEOUT_SECONDS = 60
+    RELOAD_TIMEOUT_SECONDS = 30
+    HEALTH_CHECK_SECONDS = 15
+    RUN_COMMAND_TIMEOUT_SECONDS = 600
+
+
+SCRIPT_HEADER = """
+#!/bin/bash
+set -ex
+set -o pipefail
+
+# version: 22Nov2020
+
+##################################################
+#############     SET GLOBALS     ################
+##################################################
+
+REPO_NAME="elastic-fluent-bit-kibana"
+
+GIT_REPO_URL="https://github.com/miztiik/$REPO_NAME.git"
+
+APP_DIR="/var/$REPO_NAME"
+
+LOG_FILE="/var/log/miztiik-automation-configure-fluent-bit.log"
+
+function install_fluent_bit(){
+# Pre-baked router AMIs already have the agent
+if [ -x "${FLUENT_BIT_BIN}" ]; then
+    echo "${FLUENT_BIT_PACKAGE} is already installed"
+    return 0
+fi
+# https://docs.fluentbit.io/manual/installation/linux/amazon-linux
+cat > '/etc/yum.repos.d/fluent-bit.repo' << "EOF"
+[fluent-bit]
+name = Fluent Bit
+baseurl = https://packages.fluentbit.io/amazonlinux/2/$basearch/
+gpgcheck=1
+gpgkey=https://packages.fluentbit.io/fluentbit.key
+enabled=1
+EOF
+
+# Retire the 1.x agent of an earlier deployment, the tail offsets & chunks
+# stay in the state directory for the new agent
+if systemctl is-enabled --quiet "${LEGACY_SERVICE}" 2> /dev/null; then
+    sudo systemctl disable --now "${LEGACY_SERVICE}"
+fi
+
+# Install the agent
+sudo yum -y install "${FLUENT_BIT_PACKAGE}-${FLUENT_BIT_VERSION}"
+sudo service "${FLUENT_BIT_SERVICE}" start
+service "${FLUENT_BIT_SERVICE}" status
+}
+"""
+
+# Activate the staged release without an ingestion gap: check it with the
+# agent, point `current` at it, then hot reload. Agents older than 2.1 have no
+# hot reload, they are drained & restarted, the filesystem buffer & tail offsets bridge the restart.
+# An unhealthy release is rolled back & fails the command, which counts against
+# the `max_errors` of the association & stops the rollout.
+ROLLOUT_FUNCTIONS = r"""
+function fluent_bit_supports(){
+"${FLUENT_BIT_BIN}" --help 2>&1 | grep -q -- "$1"
+}
+
+function validate_release(){
+if ! fluent_bit_supports "--dry-run"; then
+    echo "${FLUENT_BIT_BIN} has no --dry-run, relying on the health check after activation"
+    return 0
+fi
+VALIDATE_CONF=$(mktemp --suffix .conf)
+sed "s#${CURRENT_LINK}/#${RELEASE_DIR}/#g" "${RELEASE_DIR}/fluent-bit.conf" > "${VALIDATE_CONF}"
+"${FLUENT_BIT_BIN}" --dry-run -c "${VALIDATE_CONF}"
+rm -f "${VALIDATE_CONF}"
+}
+
+function enable_hot_reload(){
+# Takes effect the next time the agent starts
+if fluent_bit_supports "--enable-hot-reload" && [ ! -f "${HOT_RELOAD_DROP_IN}" ]; then
+    mkdir -p "$(dirname "${HOT_RELOAD_DROP_IN}")"
+    cat > "${HOT_RELOAD_DROP_IN}" << EOF
+[Service]
+ExecStart=
+ExecStart=${FLUENT_BIT_BIN} -c ${MAIN_CONFIG} --enable-hot-reload
+EOF
+    sudo systemctl daemon-reload
+fi
+}
+
+function hot_reload_count(){
+curl -sf "${FLUENT_BIT_API}/api/v2/reload" | grep -o '"hot_reload_count":[0-9]*' | cut -d: -f2
+}
+
+function hot_reload(){
+local before
+before=$(hot_reload_count) || return 1
+[ -n "${before}" ] || return 1
+curl -sf -X POST "${FLUENT_BIT_API}/api/v2/reload" > /dev/null || return 1
+for i in $(seq 1 ${RELOAD_TIMEOUT_SECONDS}); do
+    sleep 1
+    [ "$(hot_reload_count)" -gt "${before}" ] 2> /dev/null && return 0
+done
+return 1
+}
+
+function drain_and_restart(){
+# Give the outputs a bounded window to flush the buffered chunks, SIGTERM then
+# flushes for `Grace` seconds & whatever is left waits on disk
+for i in $(seq 1 ${DRAIN_TIMEOUT_SECONDS}); do
+    chunks=$(curl -sf "${FLUENT_BIT_API}/api/v1/storage" | grep -o '"total_chunks":[0-9]*' | cut -d: -f2 || true)
+    if [ -z "${chunks}" ] || [ "${chunks}" -eq 0 ]; then
+        break
+    fi
+    sleep 1
+done
+sudo systemctl restart "${FLUENT_BIT_SERVICE}"
+}
+
+function agent_healthy(){
+for i in $(seq 1 ${HEALTH_CHECK_SECONDS}); do
+    sleep 1
+    systemctl is-active --quiet "${FLUENT_BIT_SERVICE}" || return 1
+done
+curl -sf "${FLUENT_BIT_API}/api/v1/uptime" > /dev/null
+}
+
+function switch_current(){
+ln -sfn "$1" "${CURRENT_LINK}.next"
+mv -T "${CURRENT_LINK}.next" "${CURRENT_LINK}"
+}
+
+function activate_config(){
+PREVIOUS_RELEASE=""
+if [ -L "${CURRENT_LINK}" ]; then
+    PREVIOUS_RELEASE=$(readlink -f "${CURRENT_LINK}")
+fi
+if [ "${PREVIOUS_RELEASE}" == "${RELEASE_DIR}" ] && systemctl is-active --quiet "${FLUENT_BIT_SERVICE}"; then
+    echo "Config ${CONFIG_VERSION} is already live"
+    return 0
+fi
+
+validate_release
+enable_hot_reload
+
+# The main config only points at the live release
+echo "@INCLUDE ${CURRENT_LINK}/fluent-bit.conf" > "${MAIN_CONFIG}.next"
+mv -f "${MAIN_CONFIG}.next" "${MAIN_CONFIG}"
+switch_current "${RELEASE_DIR}"
+touch "${RELEASE_DIR}"
+
+if [ -n "${PREVIOUS_RELEASE}" ] && systemctl is-active --quiet "${FLUENT_BIT_SERVICE}" && hot_reload; then
+    echo "Hot reloaded config ${CONFIG_VERSION}"
+else
+    drain_and_restart
+    echo "Restarted with config ${CONFIG_VERSION}"
+fi
+
+if ! agent_healthy; then
+    echo "Config ${CONFIG_VERSION} is unhealthy, rolling back to ${PREVIOUS_RELEASE:-nothing}"
+    if [ -n "${PREVIOUS_RELEASE}" ]; then
+        switch_current "${PREVIOUS_RELEASE}"
+        sudo systemctl restart "${FLUENT_BIT_SERVICE}"
+    fi
+    exit 1
+fi
+
+# Keep a few releases to roll back to
+ls -1dt "${RELEASES_DIR}"/*/ | tail -n +$((KEEP_RELEASES + 1)) | xargs -r rm -rf
+}
+"""
+
+SCRIPT_FOOTER = """
+install_fluent_bit >> "${LOG_FILE}"
+create_config_files >> "${LOG_FILE}"
+"""
+
+# Always the last step, it exits 1 on an unhealthy release. The support files
+# go in before it, so the publisher & canary also run while the release is checked.
+ACTIVATE_FOOTER = """activate_config >> "${LOG_FILE}"
+"""
+
+# Image Builder runs this while baking the router AMI. The agent is enabled but
+# stopped, the SSM association activates the first config release on boot.
+BAKE_FOOTER = """
+install_fluent_bit >> "${LOG_FILE}"
+enable_hot_reload >> "${LOG_FILE}"
+sudo systemctl enable "${FLUENT_BIT_SERVICE}"
+sudo systemctl stop "${FLUENT_BIT_SERVICE}"
+"""
+
+
+def heredoc(path: str, content: str, expand: bool = False) -> str:
+    """
+    Bash to write `content` to `path`.
+    :param expand: Let bash expand `${VAR}` in the content. Keep it off for
+        pipeline files, they carry Fluent Bit `${VAR}` references & regexes.
+    """
+    eof = GlobalArgs.HEREDOC_EOF
+    if any(line.strip() == eof for line in content.splitlines()):
+        raise ValueError(f"Rendered config for {path} contains the heredoc delimiter {eof}")
+    delimiter = eof if expand else f"'{eof}'"
+    return f"cat > {path} << {delimiter}\n{content}{eof}\n"
+
+
+def rollout_globals() -> str:
+    return (
+        "\n"
+        f'FLUENT_BIT_PACKAGE="{GlobalArgs.FLUENT_BIT_PACKAGE}"\n'
+        f'FLUENT_BIT_VERSION="{GlobalArgs.FLUENT_BIT_VERSION}"\n'
+        f'FLUENT_BIT_SERVICE="{GlobalArgs.FLUENT_BIT_SERVICE}"\n'
+        f'LEGACY_SERVICE="{GlobalArgs.LEGACY_SERVICE}"\n'
+        f'FLUENT_BIT_BIN="{GlobalArgs.FLUENT_BIT_BIN}"\n'
+        f'MAIN_CONFIG="{GlobalArgs.MAIN_CONFIG}"\n'
+        f'RELEASES_DIR="{GlobalArgs.RELEASES_DIR}"\n'
+        f'CURRENT_LINK="{GlobalArgs.CURRENT_LINK}"\n'
+        f"KEEP_RELEASES={GlobalArgs.KEEP_RELEASES}\n"
+        f'HOT_RELOAD_DROP_IN="{GlobalArgs.HOT_RELOAD_DROP_IN}"\n'
+        f'FLUENT_BIT_API="http://{MonitoringArgs.HTTP_LISTEN}:{MonitoringArgs.HTTP_PORT}"\n'
+        f"DRAIN_TIMEOUT_SECONDS={GlobalArgs.DRAIN_TIMEOUT_SECONDS}\n"
+        f"RELOAD_TIMEOUT_SECONDS={GlobalArgs.RELOAD_TIMEOUT_SECONDS}\n"
+        f"HEALTH_CHECK_SECONDS={GlobalArgs.HEALTH_CHECK_SECONDS}\n"
+    )
+
+
+def install_support_files(support_files: list) -> str:
+    """
+    :param support_files: List of dict with `path`, `content` & optional `mode`
+    """
+    body = ""
+    for f in support_files:
+        body += f"mkdir -p {posixpath.dirname(f['path'])}\n"
+        body += heredoc(f["path"], f["content"])
+        body += f"chmod {f.get('mode', '0644')} {f['path']}\n"
+    return "\nfunction install_support_files(){\n" + body + "}\n"
+
+
+def build_configure_script(pipeline: FluentBitPipeline, support_files: list = None) -> str:
+    """
+    Bash script run by SSM Run Command to install Fluent Bit and roll out the
+    rendered pipeline. The pipeline is validated while rendering, so a broken
+    config fails `cdk synth` instead of the agent on the instance.
+
+    The config files are staged as a release named after their hash, checked
+    with `--dry-run` on the host and activated by hot reload, or by drain &
+    restart where the agent has no hot reload. An unchanged config is a no-op.
+    :param support_files: Scripts & cron jobs to install next to the agent, before the release is activated
+    """
+    current = GlobalArgs.CURRENT_LINK
+    # Every path in the release points at `current`, so the hash only covers the config
+    create_config_files = (
+        "\nfunction create_config_files(){\n"
+        "    mkdir -p ${APP_DIR} ${RELEASES_DIR}\n"
+        + "".join(f"    mkdir -p {d}\n" for d in state_directories(pipeline))
+        + "    STAGE_DIR=$(mktemp -d ${APP_DIR}/stage.XXXXXX)\n"
+        "    cd ${STAGE_DIR}\n\n"
+        + heredoc("${STAGE_DIR}/es.conf", pipeline.render_pipeline())
+        + (heredoc("${STAGE_DIR}/parsers.conf", pipeline.render_parsers()) if pipeline.parsers else "")
+        + heredoc(
+            "${STAGE_DIR}/fluent-bit.conf",
+            pipeline.render_main(f"{current}/es.conf", f"{current}/parsers.conf"),
+            expand=True
+        )
+        + "\n    CONFIG_VERSION=$(cat $(ls ${STAGE_DIR}/*.conf | sort) | sha256sum | cut -c1-12)\n"
+        '    RELEASE_DIR="${RELEASES_DIR}/${CONFIG_VERSION}"\n'
+        "    cd ${APP_DIR}\n"
+        '    if [ -d "${RELEASE_DIR}" ]; then\n'
+        '        rm -rf "${STAGE_DIR}"\n'
+        "    else\n"
+        '        mv "${STAGE_DIR}" "${RELEASE_DIR}"\n'
+        "    fi\n"
+        '    echo "Staged config ${CONFIG_VERSION}"\n'
+        "}\n"
+    )
+
+    script = SCRIPT_HEADER + rollout_globals() + create_config_files + ROLLOUT_FUNCTIONS
+    if support_files:
+        script += install_support_files(support_files)
+    script += SCRIPT_FOOTER
+    if support_files:
+        script += 'install_support_files >> "${LOG_FILE}"\n'
+    return script + ACTIVATE_FOOTER
+
+
+def build_bake_script() -> str:
+    """
+    Bash script that installs Fluent Bit into an AMI, with the same functions
+    the configure script uses, so baked & unbaked routers end up identical.
+    """
+    return SCRIPT_HEADER + rollout_globals() + ROLLOUT_FUNCTIONS + BAKE_FOOTER
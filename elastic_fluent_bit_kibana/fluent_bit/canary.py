@@ -0,0 +1,36 @@
+import posixpath
+
+from elastic_fluent_bit_kibana.fluent_bit.router_config import GlobalArgs as RouterArgs
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    MARKER = "miztiik-ingest-canary"
+    # Inside the tailed `/var/log/httpd/*log`, so markers take the same path as the app logs
+    CANARY_LOG = posixpath.join(posixpath.dirname(RouterArgs.LOG_PATH), "miztiik_ingest_canary_log")
+    EMITTER_PATH = "/opt/miztiik-automation/emit_ingest_canary.sh"
+    EMITTER_CRON_PATH = "/etc/cron.d/fluent-bit-ingest-canary"
+    # Emit mid-minute, after the probe took its snapshot of the markers already searchable
+    EMIT_DELAY_SECONDS = 20
+
+
+EMITTER_SCRIPT = f"""#!/bin/bash
+# Append a timestamped ingest canary marker to a file the router tails
+sleep {GlobalArgs.EMIT_DELAY_SECONDS}
+EMITTED_MS=$(date +%s%3N)
+echo "{GlobalArgs.MARKER} id=$(hostname)-${{EMITTED_MS}} emitted_ms=${{EMITTED_MS}}" >> {GlobalArgs.CANARY_LOG}
+"""
+
+
+def canary_emitter_files() -> list:
+    """
+    Support files that make a router emit one canary marker a minute
+    :return: `support_files` for `build_configure_script`
+    """
+    return [
+        {"path": GlobalArgs.EMITTER_PATH, "content": EMITTER_SCRIPT, "mode": "0755"},
+        {"path": GlobalArgs.EMITTER_CRON_PATH, "content": f"* * * * * root {GlobalArgs.EMITTER_PATH}\n"},
+    ]
@@ -0,0 +1,230 @@
+import math
+import re
+
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import Filter
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    # Tumbling windows aligned on the epoch, one summary per path & status a window
+    WINDOW_SECONDS = 60
+    # Lines logged this late still land in their window, it is emitted after it
+    GRACE_SECONDS = 10
+    # Distinct paths a window keeps, the others are summed under `OTHER_PATH`
+    MAX_GROUPS = 500
+    OTHER_PATH = "__other__"
+    # Numeric path segments are folded, `/orders/42` & `/orders/43` are one path
+    ID_SEGMENT = ":id"
+    # Latency buckets grow by 10%, a percentile is at most 10% above the exact one
+    HISTOGRAM_GROWTH = 1.1
+    PERCENTILES = (50, 90, 99)
+    # Parsed fields of the `apache2` parser
+    STATUS_KEY = "code"
+    PATH_KEY = "path"
+    SIZE_KEY = "size"
+    DURATION_KEY = "duration_us"
+    # Responses from this status on are counted as `errors`
+    ERROR_STATUS_FROM = 400
+    SUMMARIZE_FUNCTION = "summarize"
+    # The tick input closes the windows even when no line arrives
+    TICK_RATE = 1
+
+
+def summary_filter(
+    source_tag: str,
+    tick_tag: str,
+    window_seconds: int = GlobalArgs.WINDOW_SECONDS,
+    max_groups: int = GlobalArgs.MAX_GROUPS
+) -> Filter:
+    """
+    `lua` filter summarizing the parsed access lines of `source_tag` per path &
+    status in tumbling windows of their log time. Access records pass through
+    untouched. A record of `tick_tag` becomes the summaries of the oldest window
+    closed for `GRACE_SECONDS`, stamped with the window start, or is dropped.
+    Place it before any filter that drops access records, the counts are exact.
+    The code is inline, classic mode values are one line, so no `--` comments.
+    """
+    if int(window_seconds) < 1:
+        raise ValueError(f"window_seconds '{window_seconds}' must be at least 1")
+    if int(max_groups) < 1:
+        raise ValueError(f"max_groups '{max_groups}' must be at least 1")
+    percentiles = "".join(
+        f"out[\"{GlobalArgs.DURATION_KEY}_p{p}\"] = percentile(group, buckets, {p}) "
+        for p in GlobalArgs.PERCENTILES
+    )
+    code = (
+        f"local W, GRACE, MAXG = {int(window_seconds)}, {int(GlobalArgs.GRACE_SECONDS)}, {int(max_groups)} "
+        f"local G = {GlobalArgs.HISTOGRAM_GROWTH} "
+        "local LOGG = math.log(G) "
+        "local windows = {} "
+        "local function path_key(path) "
+        "if type(path) ~= \"string\" or path == \"\" then return \"-\" end "
+        "path = string.gsub(path, \"%?.*$\", \"\") "
+        "path = string.gsub(path, \"/[^/]+\", function(seg) "
+        f"if string.match(seg, \"^/%d+$\") then return \"/{GlobalArgs.ID_SEGMENT}\" end "
+        "end) "
+        "return path "
+        "end "
+        "local function bucket(d) "
+        "if d < 1 then return 0 end "
+        "return math.floor(math.log(d) / LOGG) + 1 "
+        "end "
+        "local function percentile(group, buckets, p) "
+        "local rank, seen = math.ceil(p * group.dcount / 100), 0 "
+        "for _, b in ipairs(buckets) do "
+        "seen = seen + group.hist[b] "
+        "if seen >= rank then "
+        "if b == 0 then return 0 end "
+        "return math.min(group.dmax, math.floor(G ^ b)) "
+        "end "
+        "end "
+        "return group.dmax "
+        "end "
+        "local function summary(group) "
+        "local out = {window_seconds = W, path = group.path, code = group.code, "
+        "requests = group.requests, errors = 0, bytes = group.bytes} "
+        f"if group.code >= {int(GlobalArgs.ERROR_STATUS_FROM)} then out.errors = group.requests end "
+        "if group.dcount > 0 then "
+        "local buckets = {} "
+        "for b, _ in pairs(group.hist) do table.insert(buckets, b) end "
+        "table.sort(buckets) "
+        f"out[\"{GlobalArgs.DURATION_KEY}_sum\"] = group.dsum "
+        f"out[\"{GlobalArgs.DURATION_KEY}_max\"] = group.dmax "
+        f"{percentiles}"
+        "end "
+        "return out "
+        "end "
+        "local function flush(timestamp) "
+        "local oldest = nil "
+        "for start, _ in pairs(windows) do "
+        "if start + W + GRACE <= timestamp and (oldest == nil or start < oldest) then oldest = start end "
+        "end "
+        "if oldest == nil then return -1, timestamp, {} end "
+        "local out = {} "
+        "for _, group in pairs(windows[oldest].groups) do table.insert(out, summary(group)) end "
+        "windows[oldest] = nil "
+        "return 1, oldest, out "
+        "end "
+        f"function {GlobalArgs.SUMMARIZE_FUNCTION}(tag, timestamp, record) "
+        f"if tag == \"{tick_tag}\" then return flush(timestamp) end "
+        f"local code = tonumber(record[\"{GlobalArgs.STATUS_KEY}\"]) "
+        "if code == nil then return 0, timestamp, record end "
+        "local start = math.floor(timestamp / W) * W "
+        "local window = windows[start] "
+        "if window == nil then window = {groups = {}, count = 0} windows[start] = window end "
+        f"local path = path_key(record[\"{GlobalArgs.PATH_KEY}\"]) "
+        f"if window.groups[path .. \" \" .. code] == nil and window.count >= MAXG then path = \"{GlobalArgs.OTHER_PATH}\" end "
+        "local key = path .. \" \" .. code "
+        "local group = window.groups[key] "
+        "if group == nil then "
+        "group = {path = path, code = code, requests = 0, bytes = 0, dcount = 0, dsum = 0, dmax = 0, hist = {}} "
+        "window.groups[key] = group "
+        "window.count = window.count + 1 "
+        "end "
+        "group.requests = group.requests + 1 "
+        f"group.bytes = group.bytes + (tonumber(record[\"{GlobalArgs.SIZE_KEY}\"]) or 0) "
+        f"local d = tonumber(record[\"{GlobalArgs.DURATION_KEY}\"]) "
+        "if d ~= nil then "
+        "group.dcount = group.dcount + 1 "
+        "group.dsum = group.dsum + d "
+        "group.dmax = math.max(group.dmax, d) "
+        "local b = bucket(d) "
+        "group.hist[b] = (group.hist[b] or 0) + 1 "
+        "end "
+        "return 0, timestamp, record "
+        "end"
+    )
+    return Filter(
+        "lua",
+        match=None,
+        properties={
+            "Match_Regex": f"^({re.escape(source_tag)}|{re.escape(tick_tag)})$",
+            "call": GlobalArgs.SUMMARIZE_FUNCTION,
+            "code": code,
+        }
+    )
+
+
+def path_key(path) -> str:
+    """
+    What the `summary_filter` groups a `path` under
+    """
+    if not isinstance(path, str) or not path:
+        return "-"
+    path = re.sub(r"\?.*$", "", path, flags=re.DOTALL)
+    return re.sub(
+        r"/[^/]+",
+        lambda m: f"/{GlobalArgs.ID_SEGMENT}" if re.fullmatch(r"/[0-9]+", m.group(0)) else m.group(0),
+        path
+    )
+
+
+def _bucket(duration: int) -> int:
+    if duration < 1:
+        return 0
+    return math.floor(math.log(duration) / math.log(GlobalArgs.HISTOGRAM_GROWTH)) + 1
+
+
+def _percentile(durations: list, hist: dict, p: int) -> int:
+    rank, seen = math.ceil(p * len(durations) / 100), 0
+    for b in sorted(hist):
+        seen += hist[b]
+        if seen >= rank:
+            return 0 if b == 0 else min(max(durations), math.floor(GlobalArgs.HISTOGRAM_GROWTH ** b))
+    return max(durations)
+
+
+def summarize_records(
+    records: list,
+    window_seconds: int = GlobalArgs.WINDOW_SECONDS,
+    max_groups: int = GlobalArgs.MAX_GROUPS
+) -> list:
+    """
+    Mimic the `summary_filter` in python, for checks that need no agent.
+    :param records: `(epoch seconds, parsed record)` in the order they are logged
+    :return: The summaries of every window, `@timestamp` is the window start in
+             epoch seconds, sorted by window, path & status
+    """
+    windows = {}
+    for timestamp, record in records:
+        try:
+            code = int(record.get(GlobalArgs.STATUS_KEY))
+        except (TypeError, ValueError):
+            continue
+        window = windows.setdefault(math.floor(timestamp / window_seconds) * window_seconds, {})
+        path = path_key(record.get(GlobalArgs.PATH_KEY))
+        if (path, code) not in window and len(window) >= max_groups:
+            path = GlobalArgs.OTHER_PATH
+        group = window.setdefault((path, code), {"requests": 0, "bytes": 0, "durations": []})
+        group["requests"] += 1
+        if isinstance(record.get(GlobalArgs.SIZE_KEY), int):
+            group["bytes"] += record[GlobalArgs.SIZE_KEY]
+        if isinstance(record.get(GlobalArgs.DURATION_KEY), int):
+            group["durations"].append(record[GlobalArgs.DURATION_KEY])
+
+    summaries = []
+    for start in sorted(windows):
+        for (path, code), group in sorted(windows[start].items()):
+            summary = {
+                "@timestamp": start,
+                "window_seconds": window_seconds,
+                "path": path,
+                "code": code,
+                "requests": group["requests"],
+                "errors": group["requests"] if code >= GlobalArgs.ERROR_STATUS_FROM else 0,
+                "bytes": group["bytes"],
+            }
+            durations = group["durations"]
+            if durations:
+                hist = {}
+                for d in durations:
+                    hist[_bucket(d)] = hist.get(_bucket(d), 0) + 1
+                summary[f"{GlobalArgs.DURATION_KEY}_sum"] = sum(durations)
+                summary[f"{GlobalArgs.DURATION_KEY}_max"] = max(durations)
+                for p in GlobalArgs.PERCENTILES:
+                    summary[f"{GlobalArgs.DURATION_KEY}_p{p}"] = _percentile(durations, hist, p)
+            summaries.append(summary)
+    return summaries
@@ -0,0 +1,181 @@
+import argparse
+import json
+import math
+import os
+import sys
+from datetime import datetime
+
+from elastic_fluent_bit_kibana.fluent_bit.log_metrics import GlobalArgs as LogMetricsArgs
+from elastic_fluent_bit_kibana.fluent_bit.log_metrics import path_key
+from elastic_fluent_bit_kibana.fluent_bit.log_metrics import summarize_records
+from elastic_fluent_bit_kibana.fluent_bit.log_metrics import summary_filter
+from elastic_fluent_bit_kibana.fluent_bit.parsers import PARSER_CATALOG
+from elastic_fluent_bit_kibana.fluent_bit.parsers import parse_line
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log_metrics_samples")
+    SAMPLE_SUFFIX = ".log"
+    GOLDEN_SUFFIX = ".golden.json"
+    # The access lane parser, its fields are what the summaries read
+    PARSER = "apache2"
+    SOURCE_TAG = "access"
+    TICK_TAG = "tick"
+
+
+def sample_names(samples_dir: str = GlobalArgs.SAMPLES_DIR) -> list:
+    return sorted(
+        f[:-len(GlobalArgs.SAMPLE_SUFFIX)] for f in os.listdir(samples_dir) if f.endswith(GlobalArgs.SAMPLE_SUFFIX))
+
+
+def parse_sample(sample: str, samples_dir: str = GlobalArgs.SAMPLES_DIR) -> list:
+    """
+    :return: `(epoch seconds, record)` per line, as the parser filter hands them to the summary filter
+    """
+    path = os.path.join(samples_dir, sample + GlobalArgs.SAMPLE_SUFFIX)
+    with open(path, encoding="utf-8") as f:
+        lines = [line.rstrip("\n") for line in f if line.strip()]
+    records = []
+    for line in lines:
+        parsed = parse_line(PARSER_CATALOG[GlobalArgs.PARSER], line)
+        if parsed is None:
+            # Shipped as is, the summaries skip a record without a status
+            records.append((0, {"log": line}))
+        else:
+            records.append((datetime.fromisoformat(parsed["@timestamp"]).timestamp(), parsed["record"]))
+    return records
+
+
+def exact_problems(records: list, summaries: list, window_seconds: int = LogMetricsArgs.WINDOW_SECONDS) -> list:
+    """
+    Recount the sample without histograms. Counts & sums must be exact, a
+    percentile at most one bucket, `HISTOGRAM_GROWTH`, above the exact one.
+    """
+    groups = {}
+    for timestamp, record in records:
+        if not isinstance(record.get(LogMetricsArgs.STATUS_KEY), int):
+            continue
+        key = (
+            math.floor(timestamp / window_seconds) * window_seconds,
+            path_key(record.get(LogMetricsArgs.PATH_KEY)),
+            record[LogMetricsArgs.STATUS_KEY],
+        )
+        group = groups.setdefault(key, {"requests": 0, "bytes": 0, "durations": []})
+        group["requests"] += 1
+        group["bytes"] += record.get(LogMetricsArgs.SIZE_KEY, 0)
+        if LogMetricsArgs.DURATION_KEY in record:
+            group["durations"].append(record[LogMetricsArgs.DURATION_KEY])
+
+    errors = []
+    found = {(s["@timestamp"], s["path"], s["code"]): s for s in summaries}
+    if sorted(found) != sorted(groups):
+        errors.append(f"summarized groups {sorted(set(found) ^ set(groups))} differ from the recount")
+    duration = LogMetricsArgs.DURATION_KEY
+    for key in sorted(set(found) & set(groups)):
+        summary, group = found[key], groups[key]
+        expected = {"requests": group["requests"], "bytes": group["bytes"]}
+        durations = sorted(group["durations"])
+        if durations:
+            expected.update({f"{duration}_sum": sum(durations), f"{duration}_max": durations[-1]})
+        for field, value in expected.items():
+            if summary.get(field) != value:
+                errors.append(f"{key}: {field} {summary.get(field)}, recounted {value}")
+        for p in LogMetricsArgs.PERCENTILES if durations else ():
+            exact = durations[math.ceil(p * len(durations) / 100) - 1]
+            estimate = summary.get(f"{duration}_p{p}")
+            if estimate is None or not exact <= estimate <= max(exact, exact * LogMetricsArgs.HISTOGRAM_GROWTH):
+                errors.append(f"{key}: p{p} {estimate}, exact {exact}")
+    return errors
+
+
+def run_lua(records: list, window_seconds: int = LogMetricsArgs.WINDOW_SECONDS) -> list:
+    """
+    Run the `summary_filter` code itself over the records, with ticks after the last line
+    :return: The summaries it emits, sorted like `summarize_records`
+    """
+    try:
+        from lupa import LuaRuntime
+    except ImportError:
+        raise SystemExit("--lua needs lupa, install it with `pip3 install lupa`")
+    lua = LuaRuntime(unpack_returned_tuples=True)
+    lua.execute(summary_filter(GlobalArgs.SOURCE_TAG, GlobalArgs.TICK_TAG, window_seconds).get("code"))
+    summarize = lua.globals()[LogMetricsArgs.SUMMARIZE_FUNCTION]
+
+    for timestamp, record in records:
+        summarize(GlobalArgs.SOURCE_TAG, timestamp, lua.table_from(record))
+    summaries = []
+    tick = max(timestamp for timestamp, _ in records) + window_seconds + LogMetricsArgs.GRACE_SECONDS
+    while True:
+        code, timestamp, emitted = summarize(GlobalArgs.TICK_TAG, tick, lua.table_from({}))
+        if code == -1:
+            break
+        summaries.extend(dict(s, **{"@timestamp": timestamp}) for s in emitted.values())
+    return sorted(
+        ({k: s[k] for k in sorted(s)} for s in summaries),
+        key=lambda s: (s["@timestamp"], s["path"], s["code"])
+    )
+
+
+def check_sample(sample: str, update: bool = False, lua: bool = False,
+                 samples_dir: str = GlobalArgs.SAMPLES_DIR) -> list:
+    """
+    Compare the summaries of the sample with the golden file, or rewrite it with `update`
+    :return: List of human readable mismatches, empty when the sample summarizes like its golden file
+    """
+    records = parse_sample(sample, samples_dir)
+    result = {"lines": len(records), "summaries": summarize_records(records)}
+    errors = [f"{sample}: {e}" for e in exact_problems(records, result["summaries"])]
+    if lua:
+        lua_summaries = run_lua(records)
+        key = lambda s: (s["@timestamp"], s["path"], s["code"])
+        for expected, actual in zip(sorted(result["summaries"], key=key), lua_summaries):
+            if expected != actual:
+                errors.append(f"{sample}: lua\n      expected {expected!r}\n      got      {actual!r}")
+        if len(lua_summaries) != len(result["summaries"]):
+            errors.append(f"{sample}: lua emitted {len(lua_summaries)} summaries, expected {len(result['summaries'])}")
+
+    golden_path = os.path.join(samples_dir, sample + GlobalArgs.GOLDEN_SUFFIX)
+    if update:
+        with open(golden_path, encoding="utf-8", mode="w") as f:
+            f.write(json.dumps(result, indent=2, sort_keys=True) + "\n")
+        return errors
+    if not os.path.exists(golden_path):
+        return errors + [f"{sample}: no golden file {golden_path}, run with --update"]
+
+    with open(golden_path, encoding="utf-8") as f:
+        golden = json.load(f)
+    if len(golden["summaries"]) != len(result["summaries"]):
+        errors.append(f"{sample}: {len(result['summaries'])} summaries, golden file has {len(golden['summaries'])}")
+    for expected, actual in zip(golden["summaries"], result["summaries"]):
+        if expected != actual:
+            errors.append(f"{sample}:\n      expected {expected!r}\n      got      {actual!r}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Summarize the recorded access logs per window & compare with their golden files")
+    parser.add_argument("samples", nargs="*", default=sample_names(), help="Samples to check, all by default")
+    parser.add_argument("--update", action="store_true", help="Rewrite the golden files from the current code")
+    parser.add_argument("--lua", action="store_true", help="Also run the lua filter itself, needs lupa")
+    args = parser.parse_args()
+
+    errors = []
+    for sample in args.samples:
+        errors.extend(check_sample(sample, update=args.update, lua=args.lua))
+        records = parse_sample(sample)
+        summaries = summarize_records(records)
+        print(f"{sample}: {len(records)} lines summarized as {len(summaries)} records over "
+              f"{len({s['@timestamp'] for s in summaries})} windows")
+    for error in errors:
+        print(f"  - {error}")
+    print(f"{len(args.samples)} samples checked, {len(errors)} problems")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import json
+import os
+import re
+import sys
+
+from elastic_fluent_bit_kibana.es_config.index_templates import alias_field_mappings
+from elastic_fluent_bit_kibana.fluent_bit.aggregator_config import build_aggregator_pipeline
+from elastic_fluent_bit_kibana.fluent_bit.log_metrics import GlobalArgs as LogMetricsArgs
+from elastic_fluent_bit_kibana.fluent_bit.log_metrics import summarize_records
+from elastic_fluent_bit_kibana.fluent_bit.multiline import GlobalArgs as MultilineArgs
+from elastic_fluent_bit_kibana.fluent_bit.parsers import compile_regex
+from elastic_fluent_bit_kibana.fluent_bit.router_config import ROUTER_LANES
+from elastic_fluent_bit_kibana.fluent_bit.router_config import build_router_pipeline
+from elastic_fluent_bit_kibana.fluent_bit.sampling import GlobalArgs as SamplingArgs
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    GOLDEN_PATH = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "mapping_samples", "es_fields.golden.json")
+    # Defaults of the Fluent Bit plugins when the key is not set
+    ES_TIME_KEY = "@timestamp"
+    ES_TAG_KEY = "_flb-key"
+    DUMMY_KEY = "message"
+    TAIL_KEY = "log"
+    # Any values, only the keys of a summary matter here
+    SUMMARY_SAMPLE = {
+        LogMetricsArgs.STATUS_KEY: 200,
+        LogMetricsArgs.PATH_KEY: "/",
+        LogMetricsArgs.SIZE_KEY: 1,
+        LogMetricsArgs.DURATION_KEY: 1,
+    }
+
+
+def delivery_modes() -> dict:
+    """
+    :return: `{<mode>: (router pipeline, aggregator pipeline or None)}`, the ways records reach the domain
+    """
+    endpoint, region = "search-example.us-east-1.es.amazonaws.com", "us-east-1"
+    streams = {"region": region, "streams": {lane: f"{lane}-stream" for lane in ROUTER_LANES}}
+    return {
+        "direct": (build_router_pipeline(endpoint, region), None),
+        "aggregator": (
+            build_router_pipeline(endpoint, region, forward_to={"host": "aggregator.internal"}),
+            build_aggregator_pipeline(endpoint, region)
+        ),
+        "firehose": (build_router_pipeline(endpoint, region, firehose_to=streams), None),
+    }
+
+
+def summary_fields() -> set:
+    return set(summarize_records([(0, GlobalArgs.SUMMARY_SAMPLE)])[0])
+
+
+def filter_fields(pipeline, section, tag: str, fields: set) -> set:
+    """
+    Keys of a record of `tag` once `section` let it through. A record may take
+    any of the shapes a filter can give it, so this is their union.
+    :raises ValueError: For a filter whose fields this check does not know
+    """
+    if section.plugin == "parser":
+        names = section.get("Parser")
+        names = names if isinstance(names, list) else [names]
+        parsed = set()
+        for parser in pipeline.parsers:
+            if parser.name not in names:
+                continue
+            keys = set(compile_regex(parser.get("Regex")).groupindex) if parser.get("Regex") else set()
+            if parser.get("Time_Key") and not parser.get("Time_Keep"):
+                keys.discard(parser.get("Time_Key"))
+            parsed |= keys
+        # A line no parser matches keeps `Key_Name` as is
+        return fields | parsed
+    if section.plugin == "record_modifier":
+        return fields | {r.split()[0] for r in section.get("Record") or []}
+    if section.plugin == "lua":
+        call = section.get("call")
+        if call == LogMetricsArgs.SUMMARIZE_FUNCTION:
+            tick_tag = re.search(r'if tag == "([^"]+)" then', section.get("code")).group(1)
+            return summary_fields() if tag == tick_tag else fields
+        if call == SamplingArgs.SAMPLE_FUNCTION:
+            return fields | {SamplingArgs.WEIGHT_KEY}
+        if call == MultilineArgs.CAP_FUNCTION:
+            return fields
+    raise ValueError(f"{section.label()} {section.get('call') or ''}: unknown fields, teach `mapping_check` about it")
+
+
+def shipped_fields(pipeline, tag: str, upstream_fields: set = None) -> dict:
+    """
+    :return: `{<output alias>: (plugin, fields)}`, the records of `tag` as each output matching them sends them
+    """
+    fields = set(upstream_fields or ())
+    for section in pipeline.inputs:
+        if section.tag != tag:
+            continue
+        if section.plugin == "tail":
+            fields |= {GlobalArgs.TAIL_KEY} | ({section.get("Path_Key")} if section.get("Path_Key") else set())
+        elif section.plugin == "dummy":
+            fields |= {GlobalArgs.DUMMY_KEY}
+    for section in pipeline.filters:
+        if section.matches(tag):
+            fields = filter_fields(pipeline, section, tag, fields)
+
+    shipped = {}
+    for section in pipeline.outputs:
+        if not section.matches(tag):
+            continue
+        sent = set(fields)
+        if section.plugin == "es":
+            sent.add(section.get("Time_Key") or GlobalArgs.ES_TIME_KEY)
+            if section.get("Include_Tag_Key"):
+                sent.add(section.get("Tag_Key") or GlobalArgs.ES_TAG_KEY)
+        elif section.plugin == "kinesis_firehose" and section.get("time_key"):
+            sent.add(section.get("time_key"))
+        shipped[section.get("Alias") or section.plugin] = (section.plugin, sent)
+    return shipped
+
+
+def indexed_fields() -> dict:
+    """
+    :return: `{<mode>: {<lane>: {"index", "fields"}}}`, what every delivery mode writes to each index
+    """
+    result = {}
+    for mode, (router, aggregator) in delivery_modes().items():
+        result[mode] = {}
+        for name, lane in ROUTER_LANES.items():
+            outputs = shipped_fields(router, lane["tag"]).values()
+            fields = set()
+            for plugin, sent in outputs:
+                if plugin == "forward" and aggregator is not None:
+                    for _, aggregated in shipped_fields(aggregator, lane["tag"], sent).values():
+                        fields |= aggregated
+                elif plugin in ("es", "kinesis_firehose"):
+                    fields |= sent
+            result[mode][name] = {"index": lane["index"], "fields": sorted(fields)}
+    return result
+
+
+def mapping_problems(result: dict) -> list:
+    """
+    :return: One message per field written to an index whose mappings do not have it
+    """
+    errors = []
+    for mode, lanes in result.items():
+        for name, lane in lanes.items():
+            mapped = alias_field_mappings(lane["index"])
+            for field in lane["fields"]:
+                if field not in mapped:
+                    errors.append(
+                        f"{mode}/{name}: `{field}` is not mapped in {lane['index']}, strict mappings reject the document")
+    return errors
+
+
+def check_mappings(update: bool = False, golden_path: str = GlobalArgs.GOLDEN_PATH) -> list:
+    """
+    Compare the fields every lane writes with the index mappings & the golden file, or rewrite it with `update`
+    :return: List of human readable mismatches, empty when the outputs & the mappings agree
+    """
+    result = indexed_fields()
+    errors = mapping_problems(result)
+    if update:
+        os.makedirs(os.path.dirname(golden_path), exist_ok=True)
+        with open(golden_path, encoding="utf-8", mode="w") as f:
+            f.write(json.dumps(result, indent=2, sort_keys=True) + "\n")
+        return errors
+    if not os.path.exists(golden_path):
+        return errors + [f"no golden file {golden_path}, run with --update"]
+
+    with open(golden_path, encoding="utf-8") as f:
+        golden = json.load(f)
+    for mode in sorted(set(golden) | set(result)):
+        for name in sorted(set(golden.get(mode, {})) | set(result.get(mode, {}))):
+            expected, actual = golden.get(mode, {}).get(name), result.get(mode, {}).get(name)
+            if expected != actual:
+                errors.append(f"{mode}/{name}:\n      expected {expected!r}\n      got      {actual!r}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that the fields the outputs write are mapped in their index & match the golden file")
+    parser.add_argument("--update", action="store_true", help="Rewrite the golden file from the current pipelines")
+    args = parser.parse_args()
+
+    errors = check_mappings(update=args.update)
+    result = indexed_fields()
+    for mode, lanes in result.items():
+        print(f"{mode}: " + ", ".join(f"{name} {len(lane['fields'])} fields" for name, lane in lanes.items()))
+    for error in errors:
+        print(f"  - {error}")
+    print(f"{len(result)} delivery modes checked, {len(errors)} problems")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
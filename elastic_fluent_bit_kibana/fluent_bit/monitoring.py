@@ -0,0 +1,86 @@
+from elastic_fluent_bit_kibana.fluent_bit.sampling import sampling_publisher_args
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    HTTP_LISTEN = "127.0.0.1"
+    HTTP_PORT = 2020
+    METRIC_NAMESPACE = "MiztiikAutomation/FluentBit"
+    # Published by `publish_fluent_bit_metrics.py` on every router
+    BACKLOG_METRIC = "BacklogChunks"
+    RETRIES_METRIC = "OutputRetries"
+    RETRIES_FAILED_METRIC = "OutputRetriesFailed"
+    DROPPED_METRIC = "OutputDroppedRecords"
+    SAMPLING_RATE_METRIC = "SamplingRate"
+    # Scraped from `/api/v1/metrics/prometheus` by the CloudWatch agent, `deploy_app.sh`,
+    # with the plugin alias as the `name` dimension, next to `AutoScalingGroupName` or `InstanceId`
+    INPUT_RECORDS_METRIC = "fluentbit_input_records_total"
+    INPUT_BYTES_METRIC = "fluentbit_input_bytes_total"
+    OUTPUT_RECORDS_METRIC = "fluentbit_output_proc_records_total"
+    OUTPUT_BYTES_METRIC = "fluentbit_output_proc_bytes_total"
+    OUTPUT_ERRORS_METRIC = "fluentbit_output_errors_total"
+    OUTPUT_RETRIES_METRIC = "fluentbit_output_retries_total"
+    OUTPUT_RETRIES_FAILED_METRIC = "fluentbit_output_retries_failed_total"
+    OUTPUT_DROPPED_METRIC = "fluentbit_output_dropped_records_total"
+    PUBLISHER_PATH = "/opt/miztiik-automation/publish_fluent_bit_metrics.py"
+    PUBLISHER_CRON_PATH = "/etc/cron.d/fluent-bit-metrics"
+    PUBLISHER_LOG_FILE = "/var/log/miztiik-automation-fluent-bit-metrics.log"
+
+
+# Metric names plotted by `CreateFluentBitDashboard`
+PIPELINE_METRIC_NAMES = {
+    "backlog": GlobalArgs.BACKLOG_METRIC,
+    "input_records": GlobalArgs.INPUT_RECORDS_METRIC,
+    "output_records": GlobalArgs.OUTPUT_RECORDS_METRIC,
+    "retries": GlobalArgs.OUTPUT_RETRIES_METRIC,
+    "retries_failed": GlobalArgs.OUTPUT_RETRIES_FAILED_METRIC,
+    "errors": GlobalArgs.OUTPUT_ERRORS_METRIC,
+    "dropped": GlobalArgs.OUTPUT_DROPPED_METRIC,
+}
+
+
+def enable_http_metrics(
+    pipeline,
+    listen: str = GlobalArgs.HTTP_LISTEN,
+    port: int = GlobalArgs.HTTP_PORT
+):
+    """
+    Turn on the built-in HTTP server, so `/api/v1/metrics` reports records,
+    retries & errors per plugin and `/api/v1/storage` the buffered chunks.
+    Ref: https://docs.fluentbit.io/manual/administration/monitoring
+    :return: The same pipeline, to allow chaining
+    """
+    pipeline.service.update({
+        "HTTP_Server": True,
+        "HTTP_Listen": listen,
+        "HTTP_Port": port,
+        "storage.metrics": True,
+    })
+    return pipeline
+
+
+def metrics_publisher_files(
+    publisher_script: str,
+    namespace: str = GlobalArgs.METRIC_NAMESPACE,
+    sampling: dict = None
+) -> list:
+    """
+    Support files that publish the backlog & retry metrics every minute
+    :param publisher_script: Content of `publish_fluent_bit_metrics.py`
+    :param sampling: The `sampling` context key. When set, the publisher also
+                     adapts the success sampling rate to the output retries.
+    :return: `support_files` for `build_configure_script`
+    """
+    cron = (
+        f"* * * * * root /usr/bin/python3 {GlobalArgs.PUBLISHER_PATH}"
+        f" --namespace {namespace}"
+        f"{sampling_publisher_args(sampling) if sampling is not None else ''}"
+        f" >> {GlobalArgs.PUBLISHER_LOG_FILE} 2>&1\n"
+    )
+    return [
+        {"path": GlobalArgs.PUBLISHER_PATH, "content": publisher_script, "mode": "0755"},
+        {"path": GlobalArgs.PUBLISHER_CRON_PATH, "content": cron},
+    ]
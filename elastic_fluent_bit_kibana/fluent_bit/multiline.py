@@ -0,0 +1,221 @@
+import re
+
+from elastic_fluent_bit_kibana.fluent_bit.parsers import compile_regex
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import ConfigSection
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import Filter
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    # Suffixed with the lane name
+    PARSER_NAME = "trace"
+    START_STATE = "start_state"
+    CONT_STATE = "cont"
+    # A group still open this long is flushed, the last line of a log waits this much
+    FLUSH_TIMEOUT_MS = 1000
+    # Longer traces keep their head & a marker with the number of lines cut
+    MAX_LINES = 200
+    KEY_CONTENT = "log"
+    CAP_FUNCTION = "cap_lines"
+
+
+# Start-of-record & continuation rules per language. A line matching a `start`
+# pattern opens a record, the lines after it matching a `cont` pattern are
+# folded into it, any other line closes it. A line matching neither is shipped
+# as is. Patterns are Onigmo regexes without the `/` delimiters & without `"`.
+TRACE_RULES = {
+    "java": {
+        # logback / log4j `2020-11-22 10:15:32.123` & uncaught exceptions on stderr
+        "start": [
+            r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}",
+            r"^Exception in thread ",
+        ],
+        "cont": [
+            r"^\s+at ",
+            r"^\s+\.\.\. \d+ (more|common frames omitted)",
+            r"^\s*(Caused by|Suppressed): ",
+            r"^[\w$.]+(Exception|Error|Throwable)(: .*)?$",
+        ],
+    },
+    "python": {
+        # `logging` default format `2020-11-22 10:15:32,123` & uncaught tracebacks on stderr
+        "start": [
+            r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}",
+            r"^Traceback \(most recent call last\):$",
+        ],
+        "cont": [
+            r"^\s+",
+            r"^Traceback \(most recent call last\):$",
+            r"^(During handling of the above exception|The above exception was the direct cause)",
+            r"^[\w.]+(Error|Exception|Warning|Exit|Interrupt|Iteration)(: .*)?$",
+            r"^$",
+        ],
+    },
+    "go": {
+        # `log` default format `2020/11/22 10:15:32` & runtime panics on stderr
+        "start": [
+            r"^\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}",
+            r"^(panic|fatal error): ",
+        ],
+        "cont": [
+            r"^goroutine \d+ \[",
+            r"^\s+",
+            r"^[\w./*()\[\]-]+\(.*\)$",
+            r"^created by ",
+            r"^\[signal ",
+            r"^exit status \d+",
+            r"^$",
+        ],
+    },
+}
+
+
+class MultilineParser(ConfigSection):
+    """
+    One `[MULTILINE_PARSER]` of a Fluent Bit parsers file, a regex state machine
+    Ref: https://docs.fluentbit.io/manual/administration/configuring-fluent-bit/multiline-parsing
+    """
+
+    SECTION = "MULTILINE_PARSER"
+
+    def __init__(self, name: str, rules: list, flush_timeout: int = GlobalArgs.FLUSH_TIMEOUT_MS,
+                 properties: dict = None):
+        """
+        :param rules: `(state, regex, next state)` tuples, the first state is `start_state`
+        :param flush_timeout: Milliseconds before an open group is flushed
+        """
+        super().__init__({"name": name, "type": "regex", "flush_timeout": flush_timeout})
+        self.update(properties or {})
+        self.rules = list(rules)
+        self.set("rule", [f'"{state}" "/{regex}/" "{next_state}"' for state, regex, next_state in self.rules])
+
+    @property
+    def name(self):
+        return self.get("Name")
+
+    def label(self) -> str:
+        return f"[{self.SECTION}] {self.name or ''}".strip()
+
+    def validate(self) -> list:
+        errors = super().validate()
+        if not self.name:
+            errors.append("[MULTILINE_PARSER]: name is required")
+        flush_timeout = self.get("flush_timeout")
+        if not str(flush_timeout).isdigit() or int(flush_timeout) < 1:
+            errors.append(f"{self.label()}: flush_timeout '{flush_timeout}' must be milliseconds")
+        if not self.rules or self.rules[0][0] != GlobalArgs.START_STATE:
+            errors.append(f"{self.label()}: the first rule must be from {GlobalArgs.START_STATE}")
+        states = {state for state, _, _ in self.rules}
+        for state, regex, next_state in self.rules:
+            if '"' in regex:
+                errors.append(f"{self.label()}: rule '{regex}' can not hold '\"'")
+            try:
+                compile_regex(regex)
+            except re.error as e:
+                errors.append(f"{self.label()}: rule '{regex}' does not compile, {e}")
+            if next_state not in states:
+                errors.append(f"{self.label()}: rule '{regex}' goes to '{next_state}', no rule starts there")
+        return errors
+
+
+def trace_parser(
+    languages: list,
+    start_patterns: dict = None,
+    flush_timeout: int = GlobalArgs.FLUSH_TIMEOUT_MS,
+    name: str = GlobalArgs.PARSER_NAME
+) -> MultilineParser:
+    """
+    One multiline parser folding the traces of every language given. Fluent
+    Bit keeps a group with the parser that opened it, a single parser lets a
+    Python traceback follow a log line that a Java start rule also matches.
+    :param languages: Keys of `TRACE_RULES`
+    :param start_patterns: `{<language>: [<regex>, ...]}` replacing the start rules of a language
+    """
+    unknown = sorted(set(languages) - set(TRACE_RULES))
+    if unknown or not languages:
+        raise ValueError(f"multiline languages {unknown or languages} must be from {sorted(TRACE_RULES)}")
+    start_patterns = start_patterns or {}
+    starts, conts = [], []
+    for language in languages:
+        for pattern in start_patterns.get(language, TRACE_RULES[language]["start"]):
+            if pattern not in starts:
+                starts.append(pattern)
+        for pattern in TRACE_RULES[language]["cont"]:
+            if pattern not in conts:
+                conts.append(pattern)
+    rules = [(GlobalArgs.START_STATE, pattern, GlobalArgs.CONT_STATE) for pattern in starts]
+    rules.append((GlobalArgs.CONT_STATE, "|".join(f"(?:{p})" for p in conts), GlobalArgs.CONT_STATE))
+    return MultilineParser(name, rules, flush_timeout=flush_timeout)
+
+
+def cap_lines_filter(match: str, max_lines: int = GlobalArgs.MAX_LINES) -> Filter:
+    """
+    `lua` filter keeping the first `max_lines` lines of a folded record. The
+    code is inline, classic mode values are one line, so no `--` comments.
+    """
+    if int(max_lines) < 1:
+        raise ValueError(f"max_lines '{max_lines}' must be at least 1")
+    code = (
+        f"function {GlobalArgs.CAP_FUNCTION}(tag, timestamp, record) "
+        f"local log = record[\"{GlobalArgs.KEY_CONTENT}\"] "
+        "if type(log) ~= \"string\" then return 0, timestamp, record end "
+        "local lines, cut = 1, nil "
+        "for pos in string.gmatch(log, \"()\\n\") do "
+        f"if lines == {int(max_lines)} then cut = pos end "
+        "lines = lines + 1 "
+        "end "
+        "if cut == nil then return 0, timestamp, record end "
+        f"record[\"{GlobalArgs.KEY_CONTENT}\"] = string.sub(log, 1, cut - 1) .. \"\\n... \" .. "
+        f"(lines - {int(max_lines)}) .. \" more lines truncated\" "
+        "return 1, timestamp, record "
+        "end"
+    )
+    return Filter("lua", match=match, properties={"call": GlobalArgs.CAP_FUNCTION, "code": code})
+
+
+def cap_lines(text: str, max_lines: int = GlobalArgs.MAX_LINES) -> str:
+    """
+    What the `cap_lines_filter` does to the `log` of a record
+    """
+    lines = text.split("\n")
+    if len(lines) <= max_lines:
+        return text
+    return "\n".join(lines[:max_lines]) + f"\n... {len(lines) - max_lines} more lines truncated"
+
+
+def fold_lines(parser: MultilineParser, lines: list, max_lines: int = GlobalArgs.MAX_LINES) -> list:
+    """
+    Mimic the Fluent Bit multiline engine in python, for checks that need no agent.
+    An open group takes the next line when a rule from its state matches, else
+    the group is flushed & the line starts over from `start_state`.
+    :return: The `log` of every record shipped, folded lines joined by a newline
+    """
+    rules = [(state, compile_regex(regex), next_state) for state, regex, next_state in parser.rules]
+
+    def next_state_for(state, line):
+        for from_state, regex, to_state in rules:
+            if from_state == state and regex.search(line):
+                return to_state
+        return None
+
+    records, group, state = [], [], None
+    for line in lines:
+        if group:
+            to_state = next_state_for(state, line)
+            if to_state is not None:
+                group.append(line)
+                state = to_state
+                continue
+            records.append(cap_lines("\n".join(group), max_lines))
+            group, state = [], None
+        to_state = next_state_for(GlobalArgs.START_STATE, line)
+        if to_state is None:
+            records.append(cap_lines(line, max_lines))
+        else:
+            group, state = [line], to_state
+    if group:
+        records.append(cap_lines("\n".join(group), max_lines))
+    return records
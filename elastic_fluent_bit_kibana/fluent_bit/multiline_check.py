@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import sys
+
+from elastic_fluent_bit_kibana.fluent_bit.multiline import GlobalArgs as MultilineArgs
+from elastic_fluent_bit_kibana.fluent_bit.multiline import TRACE_RULES
+from elastic_fluent_bit_kibana.fluent_bit.multiline import fold_lines
+from elastic_fluent_bit_kibana.fluent_bit.multiline import trace_parser
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "multiline_samples")
+    SAMPLE_SUFFIX = ".log"
+    GOLDEN_SUFFIX = ".golden.json"
+    # Samples named after a language fold with its rules, the others with every language
+    ALL_LANGUAGES = sorted(TRACE_RULES)
+
+
+def sample_names(samples_dir: str = GlobalArgs.SAMPLES_DIR) -> list:
+    return sorted(
+        f[:-len(GlobalArgs.SAMPLE_SUFFIX)] for f in os.listdir(samples_dir) if f.endswith(GlobalArgs.SAMPLE_SUFFIX))
+
+
+def fold_sample(sample: str, max_lines: int = MultilineArgs.MAX_LINES, samples_dir: str = GlobalArgs.SAMPLES_DIR) -> dict:
+    """
+    :return: `{"lines", "records"}`, the sample line count & the folded records
+    """
+    languages = [sample] if sample in TRACE_RULES else GlobalArgs.ALL_LANGUAGES
+    path = os.path.join(samples_dir, sample + GlobalArgs.SAMPLE_SUFFIX)
+    # Fluent Bit `tail` strips the newline of every line
+    with open(path, encoding="utf-8") as f:
+        lines = [line.rstrip("\n") for line in f]
+    return {"lines": len(lines), "records": fold_lines(trace_parser(languages), lines, max_lines)}
+
+
+def check_sample(sample: str, update: bool = False, samples_dir: str = GlobalArgs.SAMPLES_DIR) -> list:
+    """
+    Compare the folded sample with the golden file, or rewrite it with `update`
+    :return: List of human readable mismatches, empty when the sample folds like its golden file
+    """
+    languages = [sample] if sample in TRACE_RULES else GlobalArgs.ALL_LANGUAGES
+    errors = [f"{e}" for e in trace_parser(languages).validate()]
+    result = fold_sample(sample, samples_dir=samples_dir)
+    golden_path = os.path.join(samples_dir, sample + GlobalArgs.GOLDEN_SUFFIX)
+    if update:
+        with open(golden_path, encoding="utf-8", mode="w") as f:
+            f.write(json.dumps(result, indent=2) + "\n")
+        return errors
+    if not os.path.exists(golden_path):
+        return errors + [f"{sample}: no golden file {golden_path}, run with --update"]
+
+    with open(golden_path, encoding="utf-8") as f:
+        golden = json.load(f)
+    if len(golden["records"]) != len(result["records"]):
+        errors.append(f"{sample}: {len(result['records'])} records, golden file has {len(golden['records'])}")
+    for expected, actual in zip(golden["records"], result["records"]):
+        if expected != actual:
+            errors.append(f"{sample}:\n      expected {expected!r}\n      got      {actual!r}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fold the recorded traces with the multiline rules & compare with their golden files")
+    parser.add_argument("samples", nargs="*", default=sample_names(), help="Samples to check, all by default")
+    parser.add_argument("--update", action="store_true", help="Rewrite the golden files from the current rules")
+    args = parser.parse_args()
+
+    errors = []
+    for sample in args.samples:
+        errors.extend(check_sample(sample, update=args.update))
+        result = fold_sample(sample)
+        print(f"{sample}: {result['lines']} lines shipped as {len(result['records'])} records")
+    for error in errors:
+        print(f"  - {error}")
+    print(f"{len(args.samples)} samples checked, {len(errors)} problems")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+import sys
+
+from elastic_fluent_bit_kibana.fluent_bit.parsers import PARSER_CATALOG
+from elastic_fluent_bit_kibana.fluent_bit.parsers import parse_line
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    SAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "parser_samples")
+    SAMPLE_SUFFIX = ".log"
+    GOLDEN_SUFFIX = ".golden.json"
+
+
+def parse_samples(parser_name: str, samples_dir: str = GlobalArgs.SAMPLES_DIR) -> list:
+    """
+    :return: One `{"line", "parsed"}` per sample line, `parsed` is None when the parser does not match
+    """
+    path = os.path.join(samples_dir, parser_name + GlobalArgs.SAMPLE_SUFFIX)
+    with open(path, encoding="utf-8") as f:
+        lines = [line.rstrip("\n") for line in f if line.strip()]
+    return [{"line": line, "parsed": parse_line(PARSER_CATALOG[parser_name], line)} for line in lines]
+
+
+def check_parser(parser_name: str, update: bool = False, samples_dir: str = GlobalArgs.SAMPLES_DIR) -> list:
+    """
+    Compare the parsed samples with the golden file, or rewrite it with `update`
+    :return: List of human readable mismatches, empty when the parser matches its golden file
+    """
+    errors = [f"{e}" for e in PARSER_CATALOG[parser_name].validate()]
+    results = parse_samples(parser_name, samples_dir)
+    golden_path = os.path.join(samples_dir, parser_name + GlobalArgs.GOLDEN_SUFFIX)
+    if update:
+        with open(golden_path, encoding="utf-8", mode="w") as f:
+            f.write(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        return errors
+    if not os.path.exists(golden_path):
+        return errors + [f"{parser_name}: no golden file {golden_path}, run with --update"]
+
+    with open(golden_path, encoding="utf-8") as f:
+        golden = json.load(f)
+    if len(golden) != len(results):
+        errors.append(f"{parser_name}: {len(results)} sample lines, golden file has {len(golden)}")
+    for expected, actual in zip(golden, results):
+        if expected != json.loads(json.dumps(actual)):
+            errors.append(
+                f"{parser_name}: {actual['line']!r}\n"
+                f"      expected {json.dumps(expected['parsed'], sort_keys=True)}\n"
+                f"      got      {json.dumps(actual['parsed'], sort_keys=True)}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the parser catalog against the sample logs & their golden files")
+    parser.add_argument("parsers", nargs="*", default=sorted(PARSER_CATALOG), help="Parsers to check, all by default")
+    parser.add_argument("--update", action="store_true", help="Rewrite the golden files from the current parsers")
+    args = parser.parse_args()
+
+    errors = []
+    for name in args.parsers:
+        if name not in PARSER_CATALOG:
+            errors.append(f"{name}: not in the parser catalog {sorted(PARSER_CATALOG)}")
+            continue
+        errors.extend(check_parser(name, update=args.update))
+    for error in errors:
+        print(f"  - {error}")
+    print(f"{len(args.parsers)} parsers checked, {len(errors)} problems")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
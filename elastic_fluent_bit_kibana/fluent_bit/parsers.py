@@ -0,0 +1,163 @@
+import json
+import re
+from datetime import datetime
+
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import ConfigSection
+
+
+PARSER_FORMATS = ("regex", "json", "ltsv", "logfmt")
+TYPE_NAMES = ("string", "integer", "bool", "float", "hex")
+
+
+class Parser(ConfigSection):
+    """
+    One `[PARSER]` of a Fluent Bit parsers file
+    Ref: https://docs.fluentbit.io/manual/pipeline/parsers/configuring-parser
+    """
+
+    SECTION = "PARSER"
+
+    def __init__(self, name: str, format: str, properties: dict = None):
+        super().__init__({"Name": name, "Format": format})
+        self.update(properties or {})
+
+    @property
+    def name(self):
+        return self.get("Name")
+
+    def label(self) -> str:
+        return f"[{self.SECTION}] {self.name or ''}".strip()
+
+    def types(self) -> dict:
+        """
+        :return: `Types code:integer size:integer` as `{"code": "integer", ...}`
+        """
+        types = {}
+        for item in str(self.get("Types") or "").split():
+            key, _, type_name = item.partition(":")
+            types[key] = type_name
+        return types
+
+    def validate(self) -> list:
+        errors = super().validate()
+        if not self.name:
+            errors.append("[PARSER]: Name is required")
+        if self.get("Format") not in PARSER_FORMATS:
+            errors.append(f"{self.label()}: Format '{self.get('Format')}' is not one of {PARSER_FORMATS}")
+        if self.get("Format") == "regex":
+            if not self.get("Regex"):
+                errors.append(f"{self.label()}: Regex is required")
+            else:
+                try:
+                    compile_regex(self.get("Regex"))
+                except re.error as e:
+                    errors.append(f"{self.label()}: Regex does not compile, {e}")
+        if self.get("Time_Format") and not self.get("Time_Key"):
+            errors.append(f"{self.label()}: Time_Format needs a Time_Key")
+        for key, type_name in self.types().items():
+            if type_name not in TYPE_NAMES:
+                errors.append(f"{self.label()}: Types {key}:{type_name} is not one of {TYPE_NAMES}")
+        return errors
+
+
+# Field names do not reuse `hostname`, `user` or `project`, the `record_modifier`
+# fields, and every field is mapped in `es_config/index_templates.py`. Typed
+# fields only capture digits, a `-` status or size leaves the field out instead of
+# failing the document against its numeric mapping.
+PARSER_CATALOG = {
+    "apache2": Parser("apache2", "regex", {
+        "Regex": (
+            r'^(?<remote>[^ ]*) [^ ]* (?<auth_user>[^ ]*) \[(?<time>[^\]]*)\] '
+            r'"(?<method>\S+)(?: +(?<path>[^ ]*) +\S*)?" (?:(?<code>[0-9]{3})|-) (?:(?<size>[0-9]+)|-)'
+            r'(?: "(?<referer>[^\"]*)" "(?<agent>[^\"]*)")?(?: (?<duration_us>[0-9]+))?$'
+        ),
+        "Time_Key": "time",
+        "Time_Format": "%d/%b/%Y:%H:%M:%S %z",
+        "Types": "code:integer size:integer duration_us:integer",
+    }),
+    "apache_error": Parser("apache_error", "regex", {
+        "Regex": (
+            r'^\[[^ ]* (?<time>[^\]]*)\] \[(?:(?<module>[^:\]]+)?:)?(?<level>[^\]]*)\](?: \[pid (?<pid>[^\]]*)\])?'
+            r'(?: \[client (?<client>[^\]]*)\])? (?<message>.*)$'
+        ),
+        "Time_Key": "time",
+        "Time_Format": "%b %d %H:%M:%S.%L %Y",
+    }),
+    "json": Parser("json", "json", {
+        "Time_Key": "time",
+        "Time_Format": "%Y-%m-%dT%H:%M:%S.%L%z",
+    }),
+    "syslog": Parser("syslog", "regex", {
+        # Files written by rsyslog, `/var/log/messages`, carry no `<PRI>`
+        "Regex": (
+            r'^(?<time>[^ ]* {1,2}[^ ]* [^ ]*) (?<source_host>[^ ]*) '
+            r'(?<ident>[a-zA-Z0-9_\/\.\-]*)(?:\[(?<pid>[0-9]+)\])?(?:[^\:]*\:)? *(?<message>.*)$'
+        ),
+        "Time_Key": "time",
+        "Time_Format": "%b %d %H:%M:%S",
+    }),
+}
+
+
+def compile_regex(regex: str):
+    """
+    Fluent Bit uses Onigmo `(?<name>...)` groups, python wants `(?P<name>...)`
+    """
+    return re.compile(re.sub(r"\(\?<(?=[A-Za-z_])", "(?P<", regex))
+
+
+def _convert(value: str, type_name: str):
+    try:
+        if type_name == "integer":
+            return int(value)
+        if type_name == "float":
+            return float(value)
+        if type_name == "hex":
+            return int(value, 16)
+        if type_name == "bool":
+            return value.lower() == "true"
+    except ValueError:
+        return value
+    return value
+
+
+def parse_time(value: str, time_format: str) -> str:
+    """
+    :return: The parsed log time as ISO 8601, what ends up in `@timestamp`
+    """
+    # `%L` is Fluent Bit for fractional seconds. Formats without a year stay
+    # in 1900 here, Fluent Bit fills in the current year.
+    parsed = datetime.strptime(value, time_format.replace("%L", "%f"))
+    return parsed.isoformat()
+
+
+def parse_line(parser: Parser, line: str):
+    """
+    Mimic a Fluent Bit parser in python, for checks that need no agent.
+    :return: `{"@timestamp": ..., "record": {...}}` or None when the line does not match
+    """
+    if parser.get("Format") == "json":
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict):
+            return None
+    else:
+        match = compile_regex(parser.get("Regex")).search(line)
+        if match is None:
+            return None
+        # Fluent Bit leaves out groups that did not take part in the match
+        record = {k: v for k, v in match.groupdict().items() if v is not None}
+
+    for key, type_name in parser.types().items():
+        if key in record:
+            record[key] = _convert(record[key], type_name)
+
+    timestamp = None
+    time_key = parser.get("Time_Key")
+    if time_key and time_key in record:
+        timestamp = parse_time(str(record[time_key]), parser.get("Time_Format"))
+        if not parser.get("Time_Keep"):
+            record.pop(time_key)
+    return {"@timestamp": timestamp, "record": record}
@@ -0,0 +1,380 @@
+import fnmatch
+import re
+
+
+class FluentBitConfigError(ValueError):
+    """
+    Raised when a Fluent Bit pipeline does not validate at synth time
+    """
+
+
+# Fluent Bit size units: 32k, 32KB, 5M, 5MB, 1G...
+SIZE_PATTERN = re.compile(r"^\d+(\.\d+)?\s*[KMG]?B?$", re.IGNORECASE)
+LOG_LEVELS = ("off", "error", "warn", "info", "debug", "trace")
+KEY_WIDTH = 16
+# Inputs that receive records already tagged by the sending agent
+SENDER_TAGGED_INPUTS = ("forward",)
+# Multiline parsers Fluent Bit ships, usable without a `[MULTILINE_PARSER]`
+BUILTIN_MULTILINE_PARSERS = ("docker", "cri", "go", "python", "java", "ruby")
+
+
+def is_size(value) -> bool:
+    return isinstance(value, int) or bool(SIZE_PATTERN.match(str(value)))
+
+
+def is_number(value) -> bool:
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def matches_tag(section, tag: str) -> bool:
+    """
+    Mirror Fluent Bit routing: `Match_Regex` wins over the `Match` wildcard
+    """
+    if section.get("Match_Regex"):
+        return re.search(section.get("Match_Regex"), tag) is not None
+    return bool(section.get("Match")) and fnmatch.fnmatchcase(tag, section.get("Match"))
+
+
+def render_value(value) -> str:
+    if isinstance(value, bool):
+        return "On" if value else "Off"
+    return f"{value}"
+
+
+class ConfigSection:
+    """
+    One `[SECTION]` of a Fluent Bit classic mode config file.
+
+    Keys are case insensitive in Fluent Bit, so `set()` keeps the first
+    spelling it saw. A list value renders the key once per item, which is how
+    repeated keys like `Record` in `record_modifier` are expressed.
+    """
+
+    SECTION = None
+
+    def __init__(self, properties: dict = None):
+        self.properties = {}
+        for key, value in (properties or {}).items():
+            self.set(key, value)
+
+    def _find_key(self, key: str):
+        for existing in self.properties:
+            if existing.lower() == key.lower():
+                return existing
+        return None
+
+    def set(self, key: str, value):
+        existing = self._find_key(key)
+        if value is None:
+            self.properties.pop(existing, None)
+            return self
+        self.properties[existing or key] = value
+        return self
+
+    def get(self, key: str, default=None):
+        existing = self._find_key(key)
+        if existing is None:
+            return default
+        return self.properties[existing]
+
+    def update(self, properties: dict):
+        for key, value in properties.items():
+            self.set(key, value)
+        return self
+
+    @property
+    def plugin(self):
+        return self.get("Name")
+
+    def label(self) -> str:
+        return f"[{self.SECTION}] {self.plugin or ''}".strip()
+
+    def validate(self) -> list:
+        """
+        :return: List of human readable problems, empty when the section is valid
+        """
+        errors = []
+        for key in ("Mem_Buf_Limit", "Buffer_Chunk_Size", "Buffer_Max_Size",
+                    "storage.backlog.mem_limit", "storage.total_limit_size"):
+            value = self.get(key)
+            if value is not None and not is_size(value):
+                errors.append(f"{self.label()}: {key} '{value}' is not a size")
+        return errors
+
+    def render(self) -> str:
+        lines = [f"[{self.SECTION}]"]
+        width = max([KEY_WIDTH] + [len(k) + 1 for k in self.properties])
+        for key, value in self.properties.items():
+            values = value if isinstance(value, (list, tuple)) else [value]
+            for v in values:
+                lines.append(f"    {key:<{width}}{render_value(v)}")
+        return "\n".join(lines)
+
+
+class Service(ConfigSection):
+    SECTION = "SERVICE"
+
+    def __init__(self, flush=3, properties: dict = None):
+        super().__init__({"Flush": flush})
+        self.update(properties or {})
+
+    def validate(self) -> list:
+        errors = super().validate()
+        flush = self.get("Flush")
+        if not is_number(flush) or float(flush) <= 0:
+            errors.append(f"[SERVICE]: Flush '{flush}' must be a positive number")
+        grace = self.get("Grace")
+        if grace is not None and (not str(grace).isdigit()):
+            errors.append(f"[SERVICE]: Grace '{grace}' must be whole seconds")
+        http_port = self.get("HTTP_Port")
+        if http_port is not None and (not str(http_port).isdigit() or not 0 < int(http_port) < 65536):
+            errors.append(f"[SERVICE]: HTTP_Port '{http_port}' is not a port")
+        log_level = self.get("Log_Level")
+        if log_level is not None and str(log_level).lower() not in LOG_LEVELS:
+            errors.append(f"[SERVICE]: Log_Level '{log_level}' is not one of {LOG_LEVELS}")
+        return errors
+
+
+class Input(ConfigSection):
+    SECTION = "INPUT"
+
+    def __init__(self, plugin: str, tag: str, properties: dict = None):
+        super().__init__({"Name": plugin, "Tag": tag})
+        self.update(properties or {})
+
+    @property
+    def tag(self):
+        return self.get("Tag")
+
+    def validate(self) -> list:
+        errors = super().validate()
+        if not self.plugin:
+            errors.append("[INPUT]: Name is required")
+        if not self.tag and self.plugin not in SENDER_TAGGED_INPUTS:
+            errors.append(f"{self.label()}: Tag is required")
+        refresh = self.get("Refresh_Interval")
+        if refresh is not None and not is_number(refresh):
+            errors.append(f"{self.label()}: Refresh_Interval '{refresh}' must be seconds")
+        if self.plugin == "tail" and not self.get("Path"):
+            errors.append(f"{self.label()}: Path is required")
+        db = self.get("DB")
+        if db is not None and not str(db).startswith("/"):
+            errors.append(f"{self.label()}: DB '{db}' must be an absolute path")
+        rotate_wait = self.get("Rotate_Wait")
+        if rotate_wait is not None and not str(rotate_wait).isdigit():
+            errors.append(f"{self.label()}: Rotate_Wait '{rotate_wait}' must be whole seconds")
+        storage_type = self.get("storage.type")
+        if storage_type is not None and storage_type not in ("memory", "filesystem"):
+            errors.append(f"{self.label()}: storage.type '{storage_type}' must be memory or filesystem")
+        return errors
+
+
+class Filter(ConfigSection):
+    SECTION = "FILTER"
+
+    def __init__(self, plugin: str, match: str, properties: dict = None):
+        super().__init__({"Name": plugin, "Match": match})
+        self.update(properties or {})
+
+    @property
+    def match(self):
+        return self.get("Match")
+
+    def matches(self, tag: str) -> bool:
+        return matches_tag(self, tag)
+
+    def validate(self) -> list:
+        errors = super().validate()
+        if not self.plugin:
+            errors.append("[FILTER]: Name is required")
+        if not self.match and not self.get("Match_Regex"):
+            errors.append(f"{self.label()}: Match or Match_Regex is required")
+        return errors
+
+
+class Output(ConfigSection):
+    SECTION = "OUTPUT"
+
+    def __init__(self, plugin: str, match: str, properties: dict = None):
+        super().__init__({"Name": plugin, "Match": match})
+        self.update(properties or {})
+
+    @property
+    def match(self):
+        return self.get("Match")
+
+    def matches(self, tag: str) -> bool:
+        return matches_tag(self, tag)
+
+    def validate(self) -> list:
+        errors = super().validate()
+        if not self.plugin:
+            errors.append("[OUTPUT]: Name is required")
+        if not self.match and not self.get("Match_Regex"):
+            errors.append(f"{self.label()}: Match or Match_Regex is required")
+        workers = self.get("Workers")
+        if workers is not None and not str(workers).isdigit():
+            errors.append(f"{self.label()}: Workers '{workers}' must be a whole number")
+        buffer_size = self.get("Buffer_Size")
+        if buffer_size is not None and str(buffer_size).lower() != "false" and not is_size(buffer_size):
+            errors.append(f"{self.label()}: Buffer_Size '{buffer_size}' must be a size or False")
+        retry_limit = self.get("Retry_Limit")
+        if retry_limit is not None:
+            retry = str(retry_limit).lower()
+            if retry not in ("false", "no_limits", "no_retries") and (not retry.isdigit() or int(retry) < 1):
+                errors.append(
+                    f"{self.label()}: Retry_Limit '{retry_limit}' must be a positive number, False or no_limits")
+        compress = self.get("Compress")
+        if compress is not None and compress != "gzip":
+            errors.append(f"{self.label()}: Compress '{compress}' must be gzip")
+        if self.plugin in ("es", "forward"):
+            for key in ("Host", "Port"):
+                if not self.get(key):
+                    errors.append(f"{self.label()}: {key} is required")
+        if self.plugin == "kinesis_firehose":
+            for key in ("region", "delivery_stream"):
+                if not self.get(key):
+                    errors.append(f"{self.label()}: {key} is required")
+        return errors
+
+
+class FluentBitPipeline:
+    """
+    Python model of a Fluent Bit configuration.
+
+    The `[SERVICE]` section goes to the main config file, which `@INCLUDE`s the
+    pipeline file holding the inputs, filters & outputs. `variables` are written
+    as `@SET` lines in the main file, so `${NAME}` in the pipeline resolves to
+    them when Fluent Bit parses the config.
+
+    `upstream_tags` lists the tags of records arriving from other agents over
+    `forward`, they are checked against the outputs like input tags.
+
+    `parsers` go to their own file, named by `Parsers_File` in `[SERVICE]`,
+    `[PARSER]` & `[MULTILINE_PARSER]` sections alike.
+    """
+
+    def __init__(self, service: Service = None):
+        self.service = service or Service()
+        self.variables = {}
+        self.upstream_tags = []
+        self.parsers = []
+        self.inputs = []
+        self.filters = []
+        self.outputs = []
+
+    def add_input(self, section: Input) -> Input:
+        self.inputs.append(section)
+        return section
+
+    def add_filter(self, section: Filter) -> Filter:
+        self.filters.append(section)
+        return section
+
+    def add_output(self, section: Output) -> Output:
+        self.outputs.append(section)
+        return section
+
+    def add_parser(self, section) -> ConfigSection:
+        self.parsers.append(section)
+        return section
+
+    def sections(self) -> list:
+        return [self.service] + self.parsers + self.inputs + self.filters + self.outputs
+
+    def tags(self) -> list:
+        return [i.tag for i in self.inputs if i.tag] + list(self.upstream_tags)
+
+    def validate(self):
+        """
+        Validate every section and check that inputs & outputs are wired together.
+        :raises FluentBitConfigError: with every problem found
+        """
+        errors = []
+        for section in self.sections():
+            errors.extend(section.validate())
+        if not self.inputs:
+            errors.append("pipeline has no [INPUT]")
+        if not self.outputs:
+            errors.append("pipeline has no [OUTPUT]")
+
+        if any(i.get("storage.type") == "filesystem" for i in self.inputs) and not self.service.get("storage.path"):
+            errors.append("[SERVICE]: storage.path is required by inputs with storage.type filesystem")
+        dbs = [i.get("DB") for i in self.inputs if i.get("DB")]
+        if len(dbs) != len(set(dbs)):
+            errors.append(f"tail inputs must not share an offset DB {dbs}")
+
+        parser_names = [p.get("Name") for p in self.parsers]
+        if len(parser_names) != len(set(parser_names)):
+            errors.append(f"parser names must be unique {parser_names}")
+        for section in self.inputs + self.filters:
+            for name in self._parser_refs(section):
+                if name not in parser_names:
+                    errors.append(f"{section.label()}: Parser '{name}' is not one of the pipeline parsers {parser_names}")
+        for section in self.inputs:
+            for name in self._multiline_refs(section):
+                if name not in parser_names and name not in BUILTIN_MULTILINE_PARSERS:
+                    errors.append(
+                        f"{section.label()}: multiline.parser '{name}' is neither a pipeline parser "
+                        f"{parser_names} nor built in {BUILTIN_MULTILINE_PARSERS}")
+
+        tags = self.tags()
+        for output in self.outputs:
+            if not any(output.matches(t) for t in tags):
+                errors.append(f"{output.label()}: Match '{output.match}' does not match any input tag {tags}")
+        for tag in tags:
+            if not any(o.matches(tag) for o in self.outputs):
+                errors.append(f"tag '{tag}' is not matched by any [OUTPUT], its records would be dropped")
+
+        if errors:
+            raise FluentBitConfigError(
+                "Invalid Fluent Bit configuration:\n  - " + "\n  - ".join(errors))
+
+    @staticmethod
+    def _parser_refs(section) -> list:
+        refs = section.get("Parser")
+        if refs is None:
+            return []
+        return list(refs) if isinstance(refs, (list, tuple)) else [refs]
+
+    @staticmethod
+    def _multiline_refs(section) -> list:
+        refs = section.get("multiline.parser")
+        if refs is None:
+            return []
+        return [r.strip() for r in str(refs).split(",") if r.strip()]
+
+    def render_parsers(self) -> str:
+        """
+        :return: The parsers as a config file for `Parsers_File`
+        """
+        self.validate()
+        return "\n\n".join(p.render() for p in self.parsers) + "\n"
+
+    def render_pipeline(self) -> str:
+        """
+        :return: inputs, filters & outputs as a config file for `@INCLUDE`
+        """
+        self.validate()
+        return "\n\n".join(s.render() for s in self.inputs + self.filters + self.outputs) + "\n"
+
+    def render_main(self, include_path: str, parsers_path: str = None) -> str:
+        """
+        :param include_path: Path of the rendered pipeline file on the host
+        :param parsers_path: Path of the rendered parsers file, required when the pipeline has parsers
+        :return: Main config file with the `[SERVICE]` section
+        """
+        self.validate()
+        if self.parsers and not parsers_path:
+            raise FluentBitConfigError("pipeline has parsers, render_main needs a parsers_path")
+        service = self.service
+        if self.parsers:
+            service = Service(properties=self.service.properties).set("Parsers_File", parsers_path)
+        lines = [f"@SET {k}={v}" for k, v in self.variables.items()]
+        lines.append(service.render())
+        lines.append(f"@INCLUDE {include_path}")
+        return "\n".join(lines) + "\n"
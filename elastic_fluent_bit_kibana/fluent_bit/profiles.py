@@ -0,0 +1,124 @@
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import FluentBitConfigError
+
+
+# Each profile sets `[SERVICE]` keys and per-plugin keys. Plugin settings are
+# applied to every `[INPUT]`/`[OUTPUT]` whose Name matches the plugin.
+# Ref: https://docs.fluentbit.io/manual/administration/buffering-and-storage
+# Ref: https://docs.fluentbit.io/manual/administration/backpressure
+PIPELINE_PROFILES = {
+    "default": {
+        "description": "Fluent Bit defaults with a 3 second flush, as originally shipped",
+        "service": {"Flush": 3},
+        "inputs": {},
+        "outputs": {},
+    },
+    "low-latency": {
+        "description": "Flush every second with small chunks, trades bulk size for freshness",
+        "service": {"Flush": 1, "Grace": 2},
+        "inputs": {
+            "tail": {
+                "Refresh_Interval": 1,
+                "Buffer_Chunk_Size": "32KB",
+                "Buffer_Max_Size": "256KB",
+                "Mem_Buf_Limit": "16MB",
+            },
+        },
+        "outputs": {
+            "es": {"Workers": 2, "Buffer_Size": "False", "Retry_Limit": 3},
+        },
+    },
+    "high-throughput": {
+        "description": "Large chunks & parallel workers, fewer but fuller bulk requests",
+        "service": {"Flush": 5, "Grace": 10},
+        "inputs": {
+            "tail": {
+                "Refresh_Interval": 10,
+                "Buffer_Chunk_Size": "512KB",
+                "Buffer_Max_Size": "5MB",
+                "Mem_Buf_Limit": "128MB",
+            },
+        },
+        "outputs": {
+            "es": {"Workers": 4, "Buffer_Size": "False", "Retry_Limit": 10},
+        },
+    },
+    "aggregator": {
+        "description": "Aggregator tier, coalesce records from many routers into large bulk requests",
+        "service": {"Flush": 5, "Grace": 10},
+        "inputs": {
+            "forward": {
+                "Buffer_Chunk_Size": "1MB",
+                "Buffer_Max_Size": "6MB",
+                "Mem_Buf_Limit": "256MB",
+            },
+        },
+        "outputs": {
+            "es": {"Workers": 2, "Buffer_Size": "False", "Retry_Limit": 10},
+        },
+    },
+    "memory-capped-t2-micro": {
+        "description": "Keep the agent well inside the 1GiB of a t2.micro, pause tailing under backpressure",
+        "service": {"Flush": 5, "Grace": 5},
+        "inputs": {
+            "tail": {
+                "Buffer_Chunk_Size": "32KB",
+                "Buffer_Max_Size": "64KB",
+                "Mem_Buf_Limit": "8MB",
+                "Skip_Long_Lines": "On",
+            },
+        },
+        "outputs": {
+            "es": {"Workers": 1, "Buffer_Size": "512KB", "Retry_Limit": 5},
+        },
+    },
+}
+
+
+def apply_profile(pipeline, profile_name: str):
+    """
+    Apply a named tuning profile to every matching section of the pipeline.
+    :param pipeline: FluentBitPipeline to tune in place
+    :param profile_name: One of PIPELINE_PROFILES
+    :return: The same pipeline, to allow chaining
+    """
+    if profile_name not in PIPELINE_PROFILES:
+        raise FluentBitConfigError(
+            f"Unknown Fluent Bit profile '{profile_name}', choose one of {sorted(PIPELINE_PROFILES)}")
+    profile = PIPELINE_PROFILES[profile_name]
+    pipeline.service.update(profile["service"])
+    for section in pipeline.inputs:
+        section.update(profile["inputs"].get(section.plugin, {}))
+    for section in pipeline.outputs:
+        section.update(profile["outputs"].get(section.plugin, {}))
+    return pipeline
+
+
+# `es_output` context keys, every key is optional
+ES_TUNING_KEYS = ("flush", "workers", "compress")
+
+
+def apply_es_tuning(pipeline, tuning: dict):
+    """
+    Apply the bulk tuning found by `benchmarks/bulk_tuning.py` on top of the profile.
+
+    Fluent Bit sends one `_bulk` request per buffered chunk, so the bulk size
+    follows from the ingest rate, the `Flush` interval & the chunk size limit,
+    there is no setting for it. The tuning tool only keeps the `flush` &
+    `workers` whose requests stay under its `--max-bulk-kb`.
+    :param tuning: `flush`, `workers` & `compress` (`gzip` or `none`)
+    :return: The same pipeline, to allow chaining
+    """
+    unknown = sorted(set(tuning) - set(ES_TUNING_KEYS))
+    if unknown:
+        raise FluentBitConfigError(f"Unknown es_output keys {unknown}, choose from {ES_TUNING_KEYS}")
+    if tuning.get("flush") is not None:
+        pipeline.service.set("Flush", tuning["flush"])
+    for section in pipeline.outputs:
+        if section.plugin != "es":
+            continue
+        if tuning.get("workers") is not None:
+            section.set("Workers", tuning["workers"])
+        if tuning.get("compress") is not None:
+            # `none` in the context turns compression back off
+            section.set("Compress", None if str(tuning["compress"]).lower() == "none" else tuning["compress"])
+    return pipeline
@@ -0,0 +1,393 @@
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import FluentBitConfigError
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import FluentBitPipeline
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import Filter
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import Input
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import Output
+from elastic_fluent_bit_kibana.fluent_bit.log_metrics import GlobalArgs as LogMetricsArgs
+from elastic_fluent_bit_kibana.fluent_bit.log_metrics import summary_filter
+from elastic_fluent_bit_kibana.fluent_bit.monitoring import enable_http_metrics
+from elastic_fluent_bit_kibana.fluent_bit.multiline import GlobalArgs as MultilineArgs
+from elastic_fluent_bit_kibana.fluent_bit.multiline import cap_lines_filter
+from elastic_fluent_bit_kibana.fluent_bit.multiline import trace_parser
+from elastic_fluent_bit_kibana.fluent_bit.parsers import PARSER_CATALOG
+from elastic_fluent_bit_kibana.fluent_bit.profiles import apply_es_tuning
+from elastic_fluent_bit_kibana.fluent_bit.profiles import apply_profile
+from elastic_fluent_bit_kibana.fluent_bit.sampling import sampling_filter
+from elastic_fluent_bit_kibana.fluent_bit.sampling import sampling_settings
+from elastic_fluent_bit_kibana.fluent_bit.sampling import unsampled_weight_filter
+from elastic_fluent_bit_kibana.fluent_bit.storage import enable_filesystem_buffering
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    LOG_TAG = "automate_log_parse"
+    LOG_PATH = "/var/log/httpd/*log"
+    ES_INDEX = "miztiik_automation"
+    ERROR_LOG_TAG = "automate_log_error"
+    ERROR_LOG_PATH = "/var/log/httpd/*error_log"
+    ES_ERROR_INDEX = "miztiik_automation_errors"
+    APP_LOG_TAG = "automate_log_app"
+    APP_LOG_PATH = "/var/log/app/*.log"
+    METRICS_TAG = "automate_log_metrics"
+    ES_METRICS_INDEX = "miztiik_automation_metrics"
+    # Typeless mappings from the index template, ES 7 only accepts `_doc`
+    ES_TYPE = "_doc"
+    # `Include_Tag_Key` writes the tag here, `_flb-key` by default, which the `strict` mappings reject
+    ES_TAG_KEY = "tag"
+    PROJECT = "elastic-fluent-bit-kibana-demo"
+    FORWARD_PORT = 24224
+    # Recycle connections to the aggregators, so new ones behind the NLB get traffic
+    FORWARD_KEEPALIVE_MAX_RECYCLE = 200
+    # Plugin aliases, the `name` dimension of the exported Prometheus metrics,
+    # suffixed with the lane name
+    INPUT_ALIAS = "router_tail"
+    ES_OUTPUT_ALIAS = "router_es"
+    FORWARD_OUTPUT_ALIAS = "router_forward"
+    FIREHOSE_OUTPUT_ALIAS = "router_firehose"
+    # Firehose takes the record as is, stamp it like the `es` output does
+    FIREHOSE_TIME_KEY = "@timestamp"
+    FIREHOSE_TIME_KEY_FORMAT = "%Y-%m-%dT%H:%M:%S.%3N"
+    # Throttled batches come back as retries, the chunks wait on disk meanwhile
+    FIREHOSE_RETRY_LIMIT = 10
+    ARCHIVE_OUTPUT_ALIAS = "router_archive"
+    # ISO 8601 in UTC, the form the Firehose OpenX JSON SerDe reads into a Parquet timestamp
+    ARCHIVE_TIME_KEY_FORMAT = "%Y-%m-%dT%H:%M:%S.%3NZ"
+
+
+# Priority lanes, each with its own tail input, output & index. A flood of
+# access logs fills the buffers & retry queue of the `access` lane only, while
+# the `errors` lane keeps flushing on its own worker. `input` & `output` keys
+# are applied on top of the tuning profile. `access` stays first, so it keeps
+# the tail offset DB of the single input it replaces. `firehose` sets the
+# buffering & retry window of the lane's delivery stream, in `firehose` delivery mode.
+# `multiline` lists the languages whose traces the lane folds, see `TRACE_RULES`.
+# `sampling` lanes keep every error & a sample of the successes, their parser must set `code`.
+# A `summarize` lane tails nothing, it carries the per-window request summaries
+# of the lane it names. Keep it after that lane, `archive` false leaves it out of the archive.
+ROUTER_LANES = {
+    "access": {
+        "tag": GlobalArgs.LOG_TAG,
+        "path": GlobalArgs.LOG_PATH,
+        "exclude_path": GlobalArgs.ERROR_LOG_PATH,
+        "parser": "apache2",
+        "sampling": True,
+        "index": GlobalArgs.ES_INDEX,
+        "input": {},
+        "output": {},
+        "firehose": {"buffer_seconds": 300, "buffer_mb": 5, "retry_seconds": 300},
+    },
+    "errors": {
+        "tag": GlobalArgs.ERROR_LOG_TAG,
+        "path": GlobalArgs.ERROR_LOG_PATH,
+        "parser": "apache_error",
+        "index": GlobalArgs.ES_ERROR_INDEX,
+        "input": {"Refresh_Interval": 1, "Mem_Buf_Limit": "16MB"},
+        # Error logs are few & precious, never give up on them
+        "output": {"Workers": 1, "Retry_Limit": "no_limits"},
+        # Deliver within the minute, keep retrying for the 2 hours Firehose allows
+        "firehose": {"buffer_seconds": 60, "buffer_mb": 1, "retry_seconds": 7200},
+    },
+    # Application logs, a stack trace is folded into one record instead of one per line
+    "app": {
+        "tag": GlobalArgs.APP_LOG_TAG,
+        "path": GlobalArgs.APP_LOG_PATH,
+        "multiline": ["java", "python", "go"],
+        "index": GlobalArgs.ES_INDEX,
+        "input": {},
+        "output": {},
+        "firehose": {"buffer_seconds": 300, "buffer_mb": 5, "retry_seconds": 300},
+    },
+    # Requests, errors, bytes & latency percentiles per path & status, a few documents a minute
+    "metrics": {
+        "tag": GlobalArgs.METRICS_TAG,
+        "summarize": "access",
+        "index": GlobalArgs.ES_METRICS_INDEX,
+        "archive": False,
+        "input": {},
+        "output": {},
+        "firehose": {"buffer_seconds": 60, "buffer_mb": 1, "retry_seconds": 300},
+    },
+}
+
+
+def lane_alias(prefix: str, lane: str) -> str:
+    return f"{prefix}_{lane}"
+
+
+def rendered_lanes(lanes: dict = None, parse_at_edge: bool = True, log_metrics: dict = None) -> list:
+    """
+    Names of the lanes `build_router_pipeline` renders, in order. A `summarize`
+    lane is left out when the request summaries are off.
+    """
+    lanes = lanes or ROUTER_LANES
+    summaries_on = parse_at_edge and (log_metrics or {}).get("enabled", True)
+    return [name for name, lane in lanes.items() if summaries_on or not lane.get("summarize")]
+
+
+def es_output(
+    es_endpoint: str,
+    es_region: str,
+    match: str = "automate_log*",
+    alias: str = GlobalArgs.ES_OUTPUT_ALIAS,
+    index: str = GlobalArgs.ES_INDEX
+) -> Output:
+    """
+    `es` output with SigV4 signed requests to the Elasticsearch domain
+    """
+    return Output(
+        "es",
+        match=match,
+        properties={
+            "Alias": alias,
+            "Host": es_endpoint,
+            "Port": 443,
+            "tls": True,
+            "AWS_Auth": True,
+            "AWS_Region": es_region,
+            "Index": index,
+            "Type": GlobalArgs.ES_TYPE,
+            "Include_Tag_Key": True,
+            "Tag_Key": GlobalArgs.ES_TAG_KEY,
+        }
+    )
+
+
+def forward_output(
+    host: str,
+    port: int = GlobalArgs.FORWARD_PORT,
+    match: str = "automate_log*",
+    alias: str = GlobalArgs.FORWARD_OUTPUT_ALIAS
+) -> Output:
+    """
+    `forward` output to the aggregator tier
+    """
+    return Output(
+        "forward",
+        match=match,
+        properties={
+            "Alias": alias,
+            "Host": host,
+            "Port": port,
+            "net.keepalive": True,
+            "net.keepalive_max_recycle": GlobalArgs.FORWARD_KEEPALIVE_MAX_RECYCLE,
+        }
+    )
+
+
+def firehose_output(
+    delivery_stream: str,
+    region: str,
+    match: str = "automate_log*",
+    alias: str = GlobalArgs.FIREHOSE_OUTPUT_ALIAS,
+    time_key_format: str = GlobalArgs.FIREHOSE_TIME_KEY_FORMAT
+) -> Output:
+    """
+    `kinesis_firehose` output, the delivery stream buffers & delivers to the domain
+    """
+    return Output(
+        "kinesis_firehose",
+        match=match,
+        properties={
+            "Alias": alias,
+            "region": region,
+            "delivery_stream": delivery_stream,
+            "time_key": GlobalArgs.FIREHOSE_TIME_KEY,
+            "time_key_format": time_key_format,
+            "Retry_Limit": GlobalArgs.FIREHOSE_RETRY_LIMIT,
+        }
+    )
+
+
+def build_router_pipeline(
+    es_endpoint: str,
+    es_region: str,
+    profile: str = "default",
+    durable_buffering: bool = True,
+    forward_to: dict = None,
+    parse_at_edge: bool = True,
+    lanes: dict = None,
+    es_tuning: dict = None,
+    firehose_to: dict = None,
+    archive_to: dict = None,
+    multiline: dict = None,
+    sampling: dict = None,
+    log_metrics: dict = None
+) -> FluentBitPipeline:
+    """
+    Fluent Bit pipeline run by the log routers: tail the httpd logs and ship
+    them to the Elasticsearch domain with SigV4 signed requests.
+    :param es_endpoint: Domain endpoint, usually a token resolved from SSM
+    :param es_region: Region of the domain, usually a token resolved from SSM
+    :param profile: Tuning profile from `PIPELINE_PROFILES`
+    :param durable_buffering: Checkpoint tail offsets & buffer chunks on disk
+    :param forward_to: `{"host": ..., "port": ...}` of the aggregator tier. When
+                       set, records go there over `forward` instead of to the domain.
+    :param parse_at_edge: Parse the httpd lines into fields on the router, so
+                          Elasticsearch indexes fields instead of running queries over `log`
+    :param lanes: Priority lanes, `ROUTER_LANES` by default
+    :param es_tuning: Bulk tuning of the `es` outputs, see `apply_es_tuning`
+    :param firehose_to: `{"region": ..., "streams": {<lane>: <delivery stream>}}`. When
+                        set, records go to the Firehose delivery stream of their lane
+                        instead of to the domain.
+    :param archive_to: `{"region": ..., "streams": {<lane>: <delivery stream>}}` of the
+                       S3 archive. When set, every lane also sends a copy of its records
+                       there, next to the sink it delivers to.
+    :param multiline: The `multiline` context key. Unless `enabled` is false, lanes with
+                      `multiline` fold traces, `flush_timeout_ms` bounds how long a group
+                      stays open, `max_lines` caps a record & `start_patterns` replaces
+                      the start rules of a language.
+    :param sampling: The `sampling` context key. Unless `enabled` is false, lanes with
+                     `sampling` keep every error & a sample of the successful requests,
+                     `base_rate` to `min_rate` of them as the output retries climb.
+                     Needs `parse_at_edge`, the status code is a parsed field.
+    :param log_metrics: The `log_metrics` context key. Unless `enabled` is false, lanes with
+                        `summarize` ship request summaries of that lane every `window_seconds`,
+                        at most `max_groups` paths a window. Needs `parse_at_edge` too.
+    """
+    if forward_to and firehose_to:
+        raise FluentBitConfigError("forward_to & firehose_to are exclusive, pick one sink")
+    lanes = lanes or ROUTER_LANES
+    multiline = multiline or {}
+    sampling = sampling or {}
+    log_metrics = log_metrics or {}
+    rendered = rendered_lanes(lanes, parse_at_edge, log_metrics)
+    # `{<summarized lane>: <summary lane>}`
+    summaries = {lane["summarize"]: name for name, lane in lanes.items() if lane.get("summarize") and name in rendered}
+    pipeline = FluentBitPipeline()
+
+    # `@SET` in the main config, bash fills in the value on the host
+    pipeline.variables["HOSTNAME"] = "${HOSTNAME}"
+
+    lane_sections = {}
+    sampled = set()
+    for name, lane in lanes.items():
+        if name not in rendered:
+            continue
+        if lane.get("summarize"):
+            # Ticks close the windows on time, the summary filter turns them into summaries
+            lane_input = pipeline.add_input(Input(
+                "dummy",
+                tag=lane["tag"],
+                properties={
+                    "Alias": lane_alias(GlobalArgs.INPUT_ALIAS, name),
+                    "Rate": LogMetricsArgs.TICK_RATE,
+                }
+            ))
+        else:
+            lane_input = pipeline.add_input(Input(
+                "tail",
+                tag=lane["tag"],
+                properties={
+                    "Alias": lane_alias(GlobalArgs.INPUT_ALIAS, name),
+                    "Path": lane["path"],
+                    "Exclude_Path": lane.get("exclude_path"),
+                    "Path_Key": "filename",
+                }
+            ))
+
+        # Fold the lines of a trace on the tail input, before any filter sees them
+        if lane.get("multiline") and multiline.get("enabled", True):
+            trace = pipeline.add_parser(trace_parser(
+                lane["multiline"],
+                start_patterns=multiline.get("start_patterns"),
+                flush_timeout=int(multiline.get("flush_timeout_ms", MultilineArgs.FLUSH_TIMEOUT_MS)),
+                name=lane_alias(MultilineArgs.PARSER_NAME, name)
+            ))
+            lane_input.set("multiline.parser", trace.name)
+            pipeline.add_filter(cap_lines_filter(
+                lane["tag"],
+                int(multiline.get("max_lines", MultilineArgs.MAX_LINES))
+            ))
+
+        if parse_at_edge and lane.get("parser"):
+            if lane["parser"] not in [p.name for p in pipeline.parsers]:
+                pipeline.add_parser(PARSER_CATALOG[lane["parser"]])
+            # `Reserve_Data` keeps `filename` from the tail input, a line the
+            # parser does not match is shipped as is
+            pipeline.add_filter(Filter(
+                "parser",
+                match=lane["tag"],
+                properties={
+                    "Key_Name": "log",
+                    "Parser": lane["parser"],
+                    "Reserve_Data": True,
+                }
+            ))
+            # Summarize every request, before the sampling drops any
+            if name in summaries:
+                pipeline.add_filter(summary_filter(
+                    lane["tag"],
+                    lanes[summaries[name]]["tag"],
+                    window_seconds=int(log_metrics.get("window_seconds", LogMetricsArgs.WINDOW_SECONDS)),
+                    max_groups=int(log_metrics.get("max_groups", LogMetricsArgs.MAX_GROUPS))
+                ))
+            # Sample once the status code is a field, before the outputs spend anything on the record
+            if lane.get("sampling") and sampling.get("enabled", True):
+                settings = sampling_settings(sampling)
+                pipeline.add_filter(sampling_filter(
+                    lane["tag"],
+                    base_rate=settings["base_rate"],
+                    min_rate=settings["min_rate"]
+                ))
+                sampled.add(name)
+        # The rollups sum `sample_weight` over every document of the index
+        if not lane.get("summarize") and name not in sampled:
+            pipeline.add_filter(unsampled_weight_filter(lane["tag"]))
+
+        if firehose_to:
+            lane_output = firehose_output(
+                firehose_to["streams"][name],
+                firehose_to["region"],
+                match=lane["tag"],
+                alias=lane_alias(GlobalArgs.FIREHOSE_OUTPUT_ALIAS, name)
+            )
+        elif forward_to:
+            lane_output = forward_output(
+                forward_to["host"],
+                forward_to.get("port", GlobalArgs.FORWARD_PORT),
+                match=lane["tag"],
+                alias=lane_alias(GlobalArgs.FORWARD_OUTPUT_ALIAS, name)
+            )
+        else:
+            lane_output = es_output(
+                es_endpoint,
+                es_region,
+                match=lane["tag"],
+                alias=lane_alias(GlobalArgs.ES_OUTPUT_ALIAS, name),
+                index=lane["index"]
+            )
+        lane_sections[name] = (lane_input, pipeline.add_output(lane_output))
+
+        if archive_to and lane.get("archive", True):
+            pipeline.add_output(firehose_output(
+                archive_to["streams"][name],
+                archive_to["region"],
+                match=lane["tag"],
+                alias=lane_alias(GlobalArgs.ARCHIVE_OUTPUT_ALIAS, name),
+                time_key_format=GlobalArgs.ARCHIVE_TIME_KEY_FORMAT
+            ))
+
+    pipeline.add_filter(Filter(
+        "record_modifier",
+        match="*",
+        properties={
+            "Record": [
+                "hostname ${HOSTNAME}",
+                f"project {GlobalArgs.PROJECT}",
+                "user Mystique",
+            ],
+        }
+    ))
+
+    apply_profile(pipeline, profile)
+    apply_es_tuning(pipeline, es_tuning or {})
+    for name, (lane_input, lane_output) in lane_sections.items():
+        lane_input.update(lanes[name].get("input", {}))
+        lane_output.update(lanes[name].get("output", {}))
+    enable_http_metrics(pipeline)
+    if durable_buffering:
+        enable_filesystem_buffering(pipeline)
+    return pipeline
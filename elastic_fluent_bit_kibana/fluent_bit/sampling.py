@@ -0,0 +1,103 @@
+from elastic_fluent_bit_kibana.fluent_bit.pipeline import Filter
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    # Written by `publish_fluent_bit_metrics.py` every minute, read by the `lua` filter
+    RATE_FILE = "/var/lib/td-agent-bit/sampling-rate"
+    # Seconds between two reads of the rate file, not one read per record
+    RATE_RELOAD_SECONDS = 10
+    # Keep every success until the outputs struggle, never keep less than 1 in 20
+    BASE_RATE = 1.0
+    MIN_RATE = 0.05
+    # Output retries a minute, summed over the outputs of a router, that halve the rate
+    RETRIES_THRESHOLD = 50
+    STATUS_KEY = "code"
+    # Records with a status below this are sampled, the others are all kept
+    KEEP_STATUS_FROM = 400
+    # Kept records stand for this many records, sum it instead of counting documents
+    WEIGHT_KEY = "sample_weight"
+    SAMPLE_FUNCTION = "sample_success"
+
+
+def sampling_settings(sampling: dict = None) -> dict:
+    """
+    The `sampling` context key with its defaults filled in
+    :raises ValueError: When the rates are not `0 < min_rate <= base_rate <= 1`
+    """
+    sampling = sampling or {}
+    settings = {
+        "base_rate": float(sampling.get("base_rate", GlobalArgs.BASE_RATE)),
+        "min_rate": float(sampling.get("min_rate", GlobalArgs.MIN_RATE)),
+        "retries_threshold": int(sampling.get("retries_threshold", GlobalArgs.RETRIES_THRESHOLD)),
+    }
+    if not 0 < settings["min_rate"] <= settings["base_rate"] <= 1:
+        raise ValueError(
+            f"sampling rates min_rate '{settings['min_rate']}' & base_rate '{settings['base_rate']}' "
+            "must be 0 < min_rate <= base_rate <= 1")
+    return settings
+
+
+def sampling_filter(
+    match: str,
+    base_rate: float = GlobalArgs.BASE_RATE,
+    min_rate: float = GlobalArgs.MIN_RATE,
+    rate_file: str = GlobalArgs.RATE_FILE,
+    reload_seconds: int = GlobalArgs.RATE_RELOAD_SECONDS
+) -> Filter:
+    """
+    `lua` filter keeping every error & a sample of the successful requests. The
+    rate comes from `rate_file`, clamped to `[min_rate, base_rate]`, `base_rate`
+    until the file exists. Kept records get `sample_weight`, 1 for errors & `1/rate`
+    for sampled successes. Records without a numeric `code` are errors to us.
+    The code is inline, classic mode values are one line, so no `--` comments.
+    """
+    code = (
+        "math.randomseed(os.time()) "
+        f"local rate, checked = {float(base_rate)}, 0 "
+        f"function {GlobalArgs.SAMPLE_FUNCTION}(tag, timestamp, record) "
+        f"local status = tonumber(record[\"{GlobalArgs.STATUS_KEY}\"]) "
+        f"if status == nil or status >= {int(GlobalArgs.KEEP_STATUS_FROM)} then "
+        f"record[\"{GlobalArgs.WEIGHT_KEY}\"] = 1 "
+        "return 1, timestamp, record "
+        "end "
+        "local now = os.time() "
+        f"if now - checked >= {int(reload_seconds)} then "
+        "checked = now "
+        f"local f = io.open(\"{rate_file}\", \"r\") "
+        "if f ~= nil then "
+        "local value = tonumber(f:read(\"*l\")) "
+        "f:close() "
+        f"if value ~= nil then rate = math.min({float(base_rate)}, math.max({float(min_rate)}, value)) end "
+        "end "
+        "end "
+        "if math.random() >= rate then return -1, timestamp, record end "
+        f"record[\"{GlobalArgs.WEIGHT_KEY}\"] = 1 / rate "
+        "return 1, timestamp, record "
+        "end"
+    )
+    return Filter("lua", match=match, properties={"call": GlobalArgs.SAMPLE_FUNCTION, "code": code})
+
+
+def unsampled_weight_filter(match: str) -> Filter:
+    """
+    `record_modifier` giving the records of a lane nothing samples a weight of
+    1, so summing `sample_weight` counts every lane alike
+    """
+    return Filter("record_modifier", match=match, properties={"Record": [f"{GlobalArgs.WEIGHT_KEY} 1"]})
+
+
+def sampling_publisher_args(sampling: dict = None, rate_file: str = GlobalArgs.RATE_FILE) -> str:
+    """
+    Arguments of `publish_fluent_bit_metrics.py` that adapt the rate every minute
+    """
+    settings = sampling_settings(sampling)
+    return (
+        f" --sampling-rate-file {rate_file}"
+        f" --sampling-base-rate {settings['base_rate']}"
+        f" --sampling-min-rate {settings['min_rate']}"
+        f" --sampling-retries-threshold {settings['retries_threshold']}"
+    )
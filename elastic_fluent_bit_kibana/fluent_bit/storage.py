@@ -0,0 +1,74 @@
+import posixpath
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    # Named after the 1.x package, kept so the `fluent-bit` agent resumes its offsets & chunks
+    STATE_DIR = "/var/lib/td-agent-bit"
+    STORAGE_PATH = f"{STATE_DIR}/flb-storage/"
+    BACKLOG_MEM_LIMIT = "5M"
+    MAX_CHUNKS_UP = 128
+    OUTPUT_TOTAL_LIMIT_SIZE = "512M"
+    ROTATE_WAIT = 30
+
+
+def enable_filesystem_buffering(
+    pipeline,
+    storage_path: str = GlobalArgs.STORAGE_PATH,
+    backlog_mem_limit: str = GlobalArgs.BACKLOG_MEM_LIMIT,
+    output_total_limit_size: str = GlobalArgs.OUTPUT_TOTAL_LIMIT_SIZE
+):
+    """
+    Make ingestion survive agent restarts.
+
+    - Every `tail` input checkpoints per-file offsets (keyed by inode) in a
+      SQLite `DB`, so a restart resumes where it stopped instead of re-reading
+    - Chunks are buffered in a filesystem store, so records accepted but not
+      yet flushed are not lost when the service is stopped
+    - `storage.backlog.mem_limit` bounds how much of the on-disk backlog is
+      loaded back into memory after a restart
+    - `storage.total_limit_size` caps the disk used by each output queue
+    - Rotated files are kept open for `Rotate_Wait` seconds to drain them
+
+    Ref: https://docs.fluentbit.io/manual/administration/buffering-and-storage
+    :param pipeline: FluentBitPipeline to update in place
+    :return: The same pipeline, to allow chaining
+    """
+    pipeline.service.update({
+        "storage.path": storage_path,
+        "storage.sync": "normal",
+        "storage.checksum": "off",
+        "storage.backlog.mem_limit": backlog_mem_limit,
+        "storage.max_chunks_up": GlobalArgs.MAX_CHUNKS_UP,
+    })
+
+    for i, section in enumerate(pipeline.inputs):
+        section.set("storage.type", "filesystem")
+        if section.plugin == "tail":
+            section.update({
+                "DB": f"{GlobalArgs.STATE_DIR}/tail-{section.tag}-{i}.db",
+                "DB.sync": "normal",
+                "Rotate_Wait": GlobalArgs.ROTATE_WAIT,
+            })
+
+    for section in pipeline.outputs:
+        section.set("storage.total_limit_size", output_total_limit_size)
+
+    return pipeline
+
+
+def state_directories(pipeline) -> list:
+    """
+    :return: Directories that must exist on the host before Fluent Bit starts
+    """
+    dirs = []
+    storage_path = pipeline.service.get("storage.path")
+    if storage_path:
+        dirs.append(storage_path.rstrip("/"))
+    for section in pipeline.inputs:
+        if section.get("DB"):
+            dirs.append(posixpath.dirname(section.get("DB")))
+    return sorted(set(dirs))
@@ -0,0 +1,95 @@
+from elastic_fluent_bit_kibana.es_config.index_templates import FIELD_MAPPINGS
+from elastic_fluent_bit_kibana.es_config.index_templates import PARSED_FIELD_MAPPINGS
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    DATABASE_NAME = "miztiik_log_archive"
+    TABLE_NAME = "router_logs"
+    OBJECT_PREFIX = "logs"
+    ERROR_PREFIX = "conversion-errors"
+    # Hive column names are lower case letters, digits & `_`
+    TIME_COLUMN = "event_time"
+    TIME_KEY = "@timestamp"
+    # Partition projection starts here, the first day logs can exist
+    PROJECTION_START = "2020-11-01"
+
+
+# Elasticsearch field type to Glue/Hive column type
+HIVE_TYPES = {
+    "date": "timestamp",
+    "keyword": "string",
+    "text": "string",
+    "short": "int",
+    "integer": "int",
+    "long": "bigint",
+    "float": "float",
+}
+
+# `lane` is the priority lane of the router, `dt` the day Firehose received the record
+PARTITION_KEYS = [
+    {"name": "lane", "type": "string"},
+    {"name": "dt", "type": "string"},
+]
+
+
+def column_name(field: str) -> str:
+    return GlobalArgs.TIME_COLUMN if field == GlobalArgs.TIME_KEY else field
+
+
+def archive_columns(field_mappings: dict = None) -> list:
+    """
+    Columns of the archive table, the same fields the index templates map,
+    so a long range scan in Athena & a search in Kibana see the same record.
+    """
+    field_mappings = field_mappings or {**FIELD_MAPPINGS, **PARSED_FIELD_MAPPINGS}
+    columns = []
+    for field, mapping in field_mappings.items():
+        if mapping["type"] not in HIVE_TYPES:
+            raise ValueError(f"{field}: no Hive type for '{mapping['type']}', add it to HIVE_TYPES")
+        columns.append({"name": column_name(field), "type": HIVE_TYPES[mapping["type"]]})
+    return columns
+
+
+def json_key_mappings(field_mappings: dict = None) -> dict:
+    """
+    OpenX JSON SerDe mappings for the fields whose key is not a valid column name
+    """
+    field_mappings = field_mappings or {**FIELD_MAPPINGS, **PARSED_FIELD_MAPPINGS}
+    return {column_name(f): f for f in field_mappings if column_name(f) != f}
+
+
+def object_prefix(lane: str) -> str:
+    """
+    Hive style partitions, Firehose fills in the arrival day
+    """
+    return f"{GlobalArgs.OBJECT_PREFIX}/lane={lane}/dt=!{{timestamp:yyyy-MM-dd}}/"
+
+
+def error_prefix(lane: str) -> str:
+    return f"{GlobalArgs.ERROR_PREFIX}/!{{firehose:error-output-type}}/lane={lane}/dt=!{{timestamp:yyyy-MM-dd}}/"
+
+
+def projection_parameters(bucket_name: str, lanes: list) -> dict:
+    """
+    Table parameters for Athena partition projection, new days & lanes are
+    queryable without a crawler or `MSCK REPAIR TABLE`
+    """
+    return {
+        "classification": "parquet",
+        "parquet.compression": "SNAPPY",
+        "projection.enabled": "true",
+        "projection.lane.type": "enum",
+        "projection.lane.values": ",".join(lanes),
+        "projection.dt.type": "date",
+        "projection.dt.format": "yyyy-MM-dd",
+        "projection.dt.range": f"{GlobalArgs.PROJECTION_START},NOW",
+        "projection.dt.interval": "1",
+        "projection.dt.interval.unit": "DAYS",
+        "storage.location.template": (
+            f"s3://{bucket_name}/{GlobalArgs.OBJECT_PREFIX}/lane=${{lane}}/dt=${{dt}}/"
+        ),
+    }
@@ -0,0 +1,62 @@
+#!/bin/bash
+set -ex
+set -o pipefail
+
+# version: 22Nov2020
+
+##################################################
+#############     SET GLOBALS     ################
+##################################################
+
+# Troubleshoot here
+# /var/lib/cloud/instance/scripts/part-001:
+# /var/log/user-data.log
+
+# Routers launched from the pre-baked AMI, `deploy_app.sh` already ran while baking.
+# The SSM association installs the Fluent Bit config as soon as the SSM agent registers.
+
+LOG_FILE="/var/log/miztiik-automation-boot-strap.log"
+
+cw_agent_schema="/opt/aws/amazon-cloudwatch-agent/etc/amazon-cloudwatch-agent.json"
+
+function write_prometheus_config(){
+# Scrape the Fluent Bit HTTP server, `[SERVICE]` turns it on at 127.0.0.1:2020
+# Ref: https://docs.fluentbit.io/manual/administration/monitoring
+# Label the series with the Auto Scaling group, or the instance outside of one, like
+# `publish_fluent_bit_metrics.py` does, so routers, aggregators & stacks do not blend
+INSTANCE_ID=$(curl -s http://169.254.169.254/latest/meta-data/instance-id)
+EC2_AVAIL_ZONE=$(curl -s http://169.254.169.254/latest/meta-data/placement/availability-zone)
+AWS_REGION=$(echo "${EC2_AVAIL_ZONE}" | sed 's/[a-z]$//')
+ASG_NAME=$(aws autoscaling describe-auto-scaling-instances --region "${AWS_REGION}" --instance-ids "${INSTANCE_ID}" \
+    --query "AutoScalingInstances[0].AutoScalingGroupName" --output text 2> /dev/null || true)
+if [ -n "${ASG_NAME}" ] && [ "${ASG_NAME}" != "None" ]; then
+    FLEET_LABEL="AutoScalingGroupName: \"${ASG_NAME}\""
+else
+    FLEET_LABEL="InstanceId: \"${INSTANCE_ID}\""
+fi
+cat > '/opt/aws/amazon-cloudwatch-agent/var/prometheus.yaml' << EOF
+global:
+  scrape_interval: 1m
+  scrape_timeout: 10s
+scrape_configs:
+  - job_name: fluent-bit
+    metrics_path: /api/v1/metrics/prometheus
+    static_configs:
+      - targets: ["127.0.0.1:2020"]
+        labels:
+          ${FLEET_LABEL}
+EOF
+}
+
+function start_cw_agent(){
+    # Translate the config again, the log stream & the scrape label are this instance's, not the image builder's
+    write_prometheus_config
+    sudo /opt/aws/amazon-cloudwatch-agent/bin/amazon-cloudwatch-agent-ctl -a fetch-config -m ec2 -c file:${cw_agent_schema} -s
+}
+
+function start_httpd(){
+    systemctl start httpd
+}
+
+start_cw_agent >> "${LOG_FILE}"
+start_httpd >> "${LOG_FILE}"
@@ -14,6 +14,9 @@ GIT_REPO_URL="https://github.com/miztiik/$REPO_NAME.git"
 
 APP_DIR="/var/$REPO_NAME"
 
+# Tail offsets & buffered chunks survive agent restarts
+STATE_DIR="/var/lib/td-agent-bit"
+
 function install_fluent_bit(){
 # https://docs.fluentbit.io/manual/installation/linux/amazon-linux
 cat > '/etc/yum.repos.d/td-agent-bit.repo' << "EOF"
@@ -34,6 +37,7 @@ service td-agent-bit status
 
 function create_config_files(){
     mkdir -p "${APP_DIR}"
+    mkdir -p "${STATE_DIR}/flb-storage"
     cd "${APP_DIR}"
 
 cat > ${APP_DIR}/es.conf << EOF
@@ -42,6 +46,10 @@ cat > ${APP_DIR}/es.conf << EOF
     path            /var/log/httpd/*.log
     tag             automation_log_lambda
     Path_Key        filename
+    DB              ${STATE_DIR}/tail-automation_log_lambda-0.db
+    DB.sync         normal
+    Rotate_Wait     30
+    storage.type    filesystem
 
 [FILTER]
     Name record_modifier
@@ -59,7 +67,8 @@ cat > ${APP_DIR}/es.conf << EOF
     AWS_Auth      On
     AWS_Region    us-east-1
     Index         miztiik_automation
-    Type          app_logs
+    Type          _doc
+    storage.total_limit_size 512M
 EOF
 }
 
@@ -75,6 +84,15 @@ sudo service td-agent-bit stop
 cat > '/etc/td-agent-bit/td-agent-bit.conf' << EOF
 [SERVICE]
     Flush 2
+    HTTP_Server               On
+    HTTP_Listen               127.0.0.1
+    HTTP_Port                 2020
+    storage.metrics           On
+    storage.path              ${STATE_DIR}/flb-storage/
+    storage.sync              normal
+    storage.checksum          off
+    storage.backlog.mem_limit 5M
+    storage.max_chunks_up     128
 
 @INCLUDE ${APP_DIR}/es.conf
 EOF
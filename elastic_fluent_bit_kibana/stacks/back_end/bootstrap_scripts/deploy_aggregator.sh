@@ -0,0 +1,172 @@
+#!/bin/bash
+set -ex
+set -o pipefail
+
+# version: 22Nov2020
+
+##################################################
+#############     SET GLOBALS     ################
+##################################################
+
+# Troubleshoot here
+# /var/lib/cloud/instance/scripts/part-001:
+# /var/log/user-data.log
+
+# Forward aggregators run no web app, they only need the CloudWatch agent & python3
+# for the metrics publisher. The SSM association installs Fluent Bit & the generated
+# aggregator config as a versioned release as soon as the SSM agent registers.
+
+LOG_FILE="/var/log/miztiik-automation-boot-strap.log"
+
+function install_libs(){
+    # The metrics publisher needs python3 & boto3
+    yum -y install python3
+    pip3 install boto3
+}
+
+function write_prometheus_config(){
+# Scrape the Fluent Bit HTTP server, `[SERVICE]` turns it on at 127.0.0.1:2020
+# Ref: https://docs.fluentbit.io/manual/administration/monitoring
+# Label the series with the Auto Scaling group, or the instance outside of one, like
+# `publish_fluent_bit_metrics.py` does, so routers, aggregators & stacks do not blend
+INSTANCE_ID=$(curl -s http://169.254.169.254/latest/meta-data/instance-id)
+EC2_AVAIL_ZONE=$(curl -s http://169.254.169.254/latest/meta-data/placement/availability-zone)
+AWS_REGION=$(echo "${EC2_AVAIL_ZONE}" | sed 's/[a-z]$//')
+ASG_NAME=$(aws autoscaling describe-auto-scaling-instances --region "${AWS_REGION}" --instance-ids "${INSTANCE_ID}" \
+    --query "AutoScalingInstances[0].AutoScalingGroupName" --output text 2> /dev/null || true)
+if [ -n "${ASG_NAME}" ] && [ "${ASG_NAME}" != "None" ]; then
+    FLEET_LABEL="AutoScalingGroupName: \"${ASG_NAME}\""
+else
+    FLEET_LABEL="InstanceId: \"${INSTANCE_ID}\""
+fi
+cat > '/opt/aws/amazon-cloudwatch-agent/var/prometheus.yaml' << EOF
+global:
+  scrape_interval: 1m
+  scrape_timeout: 10s
+scrape_configs:
+  - job_name: fluent-bit
+    metrics_path: /api/v1/metrics/prometheus
+    static_configs:
+      - targets: ["127.0.0.1:2020"]
+        labels:
+          ${FLEET_LABEL}
+EOF
+}
+
+function install_cw_agent() {
+# Installing AWS CloudWatch Agent FOR AMAZON LINUX RPM
+agent_dir="/tmp/cw_agent"
+cw_agent_rpm="https://s3.amazonaws.com/amazoncloudwatch-agent/amazon_linux/amd64/latest/amazon-cloudwatch-agent.rpm"
+mkdir -p ${agent_dir} \
+    && cd ${agent_dir} \
+    && sudo yum install -y curl \
+    && curl ${cw_agent_rpm} -o ${agent_dir}/amazon-cloudwatch-agent.rpm \
+    && sudo rpm -U ${agent_dir}/amazon-cloudwatch-agent.rpm
+
+
+cw_agent_schema="/opt/aws/amazon-cloudwatch-agent/etc/amazon-cloudwatch-agent.json"
+
+# PARAM_NAME="/stream-data-processor/streams/data_pipe/stream_name"
+# a=$(aws ssm get-parameter --name "$PARAM_NAME" --with-decryption --query "Parameter.{Value:Value}" --output text)
+# LOG_GROUP_NAME="/stream-data-processor/producers"
+
+cat > '/opt/aws/amazon-cloudwatch-agent/etc/amazon-cloudwatch-agent.json' << "EOF"
+{
+"agent": {
+    "metrics_collection_interval": 5,
+    "logfile": "/opt/aws/amazon-cloudwatch-agent/logs/amazon-cloudwatch-agent.log"
+},
+"metrics": {
+    "metrics_collected": {
+    "mem": {
+        "measurement": [
+        "mem_used_percent"
+        ]
+    }
+    },
+    "append_dimensions": {
+    "ImageId": "${aws:ImageId}",
+    "InstanceId": "${aws:InstanceId}",
+    "InstanceType": "${aws:InstanceType}"
+    },
+    "aggregation_dimensions": [
+    [
+        "InstanceId",
+        "InstanceType"
+    ],
+    []
+    ]
+},
+"logs": {
+    "metrics_collected": {
+    "prometheus": {
+        "log_group_name": "/miztiik-automation/fluent-bit-metrics",
+        "prometheus_config_path": "/opt/aws/amazon-cloudwatch-agent/var/prometheus.yaml",
+        "emf_processor": {
+        "metric_declaration_dedup": true,
+        "metric_namespace": "MiztiikAutomation/FluentBit",
+        "metric_declaration": [
+            {
+            "source_labels": ["job", "AutoScalingGroupName"],
+            "label_matcher": "^fluent-bit;.+$",
+            "dimensions": [["name", "AutoScalingGroupName"]],
+            "metric_selectors": [
+                "^fluentbit_input_records_total$",
+                "^fluentbit_input_bytes_total$",
+                "^fluentbit_output_proc_records_total$",
+                "^fluentbit_output_proc_bytes_total$",
+                "^fluentbit_output_errors_total$",
+                "^fluentbit_output_retries_total$",
+                "^fluentbit_output_retries_failed_total$",
+                "^fluentbit_output_dropped_records_total$"
+            ]
+            },
+            {
+            "source_labels": ["job", "InstanceId"],
+            "label_matcher": "^fluent-bit;.+$",
+            "dimensions": [["name", "InstanceId"]],
+            "metric_selectors": [
+                "^fluentbit_input_records_total$",
+                "^fluentbit_input_bytes_total$",
+                "^fluentbit_output_proc_records_total$",
+                "^fluentbit_output_proc_bytes_total$",
+                "^fluentbit_output_errors_total$",
+                "^fluentbit_output_retries_total$",
+                "^fluentbit_output_retries_failed_total$",
+                "^fluentbit_output_dropped_records_total$"
+            ]
+            }
+        ]
+        }
+    }
+    },
+    "logs_collected": {
+    "files": {
+        "collect_list": [
+        {
+            "file_path": "/var/log/miztiik-automation-boot-strap.log",
+            "log_group_name": "/miztiik-automation/boot-strap",
+            "timestamp_format": "%b %-d %H:%M:%S",
+            "timezone": "Local"
+        }
+        ]
+    }
+    },
+    "log_stream_name": "{instance_id}"
+}
+}
+EOF
+
+write_prometheus_config
+
+    # Configure the agent to monitor ssh log file
+    sudo /opt/aws/amazon-cloudwatch-agent/bin/amazon-cloudwatch-agent-ctl -a fetch-config -m ec2 -c file:${cw_agent_schema} -s
+    # Start the CW Agent
+    sudo /opt/aws/amazon-cloudwatch-agent/bin/amazon-cloudwatch-agent-ctl -m ec2 -a status
+
+    # Just in case we need to troubleshoot
+    # cd "/opt/aws/amazon-cloudwatch-agent/logs/"
+}
+
+install_libs >> "${LOG_FILE}"
+install_cw_agent >> "${LOG_FILE}"
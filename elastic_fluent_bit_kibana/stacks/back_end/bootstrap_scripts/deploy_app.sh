@@ -55,6 +55,11 @@ unassume_role() {
 
 function install_httpd(){
     sudo yum -y install httpd
+    # Log the time taken to serve each request in microseconds, `%D`, after the combined format
+    # The routers summarize the latency percentiles from it, see `fluent_bit/log_metrics.py`
+    cat > /etc/httpd/conf.d/00-log-duration.conf << 'LOG_DURATION_CONF'
+LogFormat "%h %l %u %t \"%r\" %>s %b \"%{Referer}i\" \"%{User-Agent}i\" %D" combined
+LOG_DURATION_CONF
     systemctl start httpd
     systemctl enable httpd
     echo "hello" >> /var/www/html/index.html
@@ -106,6 +111,35 @@ function install_nodejs(){
 }
 
 
+function write_prometheus_config(){
+# Scrape the Fluent Bit HTTP server, `[SERVICE]` turns it on at 127.0.0.1:2020
+# Ref: https://docs.fluentbit.io/manual/administration/monitoring
+# Label the series with the Auto Scaling group, or the instance outside of one, like
+# `publish_fluent_bit_metrics.py` does, so routers, aggregators & stacks do not blend
+INSTANCE_ID=$(curl -s http://169.254.169.254/latest/meta-data/instance-id)
+EC2_AVAIL_ZONE=$(curl -s http://169.254.169.254/latest/meta-data/placement/availability-zone)
+AWS_REGION=$(echo "${EC2_AVAIL_ZONE}" | sed 's/[a-z]$//')
+ASG_NAME=$(aws autoscaling describe-auto-scaling-instances --region "${AWS_REGION}" --instance-ids "${INSTANCE_ID}" \
+    --query "AutoScalingInstances[0].AutoScalingGroupName" --output text 2> /dev/null || true)
+if [ -n "${ASG_NAME}" ] && [ "${ASG_NAME}" != "None" ]; then
+    FLEET_LABEL="AutoScalingGroupName: \"${ASG_NAME}\""
+else
+    FLEET_LABEL="InstanceId: \"${INSTANCE_ID}\""
+fi
+cat > '/opt/aws/amazon-cloudwatch-agent/var/prometheus.yaml' << EOF
+global:
+  scrape_interval: 1m
+  scrape_timeout: 10s
+scrape_configs:
+  - job_name: fluent-bit
+    metrics_path: /api/v1/metrics/prometheus
+    static_configs:
+      - targets: ["127.0.0.1:2020"]
+        labels:
+          ${FLEET_LABEL}
+EOF
+}
+
 function install_cw_agent() {
 # Installing AWS CloudWatch Agent FOR AMAZON LINUX RPM
 agent_dir="/tmp/cw_agent"
@@ -151,6 +185,48 @@ cat > '/opt/aws/amazon-cloudwatch-agent/etc/amazon-cloudwatch-agent.json' << "EO
     ]
 },
 "logs": {
+    "metrics_collected": {
+    "prometheus": {
+        "log_group_name": "/miztiik-automation/fluent-bit-metrics",
+        "prometheus_config_path": "/opt/aws/amazon-cloudwatch-agent/var/prometheus.yaml",
+        "emf_processor": {
+        "metric_declaration_dedup": true,
+        "metric_namespace": "MiztiikAutomation/FluentBit",
+        "metric_declaration": [
+            {
+            "source_labels": ["job", "AutoScalingGroupName"],
+            "label_matcher": "^fluent-bit;.+$",
+            "dimensions": [["name", "AutoScalingGroupName"]],
+            "metric_selectors": [
+                "^fluentbit_input_records_total$",
+                "^fluentbit_input_bytes_total$",
+                "^fluentbit_output_proc_records_total$",
+                "^fluentbit_output_proc_bytes_total$",
+                "^fluentbit_output_errors_total$",
+                "^fluentbit_output_retries_total$",
+                "^fluentbit_output_retries_failed_total$",
+                "^fluentbit_output_dropped_records_total$"
+            ]
+            },
+            {
+            "source_labels": ["job", "InstanceId"],
+            "label_matcher": "^fluent-bit;.+$",
+            "dimensions": [["name", "InstanceId"]],
+            "metric_selectors": [
+                "^fluentbit_input_records_total$",
+                "^fluentbit_input_bytes_total$",
+                "^fluentbit_output_proc_records_total$",
+                "^fluentbit_output_proc_bytes_total$",
+                "^fluentbit_output_errors_total$",
+                "^fluentbit_output_retries_total$",
+                "^fluentbit_output_retries_failed_total$",
+                "^fluentbit_output_dropped_records_total$"
+            ]
+            }
+        ]
+        }
+    }
+    },
     "logs_collected": {
     "files": {
         "collect_list": [
@@ -174,6 +250,8 @@ cat > '/opt/aws/amazon-cloudwatch-agent/etc/amazon-cloudwatch-agent.json' << "EO
 }
 EOF
 
+write_prometheus_config
+
     # Configure the agent to monitor ssh log file
     sudo /opt/aws/amazon-cloudwatch-agent/bin/amazon-cloudwatch-agent-ctl -a fetch-config -m ec2 -c file:${cw_agent_schema} -s
     # Start the CW Agent
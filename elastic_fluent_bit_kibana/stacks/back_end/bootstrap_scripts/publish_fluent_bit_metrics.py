@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Publish the Fluent Bit backlog & output retry metrics used to scale the log
+router fleet. Runs every minute from cron on each router. With
+`--sampling-rate-file`, also adapts the rate the router samples successful
+requests at to the output retries.
+
+version: 22Nov2020
+"""
+
+import argparse
+import json
+import os
+import urllib.request
+
+import boto3
+
+
+METADATA_URL = "http://169.254.169.254/latest"
+
+
+def get_json(url: str, headers: dict = None, timeout: float = 2):
+    req = urllib.request.Request(url, headers=headers or {})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def instance_identity() -> dict:
+    # IMDSv2 first, fall back to IMDSv1
+    headers = {}
+    try:
+        req = urllib.request.Request(
+            f"{METADATA_URL}/api/token",
+            method="PUT",
+            headers={"X-aws-ec2-metadata-token-ttl-seconds": "60"}
+        )
+        with urllib.request.urlopen(req, timeout=2) as resp:
+            headers["X-aws-ec2-metadata-token"] = resp.read().decode("utf-8")
+    except OSError:
+        pass
+    return get_json(f"{METADATA_URL}/dynamic/instance-identity/document", headers)
+
+
+def dimensions_for(identity: dict) -> list:
+    """
+    Routers in an Auto Scaling group publish per group, so scaling policies can
+    use the fleet average. Standalone routers publish per instance.
+    """
+    autoscaling = boto3.client("autoscaling", region_name=identity["region"])
+    try:
+        found = autoscaling.describe_auto_scaling_instances(
+            InstanceIds=[identity["instanceId"]]
+        )["AutoScalingInstances"]
+    except Exception as e:
+        print(f"Unable to look up the Auto Scaling group: {e}")
+        found = []
+    if found:
+        return [{"Name": "AutoScalingGroupName", "Value": found[0]["AutoScalingGroupName"]}]
+    return [{"Name": "InstanceId", "Value": identity["instanceId"]}]
+
+
+def load_state(path: str) -> dict:
+    try:
+        with open(path, encoding="utf-8", mode="r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path: str, state: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, encoding="utf-8", mode="w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def counter_delta(current: int, previous) -> int:
+    # Counters restart from zero with the agent
+    if previous is None or current < previous:
+        return current
+    return current - previous
+
+
+def load_rate(path: str, default: float) -> float:
+    try:
+        with open(path, encoding="utf-8", mode="r") as f:
+            return float(f.readline())
+    except (OSError, ValueError):
+        return default
+
+
+def save_rate(path: str, rate: float):
+    # Replaced in one go, the `lua` filter never reads half a number
+    tmp = f"{path}.tmp"
+    with open(tmp, encoding="utf-8", mode="w") as f:
+        f.write(f"{rate:.4f}\n")
+    os.replace(tmp, path)
+
+
+def next_sampling_rate(rate: float, retries: int, base_rate: float, min_rate: float, retries_threshold: int) -> float:
+    """
+    Halve the rate every minute the outputs retry more than the threshold, win
+    back a tenth of the base rate every quiet minute. Backs off fast while the
+    domain rejects bulk requests, without flooding it again the minute it recovers.
+    """
+    if retries > retries_threshold:
+        rate = rate / 2
+    else:
+        rate = rate + base_rate / 10
+    return round(min(base_rate, max(min_rate, rate)), 4)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoint", default="http://127.0.0.1:2020")
+    parser.add_argument("--namespace", default="MiztiikAutomation/FluentBit")
+    parser.add_argument("--state-file", default="/var/lib/td-agent-bit/metrics-publisher.json")
+    parser.add_argument("--sampling-rate-file", help="Rate file read by the sampling filter, no sampling when unset")
+    parser.add_argument("--sampling-base-rate", type=float, default=1.0)
+    parser.add_argument("--sampling-min-rate", type=float, default=0.05)
+    parser.add_argument("--sampling-retries-threshold", type=int, default=50)
+    args = parser.parse_args()
+
+    metrics = get_json(f"{args.endpoint}/api/v1/metrics")
+    storage = get_json(f"{args.endpoint}/api/v1/storage")
+
+    outputs = metrics.get("output", {}).values()
+    counters = {
+        "OutputRetries": sum(o.get("retries", 0) for o in outputs),
+        "OutputRetriesFailed": sum(o.get("retries_failed", 0) for o in outputs),
+        "OutputDroppedRecords": sum(o.get("dropped_records", 0) for o in outputs),
+    }
+    state = load_state(args.state_file)
+    save_state(args.state_file, counters)
+
+    # Before any AWS call, the rate must keep adapting when CloudWatch is unreachable
+    rate = None
+    if args.sampling_rate_file:
+        rate = next_sampling_rate(
+            load_rate(args.sampling_rate_file, args.sampling_base_rate),
+            counter_delta(counters["OutputRetries"], state.get("OutputRetries")),
+            args.sampling_base_rate,
+            args.sampling_min_rate,
+            args.sampling_retries_threshold
+        )
+        save_rate(args.sampling_rate_file, rate)
+
+    identity = instance_identity()
+    dimensions = dimensions_for(identity)
+    metric_data = [{
+        "MetricName": "BacklogChunks",
+        "Dimensions": dimensions,
+        "Value": storage.get("storage_layer", {}).get("chunks", {}).get("total_chunks", 0),
+        "Unit": "Count",
+    }]
+    for name, value in counters.items():
+        metric_data.append({
+            "MetricName": name,
+            "Dimensions": dimensions,
+            "Value": counter_delta(value, state.get(name)),
+            "Unit": "Count",
+        })
+    if rate is not None:
+        metric_data.append({
+            "MetricName": "SamplingRate",
+            "Dimensions": dimensions,
+            "Value": rate,
+            "Unit": "None",
+        })
+
+    boto3.client("cloudwatch", region_name=identity["region"]).put_metric_data(
+        Namespace=args.namespace,
+        MetricData=metric_data
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 from aws_cdk import aws_iam as _iam
 from aws_cdk import aws_cognito as _cognito
+from aws_cdk import aws_ssm as _ssm
 from aws_cdk import core
 
+from elastic_fluent_bit_kibana.constructs.create_ssm_parameter_construct import CreateSsmStringParameter
+
 
 class GlobalArgs:
     """
@@ -14,6 +17,11 @@ class GlobalArgs:
     SOURCE_INFO = f"https://github.com/miztiik/{REPO_NAME}"
     VERSION = "2020_11_22"
     MIZTIIK_SUPPORT_EMAIL = ["mystique@example.com", ]
+    # Published for the stacks synthesized without this one, see `ImportedCognitoForEs`
+    USER_POOL_ID_PARAM_NAME = "/miztiik-automation/cognito/es-user-pool-id"
+    IDENTITY_POOL_ID_PARAM_NAME = "/miztiik-automation/cognito/es-identity-pool-id"
+    ES_ROLE_ARN_PARAM_NAME = "/miztiik-automation/cognito/es-role-arn"
+    ES_AUTH_ROLE_ARN_PARAM_NAME = "/miztiik-automation/cognito/es-auth-role-arn"
 
 
 class CognitoForEsStack(core.Stack):
@@ -106,6 +114,25 @@ class CognitoForEsStack(core.Stack):
             }
         )
 
+        # Let the Elasticsearch stack import the pools when it is synthesized on its own
+        for param_id, param_name, param_desc, param_value in (
+            ("esUserPoolIdSsmParameter", GlobalArgs.USER_POOL_ID_PARAM_NAME,
+             "Cognito User Pool for Kibana", self.es_user_pool.user_pool_id),
+            ("esIdentityPoolIdSsmParameter", GlobalArgs.IDENTITY_POOL_ID_PARAM_NAME,
+             "Cognito Identity Pool for Kibana", self.es_id_pool.ref),
+            ("esRoleArnSsmParameter", GlobalArgs.ES_ROLE_ARN_PARAM_NAME,
+             "Role ES uses to configure Cognito", self.es_role.role_arn),
+            ("esAuthRoleArnSsmParameter", GlobalArgs.ES_AUTH_ROLE_ARN_PARAM_NAME,
+             "Role of the authenticated Kibana users", self.es_auth_role.role_arn),
+        ):
+            CreateSsmStringParameter(
+                self,
+                param_id,
+                _param_desc=param_desc,
+                _param_name=param_name,
+                _param_value=param_value
+            )
+
         ###########################################
         ################# OUTPUTS #################
         ###########################################
@@ -139,3 +166,32 @@ class CognitoForEsStack(core.Stack):
     @property
     def get_es_auth_role_arn(self):
         return self.es_auth_role.role_arn
+
+
+class ImportedCognitoForEs:
+    """
+    Stand-in for `CognitoForEsStack` when it is not synthesized, reads the
+    SSM parameters the deployed stack published into `scope`
+    """
+
+    def __init__(self, scope: core.Construct):
+        self.scope = scope
+
+    def _param(self, name):
+        return _ssm.StringParameter.value_for_string_parameter(self.scope, name)
+
+    @property
+    def get_es_user_pool_id(self):
+        return self._param(GlobalArgs.USER_POOL_ID_PARAM_NAME)
+
+    @property
+    def get_es_identity_pool_ref(self):
+        return self._param(GlobalArgs.IDENTITY_POOL_ID_PARAM_NAME)
+
+    @property
+    def get_es_role_arn(self):
+        return self._param(GlobalArgs.ES_ROLE_ARN_PARAM_NAME)
+
+    @property
+    def get_es_auth_role_arn(self):
+        return self._param(GlobalArgs.ES_AUTH_ROLE_ARN_PARAM_NAME)
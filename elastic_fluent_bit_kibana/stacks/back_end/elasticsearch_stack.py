@@ -4,7 +4,19 @@ from aws_cdk import aws_ssm as _ssm
 from aws_cdk import aws_elasticsearch as _es
 from aws_cdk import core
 
+from elastic_fluent_bit_kibana.constructs.create_es_admin_custom_resource_construct import CreateEsAdminCustomResource
 from elastic_fluent_bit_kibana.constructs.create_ssm_parameter_construct import CreateSsmStringParameter
+from elastic_fluent_bit_kibana.es_config.domain_sizing import GlobalArgs as SizingArgs
+from elastic_fluent_bit_kibana.es_config.domain_sizing import size_domain
+from elastic_fluent_bit_kibana.es_config.domain_sizing import sizing_report
+from elastic_fluent_bit_kibana.es_config.index_lifecycle import GlobalArgs as LifecycleArgs
+from elastic_fluent_bit_kibana.es_config.index_lifecycle import lifecycle_admin_steps
+from elastic_fluent_bit_kibana.es_config.index_rollups import rollup_admin_steps
+from elastic_fluent_bit_kibana.es_config.index_templates import METRIC_FIELD_MAPPINGS
+from elastic_fluent_bit_kibana.es_config.index_templates import mapping_admin_steps
+from elastic_fluent_bit_kibana.es_config.index_templates import template_admin_steps
+from elastic_fluent_bit_kibana.stacks.back_end.cognito_for_es_stack import ImportedCognitoForEs
+from elastic_fluent_bit_kibana.stacks.back_end.vpc_stack import import_vpc
 
 
 class GlobalArgs:
@@ -18,6 +30,10 @@ class GlobalArgs:
     SOURCE_INFO = f"https://github.com/miztiik/{REPO_NAME}"
     VERSION = "2020_11_22"
     MIZTIIK_SUPPORT_EMAIL = ["mystique@example.com", ]
+    ES_ENDPOINT_PARAM_NAME = "/miztiik-automation/es/endpoint"
+    ES_REGION_PARAM_NAME = "/miztiik-automation/es/region"
+    # Index rollups need Open Distro 1.12, on 7.9 & later
+    ES_VERSION = "7.9"
 
 
 class ElasticSearchStack(core.Stack):
@@ -29,9 +45,44 @@ class ElasticSearchStack(core.Stack):
         cognito_for_es,
         es_domain_name: str,
         stack_log_level: str,
+        index_lifecycle: dict = None,
+        index_template: dict = None,
+        domain_sizing: dict = None,
+        index_rollups: dict = None,
         **kwargs
     ) -> None:
         super().__init__(scope, id, **kwargs)
+        """
+        :param index_lifecycle: Overrides for the rollover & ISM policy, keys
+                                `rollover_min_size`, `rollover_min_index_age`,
+                                `warm_after` & `delete_after`
+        :param index_template: Overrides for the ingest template, keys
+                               `refresh_interval`, `number_of_replicas` & `dynamic`
+        :param vpc: `VpcStack`, imported from SSM when None
+        :param cognito_for_es: `CognitoForEsStack`, imported from SSM when None
+        :param domain_sizing: Declared workload, keys `gb_per_day`, `retention_days`,
+                              `replicas` & `query_load`. Retention & replicas also
+                              set the ISM delete age & the template replicas.
+        :param index_rollups: The `index_rollups` context key. Unless `enabled` is false, hourly
+                              & daily rollup jobs summarise the raw indices, keys `delay_minutes`
+                              & `page_size`
+        """
+        es_vpc = vpc.get_vpc if vpc else import_vpc(self)
+        cognito_for_es = cognito_for_es or ImportedCognitoForEs(self)
+        domain_sizing = domain_sizing or {}
+        index_rollups = index_rollups or {}
+        sizing_plan = size_domain(
+            gb_per_day=domain_sizing.get("gb_per_day", 1),
+            retention_days=domain_sizing.get("retention_days", 7),
+            replicas=domain_sizing.get("replicas", 1),
+            query_load=domain_sizing.get("query_load", "light"),
+            # The errors lane & the request summaries, next to the main index
+            single_shard_indices_per_day=len(LifecycleArgs.WRITE_ALIASES) - 1
+        )
+        print(sizing_report(sizing_plan))
+        es_data_node_count = sizing_plan["instance_count"]
+        index_lifecycle = dict({"delete_after": f"{sizing_plan['retention_days']}d"}, **(index_lifecycle or {}))
+        index_template = dict({"number_of_replicas": sizing_plan["replicas"]}, **(index_template or {}))
 
         # AWS Elasticsearch Domain
         # It is experimental as on Q2 2020
@@ -80,18 +131,18 @@ class ElasticSearchStack(core.Stack):
         self.elastic_security_group = _ec2.SecurityGroup(
             self,
             "elastic_security_group",
-            vpc=vpc.get_vpc,
+            vpc=es_vpc,
             description="elastic security group",
             allow_all_outbound=True,
         )
 
         self.elastic_security_group.connections.allow_from(
-            other=_ec2.Peer.ipv4(vpc.get_vpc.vpc_cidr_block),
+            other=_ec2.Peer.ipv4(es_vpc.vpc_cidr_block),
             port_range=_ec2.Port.tcp(9200),
             description="Allow Incoming FluentBit Traffic"
         )
         self.elastic_security_group.connections.allow_from(
-            other=_ec2.Peer.ipv4(vpc.get_vpc.vpc_cidr_block),
+            other=_ec2.Peer.ipv4(es_vpc.vpc_cidr_block),
             port_range=_ec2.Port.tcp(443),
             description="Allow Kibana Access"
         )
@@ -101,18 +152,23 @@ class ElasticSearchStack(core.Stack):
             self,
             "logSearcher",
             domain_name=f"{es_domain_name}",
-            elasticsearch_cluster_config={
-                # "dedicated_master_count": 1,
-                "dedicated_master_enabled": False,
-                "instanceCount": 2,
-                "instanceType": "t3.small.elasticsearch",
-                "zoneAwarenessEnabled": True,
-                # "zoneAwarenessConfig": {"availability_zone_count": 2},
-            },
-            elasticsearch_version="7.1",
+            elasticsearch_cluster_config=_es.CfnDomain.ElasticsearchClusterConfigProperty(
+                dedicated_master_enabled=sizing_plan["dedicated_master_enabled"],
+                dedicated_master_count=sizing_plan["dedicated_master_count"],
+                dedicated_master_type=sizing_plan["dedicated_master_type"],
+                instance_count=es_data_node_count,
+                instance_type=sizing_plan["instance_type"],
+                zone_awareness_enabled=True,
+                zone_awareness_config=_es.CfnDomain.ZoneAwarenessConfigProperty(
+                    availability_zone_count=SizingArgs.AZ_COUNT
+                )
+            ),
+            elasticsearch_version=GlobalArgs.ES_VERSION,
             ebs_options=_es.CfnDomain.EBSOptionsProperty(
                 ebs_enabled=True,
-                volume_size=10
+                volume_size=sizing_plan["ebs"]["volume_size"],
+                volume_type=sizing_plan["ebs"]["volume_type"],
+                iops=sizing_plan["ebs"].get("iops")
             ),
             # vpc_options={
             #     "securityGroupIds": [self.elastic_security_group.security_group_id],
@@ -126,6 +182,8 @@ class ElasticSearchStack(core.Stack):
                 role_arn=cognito_for_es.get_es_role_arn
             )
         )
+        # Upgrade a domain on an older version in place, keeping its indices, instead of replacing it
+        es_log_search.cfn_options.update_policy = core.CfnUpdatePolicy(enable_version_upgrade=True)
 
         es_log_search.access_policies = {
             "Version": "2012-10-17",
@@ -139,11 +197,47 @@ class ElasticSearchStack(core.Stack):
             ]
         }
 
+        # Ingest tuned mappings, rollover behind a write alias & an ISM policy, applied at deploy time
+        # One primary shard per data node, the errors lane & the summaries are small enough for one
+        es_admin_steps = template_admin_steps(
+            number_of_shards=es_data_node_count,
+            alias=LifecycleArgs.WRITE_ALIAS,
+            **(index_template or {})
+        )
+        es_admin_steps += template_admin_steps(
+            number_of_shards=1,
+            alias=LifecycleArgs.ERROR_WRITE_ALIAS,
+            **(index_template or {})
+        )
+        es_admin_steps += template_admin_steps(
+            number_of_shards=1,
+            alias=LifecycleArgs.METRICS_WRITE_ALIAS,
+            **dict(index_template, field_mappings=METRIC_FIELD_MAPPINGS)
+        )
+        es_admin_steps += lifecycle_admin_steps(**(index_lifecycle or {}))
+        # Fields added since the write indices were created, mapped without waiting for a rollover
+        for alias in (LifecycleArgs.WRITE_ALIAS, LifecycleArgs.ERROR_WRITE_ALIAS):
+            es_admin_steps += mapping_admin_steps(alias, field_mappings=index_template.get("field_mappings"))
+        es_admin_steps += mapping_admin_steps(LifecycleArgs.METRICS_WRITE_ALIAS, field_mappings=METRIC_FIELD_MAPPINGS)
+        # Hourly & daily rollups for long range views
+        if index_rollups.get("enabled", True):
+            es_admin_steps += rollup_admin_steps(
+                LifecycleArgs.WRITE_ALIAS,
+                **{k: v for k, v in index_rollups.items() if k != "enabled"}
+            )
+        es_admin = CreateEsAdminCustomResource(
+            self,
+            "esAdmin",
+            es_endpoint=es_log_search.attr_domain_endpoint,
+            es_domain_arn=es_log_search.attr_arn,
+            steps=es_admin_steps
+        )
+
         es_endpoint_param = CreateSsmStringParameter(
             self,
             "esEndpointSsmParameter",
             _param_desc=f"ElasticSearch Domain Endpoint",
-            _param_name="/miztiik-automation/es/endpoint",
+            _param_name=GlobalArgs.ES_ENDPOINT_PARAM_NAME,
             _param_value=f"{es_log_search.attr_domain_endpoint}"
         )
 
@@ -151,13 +245,15 @@ class ElasticSearchStack(core.Stack):
             self,
             "esRegionSsmParameter",
             _param_desc=f"ElasticSearch Domain Region",
-            _param_name="/miztiik-automation/es/region",
+            _param_name=GlobalArgs.ES_REGION_PARAM_NAME,
             _param_value=f"{core.Aws.REGION}"
         )
 
+        self.es_domain_name = es_domain_name
+
         # Get latest version of Elasticsearch Endpoint & Region Parameter Name
-        self.es_endpoint_param_name = "/miztiik-automation/es/endpoint"
-        self.es_region_param_name = "/miztiik-automation/es/region"
+        self.es_endpoint_param_name = GlobalArgs.ES_ENDPOINT_PARAM_NAME
+        self.es_region_param_name = GlobalArgs.ES_REGION_PARAM_NAME
 
         ###########################################
         ################# OUTPUTS #################
@@ -182,3 +278,15 @@ class ElasticSearchStack(core.Stack):
             value=f"https://{es_log_search.attr_domain_endpoint}/_plugin/kibana/",
             description="Access Kibana via this URL."
         )
+
+
+class ImportedElasticSearch:
+    """
+    Stand-in for `ElasticSearchStack` when it is not synthesized. The routers
+    & aggregators only need the domain name & the names of the SSM parameters.
+    """
+
+    def __init__(self, es_domain_name: str):
+        self.es_domain_name = es_domain_name
+        self.es_endpoint_param_name = GlobalArgs.ES_ENDPOINT_PARAM_NAME
+        self.es_region_param_name = GlobalArgs.ES_REGION_PARAM_NAME
@@ -0,0 +1,337 @@
+from aws_cdk import aws_ec2 as _ec2
+from aws_cdk import aws_elasticloadbalancingv2 as _elbv2
+from aws_cdk import aws_iam as _iam
+from aws_cdk import aws_ssm as _ssm
+from aws_cdk import core
+
+from elastic_fluent_bit_kibana.constructs.create_fluent_bit_dashboard_construct import CreateFluentBitDashboard
+from elastic_fluent_bit_kibana.constructs.create_log_router_fleet_construct import CreateLogRouterFleet
+from elastic_fluent_bit_kibana.constructs.create_ssm_parameter_construct import CreateSsmStringParameter
+from elastic_fluent_bit_kibana.constructs.create_ssm_run_command_document_construct import CreateSsmRunCommandDocument
+from elastic_fluent_bit_kibana.fluent_bit.aggregator_config import GlobalArgs as AggregatorArgs
+from elastic_fluent_bit_kibana.fluent_bit.aggregator_config import build_aggregator_pipeline
+from elastic_fluent_bit_kibana.fluent_bit.bootstrap_script import GlobalArgs as BootstrapArgs
+from elastic_fluent_bit_kibana.fluent_bit.bootstrap_script import build_configure_script
+from elastic_fluent_bit_kibana.fluent_bit.monitoring import GlobalArgs as MonitoringArgs
+from elastic_fluent_bit_kibana.fluent_bit.monitoring import PIPELINE_METRIC_NAMES
+from elastic_fluent_bit_kibana.fluent_bit.monitoring import metrics_publisher_files
+from elastic_fluent_bit_kibana.fluent_bit.router_config import ROUTER_LANES
+from elastic_fluent_bit_kibana.fluent_bit.router_config import lane_alias
+from elastic_fluent_bit_kibana.stacks.back_end.vpc_stack import import_vpc
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    OWNER = "MystiqueAutomation"
+    ENVIRONMENT = "production"
+    REPO_NAME = "elastic-fluent-bit-kibana"
+    SOURCE_INFO = f"https://github.com/miztiik/{REPO_NAME}"
+    VERSION = "2020_11_22"
+    MIZTIIK_SUPPORT_EMAIL = ["mystique@example.com", ]
+    FLEET_TAG_KEY = "LogAggregatorFleet"
+    AGGREGATOR_ENDPOINT_PARAM_NAME = "/miztiik-automation/fluent-bit/aggregator-endpoint"
+    # Configs roll out a batch of instances at a time, too many failures stop the rollout
+    ROLLOUT_MAX_CONCURRENCY = "25%"
+    ROLLOUT_MAX_ERRORS = "10%"
+
+
+class FluentBitAggregatorStack(core.Stack):
+
+    def __init__(
+        self,
+        scope: core.Construct, id: str,
+        vpc,
+        ec2_instance_type: str,
+        es_endpoint_param_name: str,
+        es_region_param_name: str,
+        stack_log_level: str,
+        es_domain_name: str = None,
+        fluent_bit_profile: str = "aggregator",
+        fluent_bit_durable_buffering: bool = True,
+        min_capacity: int = 2,
+        max_capacity: int = 4,
+        backlog_chunks_target: int = 128,
+        retries_scale_out_threshold: int = 100,
+        es_tuning: dict = None,
+        config_rollout: dict = None,
+        **kwargs
+    ) -> None:
+        super().__init__(scope, id, **kwargs)
+        """
+        Aggregator tier: the log routers forward to a pool of Fluent Bit aggregators
+        behind an internal Network Load Balancer. The aggregators coalesce records
+        from every router into large `_bulk` requests to the Elasticsearch domain.
+        :param vpc: VPC of the aggregators, imported from SSM when None
+        :param es_tuning: Bulk tuning of the `es` outputs, the `es_output` context key
+        :param config_rollout: The `config_rollout` context key, `max_concurrency` & `max_errors`
+                               of the association that rolls out the config
+        """
+        vpc = vpc or import_vpc(self)
+        config_rollout = config_rollout or {}
+        fleet_tag = {"key": GlobalArgs.FLEET_TAG_KEY, "value": f"{id}"}
+
+        # Read BootStrap Script), no web app on the aggregators, only the agents
+        try:
+            with open("elastic_fluent_bit_kibana/stacks/back_end/bootstrap_scripts/deploy_aggregator.sh",
+                      encoding="utf-8",
+                      mode="r"
+                      ) as f:
+                user_data = f.read()
+        except OSError as e:
+            print("Unable to read UserData script")
+            raise e
+
+        # Get the latest ami
+        amzn_linux_ami = _ec2.MachineImage.latest_amazon_linux(
+            generation=_ec2.AmazonLinuxGeneration.AMAZON_LINUX_2
+        )
+
+        # ec2 Instance Role
+        _instance_role = _iam.Role(
+            self,
+            "logAggregatorRole",
+            assumed_by=_iam.ServicePrincipal(
+                "ec2.amazonaws.com"),
+            managed_policies=[
+                _iam.ManagedPolicy.from_aws_managed_policy_name(
+                    "AmazonSSMManagedInstanceCore"
+                )
+            ]
+        )
+
+        # Allow CW Agent to create Logs
+        _instance_role.add_to_policy(_iam.PolicyStatement(
+            actions=[
+                "logs:Create*",
+                "logs:PutLogEvents"
+            ],
+            resources=["arn:aws:logs:*:*:*"]
+        ))
+
+        # Allow Access to ElasticSearch Domain
+        _instance_role.add_to_policy(_iam.PolicyStatement(
+            actions=[
+                "es:Describe*",
+                "es:List*",
+                "es:ESHttpPost",
+                "es:ESHttpPut",
+            ],
+            resources=["*"]
+        ))
+
+        # Allow the aggregators to publish Fluent Bit metrics for scaling
+        _instance_role.add_to_policy(_iam.PolicyStatement(
+            actions=[
+                "cloudwatch:PutMetricData",
+                "autoscaling:DescribeAutoScalingInstances"
+            ],
+            resources=["*"]
+        ))
+
+        # NLB keeps the client ip, so allow forward traffic from the whole VPC
+        _aggregator_sg = _ec2.SecurityGroup(
+            self,
+            "logAggregatorSecurityGroup",
+            vpc=vpc,
+            description="Fluent Bit log aggregators",
+            allow_all_outbound=True
+        )
+        _aggregator_sg.add_ingress_rule(
+            peer=_ec2.Peer.ipv4(vpc.vpc_cidr_block),
+            connection=_ec2.Port.tcp(AggregatorArgs.FORWARD_PORT),
+            description="Allow Incoming Fluent Bit forward Traffic"
+        )
+
+        # Internal Network Load Balancer in front of the aggregators
+        self.aggregator_nlb = _elbv2.NetworkLoadBalancer(
+            self,
+            "logAggregatorNlb",
+            vpc=vpc,
+            internet_facing=False,
+            cross_zone_enabled=True,
+            vpc_subnets=_ec2.SubnetSelection(
+                subnet_type=_ec2.SubnetType.PUBLIC
+            )
+        )
+
+        _forward_target_group = _elbv2.NetworkTargetGroup(
+            self,
+            "logAggregatorTargetGroup",
+            vpc=vpc,
+            port=AggregatorArgs.FORWARD_PORT,
+            protocol=_elbv2.Protocol.TCP,
+            target_type=_elbv2.TargetType.INSTANCE,
+            deregistration_delay=core.Duration.seconds(60),
+            health_check=_elbv2.HealthCheck(
+                protocol=_elbv2.Protocol.TCP,
+                interval=core.Duration.seconds(10),
+                healthy_threshold_count=2,
+                unhealthy_threshold_count=2
+            )
+        )
+
+        self.aggregator_nlb.add_listener(
+            "forwardListener",
+            port=AggregatorArgs.FORWARD_PORT,
+            protocol=_elbv2.Protocol.TCP,
+            default_target_groups=[_forward_target_group]
+        )
+
+        # Auto Scaling group of aggregators, scaled on the Fluent Bit backlog & retries
+        self.log_aggregator_fleet = CreateLogRouterFleet(
+            self,
+            "logAggregatorFleet",
+            vpc=vpc,
+            instance_type=f"{ec2_instance_type}",
+            machine_image=amzn_linux_ami,
+            role=_instance_role,
+            security_group=_aggregator_sg,
+            user_data=user_data,
+            fleet_tag=fleet_tag,
+            metric_namespace=MonitoringArgs.METRIC_NAMESPACE,
+            backlog_metric_name=MonitoringArgs.BACKLOG_METRIC,
+            retries_metric_name=MonitoringArgs.RETRIES_METRIC,
+            min_capacity=min_capacity,
+            max_capacity=max_capacity,
+            backlog_chunks_target=backlog_chunks_target,
+            retries_scale_out_threshold=retries_scale_out_threshold,
+            name_tag="fluent_bit_log_aggregator",
+            target_group_arns=[_forward_target_group.target_group_arn]
+        )
+
+        # Let us prepare our FluentBit Configuration Script
+        es_endpoint = _ssm.StringParameter.value_for_string_parameter(
+            self, es_endpoint_param_name
+        )
+        es_region = _ssm.StringParameter.value_for_string_parameter(
+            self, es_region_param_name
+        )
+
+        # Assemble the script from the typed pipeline, rendering validates the config
+        fluent_bit_pipeline = build_aggregator_pipeline(
+            es_endpoint=es_endpoint,
+            es_region=es_region,
+            profile=fluent_bit_profile,
+            durable_buffering=fluent_bit_durable_buffering,
+            es_tuning=es_tuning
+        )
+
+        try:
+            with open("elastic_fluent_bit_kibana/stacks/back_end/bootstrap_scripts/publish_fluent_bit_metrics.py",
+                      encoding="utf-8",
+                      mode="r"
+                      ) as f:
+                metrics_publisher = f.read()
+        except OSError as e:
+            print("Unable to read metrics publisher script")
+            raise e
+
+        bash_commands_to_run = build_configure_script(
+            fluent_bit_pipeline,
+            support_files=metrics_publisher_files(metrics_publisher)
+        )
+
+        # Configure Fluent Bit using SSM Run Commands
+        config_fluenbit_doc = CreateSsmRunCommandDocument(
+            self,
+            "configureFluentBitAggregator",
+            run_document_name="configureFluentBitAggregator",
+            _doc_desc="Bash script to configure FluentBit aggregators to send logs to ES",
+            bash_commands_to_run=bash_commands_to_run,
+            enable_log=False,
+            execution_timeout_seconds=BootstrapArgs.RUN_COMMAND_TIMEOUT_SECONDS
+        )
+
+        # Create SSM Association to trigger SSM doucment to target (EC2)
+        # A batch at a time, the NLB keeps sending to the aggregators not yet reloading
+        _run_commands_on_ec2 = _ssm.CfnAssociation(
+            self,
+            "runCommandsOnAggregators",
+            name=config_fluenbit_doc.get_ssm_linux_document_name,
+            targets=[{
+                "key": f"tag:{fleet_tag['key']}",
+                "values": [fleet_tag["value"]]
+            }],
+            max_concurrency=str(config_rollout.get("max_concurrency", GlobalArgs.ROLLOUT_MAX_CONCURRENCY)),
+            max_errors=str(config_rollout.get("max_errors", GlobalArgs.ROLLOUT_MAX_ERRORS))
+        )
+
+        # Routers find the aggregators through this parameter
+        aggregator_endpoint_param = CreateSsmStringParameter(
+            self,
+            "aggregatorEndpointSsmParameter",
+            _param_desc=f"Fluent Bit Aggregator NLB Endpoint",
+            _param_name=GlobalArgs.AGGREGATOR_ENDPOINT_PARAM_NAME,
+            _param_value=f"{self.aggregator_nlb.load_balancer_dns_name}"
+        )
+        self.aggregator_endpoint_param_name = GlobalArgs.AGGREGATOR_ENDPOINT_PARAM_NAME
+
+        # Pipeline dashboard & alarms, backlog from our publisher, the rest from the CW Agent
+        fluent_bit_dashboard = CreateFluentBitDashboard(
+            self,
+            "fluentBitDashboard",
+            dashboard_name=f"{id}-pipeline",
+            metric_namespace=MonitoringArgs.METRIC_NAMESPACE,
+            tier_dimensions={"AutoScalingGroupName": self.log_aggregator_fleet.get_asg_name},
+            input_aliases=[AggregatorArgs.INPUT_ALIAS],
+            output_aliases={lane: lane_alias(AggregatorArgs.ES_OUTPUT_ALIAS, lane) for lane in ROUTER_LANES},
+            metric_names=PIPELINE_METRIC_NAMES,
+            es_domain_name=es_domain_name
+        )
+
+        ###########################################
+        ################# OUTPUTS #################
+        ###########################################
+        output_0 = core.CfnOutput(
+            self,
+            "AutomationFrom",
+            value=f"{GlobalArgs.SOURCE_INFO}",
+            description="To know more about this automation stack, check out our github page."
+        )
+        output_1 = core.CfnOutput(
+            self,
+            "LogAggregatorEndpoint",
+            value=f"{self.aggregator_nlb.load_balancer_dns_name}:{AggregatorArgs.FORWARD_PORT}",
+            description=f"Internal NLB, Fluent Bit forward endpoint of the aggregators"
+        )
+        output_2 = core.CfnOutput(
+            self,
+            "LogAggregatorFleet",
+            value=(
+                f"https://console.aws.amazon.com/ec2autoscaling/home?region="
+                f"{core.Aws.REGION}"
+                f"#/details/"
+                f"{self.log_aggregator_fleet.get_asg_name}"
+            ),
+            description=f"Auto Scaling group of Fluent Bit log aggregators"
+        )
+        output_3 = core.CfnOutput(
+            self,
+            "FluentBitDashboard",
+            value=(
+                f"https://console.aws.amazon.com/cloudwatch/home?region="
+                f"{core.Aws.REGION}"
+                f"#dashboards:name="
+                f"{fluent_bit_dashboard.get_dashboard_name}"
+            ),
+            description=f"Fluent Bit records in/out, retries & backlog next to the domain write thread pool"
+        )
+
+    # properties to share with other stacks
+    @property
+    def get_aggregator_endpoint_param_name(self):
+        return self.aggregator_endpoint_param_name
+
+
+class ImportedFluentBitAggregator:
+    """
+    Stand-in for `FluentBitAggregatorStack` when it is not synthesized, the
+    routers find the deployed NLB through its SSM parameter
+    """
+
+    @property
+    def get_aggregator_endpoint_param_name(self):
+        return GlobalArgs.AGGREGATOR_ENDPOINT_PARAM_NAME
@@ -0,0 +1,206 @@
+from aws_cdk import aws_ec2 as _ec2
+from aws_cdk import aws_iam as _iam
+from aws_cdk import aws_imagebuilder as _imagebuilder
+from aws_cdk import core
+
+from elastic_fluent_bit_kibana.constructs.create_ssm_parameter_construct import CreateSsmStringParameter
+from elastic_fluent_bit_kibana.fluent_bit.ami_components import component_document
+from elastic_fluent_bit_kibana.fluent_bit.ami_components import content_version
+from elastic_fluent_bit_kibana.fluent_bit.bootstrap_script import GlobalArgs as BootstrapArgs
+from elastic_fluent_bit_kibana.fluent_bit.bootstrap_script import build_bake_script
+from elastic_fluent_bit_kibana.stacks.back_end.vpc_stack import import_vpc
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    OWNER = "MystiqueAutomation"
+    ENVIRONMENT = "production"
+    REPO_NAME = "elastic-fluent-bit-kibana"
+    SOURCE_INFO = f"https://github.com/miztiik/{REPO_NAME}"
+    VERSION = "2020_11_22"
+    MIZTIIK_SUPPORT_EMAIL = ["mystique@example.com", ]
+    ROUTER_AMI_PARAM_NAME = "/miztiik-automation/fluent-bit/router-ami-id"
+    # Image Builder resolves `x.x.x` to the latest Amazon Linux 2 when baking
+    PARENT_IMAGE = "amazon-linux-2-x86/x.x.x"
+    BUILD_TIMEOUT_MINUTES = 60
+
+
+class FluentBitAmiStack(core.Stack):
+
+    def __init__(
+        self,
+        scope: core.Construct, id: str,
+        vpc,
+        stack_log_level: str,
+        instance_type: str = "t3.small",
+        revision: int = 1,
+        **kwargs
+    ) -> None:
+        super().__init__(scope, id, **kwargs)
+        """
+        Bakes the router AMI with EC2 Image Builder: Fluent Bit, the CloudWatch
+        agent & the packages `deploy_app.sh` installs at boot. Routers launched
+        from it only start the agents & wait for the SSM association to
+        activate their config, instead of running yum for minutes.
+        :param vpc: VPC to bake in, its public subnets reach the package repos.
+                    Imported from SSM when None
+        :param revision: Bump to rebake on the latest Amazon Linux 2 without a script change
+        """
+        vpc = vpc or import_vpc(self)
+
+        # Read BootStrap Script):
+        try:
+            with open("elastic_fluent_bit_kibana/stacks/back_end/bootstrap_scripts/deploy_app.sh",
+                      encoding="utf-8",
+                      mode="r"
+                      ) as f:
+                deploy_app = f.read()
+        except OSError as e:
+            print("Unable to read UserData script")
+            raise e
+
+        bake_fluent_bit = build_bake_script()
+        validate_agents = (
+            f"test -x {BootstrapArgs.FLUENT_BIT_BIN}\n"
+            f"systemctl is-enabled {BootstrapArgs.FLUENT_BIT_SERVICE}\n"
+            "rpm -q amazon-cloudwatch-agent httpd jq\n"
+        )
+
+        router_packages_doc = component_document(
+            name="miztiik-router-packages",
+            description="Packages & CloudWatch agent of the log routers",
+            phases={"build": [("InstallRouterPackages", deploy_app)]}
+        )
+        fluent_bit_doc = component_document(
+            name="miztiik-fluent-bit",
+            description="Fluent Bit agent of the log routers",
+            phases={
+                "build": [("InstallFluentBit", bake_fluent_bit)],
+                "validate": [("ValidateAgents", validate_agents)],
+            }
+        )
+
+        router_packages_component = _imagebuilder.CfnComponent(
+            self,
+            "routerPackagesComponent",
+            name=f"{id}-router-packages",
+            platform="Linux",
+            version=content_version(router_packages_doc),
+            data=router_packages_doc,
+            description="Miztiik Automation: Log router packages & CloudWatch agent"
+        )
+        fluent_bit_component = _imagebuilder.CfnComponent(
+            self,
+            "fluentBitComponent",
+            name=f"{id}-fluent-bit",
+            platform="Linux",
+            version=content_version(fluent_bit_doc),
+            data=fluent_bit_doc,
+            description="Miztiik Automation: Fluent Bit agent"
+        )
+
+        # A recipe version can not be reused, derive it from everything it bakes
+        router_recipe = _imagebuilder.CfnImageRecipe(
+            self,
+            "routerImageRecipe",
+            name=f"{id}-router",
+            version=content_version(router_packages_doc, fluent_bit_doc, f"{revision}"),
+            parent_image=f"arn:{core.Aws.PARTITION}:imagebuilder:{core.Aws.REGION}:aws:image/{GlobalArgs.PARENT_IMAGE}",
+            components=[
+                _imagebuilder.CfnImageRecipe.ComponentConfigurationProperty(
+                    component_arn=router_packages_component.attr_arn
+                ),
+                _imagebuilder.CfnImageRecipe.ComponentConfigurationProperty(
+                    component_arn=fluent_bit_component.attr_arn
+                ),
+            ],
+            description="Miztiik Automation: Fluent Bit log router"
+        )
+
+        # Image Builder instance Role
+        _builder_role = _iam.Role(
+            self,
+            "imageBuilderRole",
+            assumed_by=_iam.ServicePrincipal(
+                "ec2.amazonaws.com"),
+            managed_policies=[
+                _iam.ManagedPolicy.from_aws_managed_policy_name(
+                    "AmazonSSMManagedInstanceCore"
+                ),
+                _iam.ManagedPolicy.from_aws_managed_policy_name(
+                    "EC2InstanceProfileForImageBuilder"
+                )
+            ]
+        )
+        _builder_instance_profile = _iam.CfnInstanceProfile(
+            self,
+            "imageBuilderInstanceProfile",
+            roles=[_builder_role.role_name]
+        )
+
+        # No NAT Gateway in our VPC, bake in a public subnet
+        _builder_sg = _ec2.SecurityGroup(
+            self,
+            "imageBuilderSecurityGroup",
+            vpc=vpc,
+            description="EC2 Image Builder instances baking the router AMI",
+            allow_all_outbound=True
+        )
+
+        builder_infra = _imagebuilder.CfnInfrastructureConfiguration(
+            self,
+            "routerImageInfrastructure",
+            name=f"{id}-router",
+            instance_profile_name=_builder_instance_profile.ref,
+            instance_types=[f"{instance_type}"],
+            subnet_id=vpc.public_subnets[0].subnet_id,
+            security_group_ids=[_builder_sg.security_group_id],
+            terminate_instance_on_failure=True,
+            description="Miztiik Automation: Instances baking the router AMI"
+        )
+
+        # Built while the stack deploys, the AMI is ready when the stack is
+        router_image = _imagebuilder.CfnImage(
+            self,
+            "routerImage",
+            image_recipe_arn=router_recipe.attr_arn,
+            infrastructure_configuration_arn=builder_infra.attr_arn,
+            image_tests_configuration=_imagebuilder.CfnImage.ImageTestsConfigurationProperty(
+                image_tests_enabled=True,
+                timeout_minutes=GlobalArgs.BUILD_TIMEOUT_MINUTES
+            )
+        )
+
+        # The router stack launches from the AMI in this parameter
+        CreateSsmStringParameter(
+            self,
+            "routerAmiSsmParameter",
+            _param_desc="Pre-baked Fluent Bit log router AMI",
+            _param_name=GlobalArgs.ROUTER_AMI_PARAM_NAME,
+            _param_value=router_image.attr_image_id
+        )
+
+        ###########################################
+        ################# OUTPUTS #################
+        ###########################################
+        output_0 = core.CfnOutput(
+            self,
+            "AutomationFrom",
+            value=f"{GlobalArgs.SOURCE_INFO}",
+            description="To know more about this automation stack, check out our github page."
+        )
+
+        output_1 = core.CfnOutput(
+            self,
+            "RouterAmiId",
+            value=f"{router_image.attr_image_id}",
+            description="Pre-baked Fluent Bit log router AMI"
+        )
+
+    # properties to share with other stacks
+    @property
+    def get_router_ami_param_name(self):
+        return GlobalArgs.ROUTER_AMI_PARAM_NAME
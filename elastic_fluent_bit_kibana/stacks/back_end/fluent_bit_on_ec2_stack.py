@@ -1,9 +1,29 @@
+from aws_cdk import aws_cloudwatch as _cloudwatch
 from aws_cdk import aws_ec2 as _ec2
 from aws_cdk import aws_iam as _iam
 from aws_cdk import aws_ssm as _ssm
 from aws_cdk import core
 
+from elastic_fluent_bit_kibana.constructs.create_firehose_to_es_construct import CreateFirehoseToEs
+from elastic_fluent_bit_kibana.constructs.create_fluent_bit_dashboard_construct import CreateFluentBitDashboard
+from elastic_fluent_bit_kibana.constructs.create_ingest_canary_probe_construct import CreateIngestCanaryProbe
+from elastic_fluent_bit_kibana.constructs.create_log_archive_construct import CreateLogArchive
+from elastic_fluent_bit_kibana.constructs.create_log_router_fleet_construct import CreateLogRouterFleet
 from elastic_fluent_bit_kibana.constructs.create_ssm_run_command_document_construct import CreateSsmRunCommandDocument
+from elastic_fluent_bit_kibana.fluent_bit.bootstrap_script import GlobalArgs as BootstrapArgs
+from elastic_fluent_bit_kibana.fluent_bit.bootstrap_script import build_configure_script
+from elastic_fluent_bit_kibana.fluent_bit.canary import GlobalArgs as CanaryArgs
+from elastic_fluent_bit_kibana.fluent_bit.canary import canary_emitter_files
+from elastic_fluent_bit_kibana.fluent_bit.monitoring import GlobalArgs as MonitoringArgs
+from elastic_fluent_bit_kibana.fluent_bit.monitoring import PIPELINE_METRIC_NAMES
+from elastic_fluent_bit_kibana.fluent_bit.monitoring import metrics_publisher_files
+from elastic_fluent_bit_kibana.fluent_bit.router_config import GlobalArgs as RouterArgs
+from elastic_fluent_bit_kibana.fluent_bit.router_config import ROUTER_LANES
+from elastic_fluent_bit_kibana.fluent_bit.router_config import build_router_pipeline
+from elastic_fluent_bit_kibana.fluent_bit.router_config import lane_alias
+from elastic_fluent_bit_kibana.fluent_bit.router_config import rendered_lanes
+from elastic_fluent_bit_kibana.stacks.back_end.vpc_stack import import_vpc
+from elastic_fluent_bit_kibana.log_archive.archive_schema import GlobalArgs as ArchiveArgs
 
 
 class GlobalArgs:
@@ -17,6 +37,13 @@ class GlobalArgs:
     SOURCE_INFO = f"https://github.com/miztiik/{REPO_NAME}"
     VERSION = "2020_11_22"
     MIZTIIK_SUPPORT_EMAIL = ["mystique@example.com", ]
+    FLEET_TAG_KEY = "LogRouterFleet"
+    # `direct`, routers write to ES or to the aggregators. `firehose`, routers
+    # write to a Kinesis Data Firehose delivery stream per lane.
+    DELIVERY_MODES = ("direct", "firehose")
+    # Configs roll out a batch of instances at a time, too many failures stop the rollout
+    ROLLOUT_MAX_CONCURRENCY = "25%"
+    ROLLOUT_MAX_ERRORS = "10%"
 
 
 class FluentBitOnEc2Stack(core.Stack):
@@ -29,13 +56,68 @@ class FluentBitOnEc2Stack(core.Stack):
         es_endpoint_param_name: str,
         es_region_param_name: str,
         stack_log_level: str,
+        es_domain_name: str = None,
+        fluent_bit_profile: str = "default",
+        fluent_bit_durable_buffering: bool = True,
+        router_fleet: dict = None,
+        aggregator_endpoint_param_name: str = None,
+        ingest_canary: bool = False,
+        es_tuning: dict = None,
+        delivery: dict = None,
+        log_archive: dict = None,
+        config_rollout: dict = None,
+        router_ami_param_name: str = None,
+        multiline: dict = None,
+        sampling: dict = None,
+        log_metrics: dict = None,
         **kwargs
     ) -> None:
         super().__init__(scope, id, **kwargs)
-
-        # Read BootStrap Script):
+        """
+        :param vpc: VPC of the routers, imported from SSM when None
+        :param router_fleet: Run the routers in an Auto Scaling group, when `enabled`.
+                             Optional keys `min_capacity`, `max_capacity`,
+                             `backlog_chunks_target` & `retries_scale_out_threshold`
+        :param aggregator_endpoint_param_name: SSM parameter with the aggregator NLB dns name.
+                                               When set, routers forward to the aggregators
+                                               instead of writing to ES.
+        :param ingest_canary: Emit a marker a minute on every router & measure how long
+                              it takes to become searchable
+        :param es_tuning: Bulk tuning of the `es` output, the `es_output` context key.
+                          Left to the aggregators when the routers forward to them.
+        :param delivery: The `delivery` context key. `mode` is `direct` or `firehose`,
+                         `backup_retention_days` keeps the documents Firehose could not
+                         deliver in S3 that long.
+        :param log_archive: The `log_archive` context key. When `enabled`, every lane also
+                            goes to S3 as Parquet, keys `buffer_seconds`, `buffer_mb`
+                            & `retention_days`.
+        :param config_rollout: The `config_rollout` context key, `max_concurrency` & `max_errors`
+                               of the association that rolls out the config
+        :param router_ami_param_name: SSM parameter with the pre-baked router AMI. When set,
+                                      routers launch from it & skip the package installs.
+        :param multiline: The `multiline` context key, how the `app` lane folds stack traces
+        :param sampling: The `sampling` context key, how the `access` lane samples successful
+                         requests & how fast the rate tightens as the output retries climb
+        :param log_metrics: The `log_metrics` context key, the request summaries the `metrics`
+                            lane ships to their own index
+        """
+        vpc = vpc or import_vpc(self)
+        router_fleet = router_fleet or {}
+        delivery = delivery or {}
+        log_archive = log_archive or {}
+        config_rollout = config_rollout or {}
+        sampling = sampling or {}
+        delivery_mode = delivery.get("mode", "direct")
+        if delivery_mode not in GlobalArgs.DELIVERY_MODES:
+            raise ValueError(f"delivery mode '{delivery_mode}' must be one of {GlobalArgs.DELIVERY_MODES}")
+        if delivery_mode == "firehose" and aggregator_endpoint_param_name:
+            raise ValueError("delivery mode 'firehose' replaces the aggregator tier, disable log_aggregator")
+        fleet_tag = {"key": GlobalArgs.FLEET_TAG_KEY, "value": f"{id}"}
+
+        # Read BootStrap Script), the baked AMI already ran `deploy_app.sh`
+        boot_script = "boot_baked_router.sh" if router_ami_param_name else "deploy_app.sh"
         try:
-            with open("elastic_fluent_bit_kibana/stacks/back_end/bootstrap_scripts/deploy_app.sh",
+            with open(f"elastic_fluent_bit_kibana/stacks/back_end/bootstrap_scripts/{boot_script}",
                       encoding="utf-8",
                       mode="r"
                       ) as f:
@@ -44,14 +126,16 @@ class FluentBitOnEc2Stack(core.Stack):
             print("Unable to read UserData script")
             raise e
 
-        # Get the latest AMI from AWS SSM
-        linux_ami = _ec2.AmazonLinuxImage(
-            generation=_ec2.AmazonLinuxGeneration.AMAZON_LINUX_2)
-
         # Get the latest ami
         amzn_linux_ami = _ec2.MachineImage.latest_amazon_linux(
             generation=_ec2.AmazonLinuxGeneration.AMAZON_LINUX_2
         )
+        if router_ami_param_name:
+            # Fluent Bit, the CW Agent & the packages are baked in, see `FluentBitAmiStack`
+            amzn_linux_ami = _ec2.MachineImage.from_ssm_parameter(
+                router_ami_param_name,
+                _ec2.OperatingSystemType.LINUX
+            )
         # ec2 Instance Role
         _instance_role = _iam.Role(
             self,
@@ -86,35 +170,76 @@ class FluentBitOnEc2Stack(core.Stack):
             resources=["*"]
         ))
 
-        # fluent_bit_server Instance
-        self.fluent_bit_server = _ec2.Instance(
+        # Allow the routers to publish Fluent Bit metrics for scaling
+        _instance_role.add_to_policy(_iam.PolicyStatement(
+            actions=[
+                "cloudwatch:PutMetricData",
+                "autoscaling:DescribeAutoScalingInstances"
+            ],
+            resources=["*"]
+        ))
+
+        # Allow Web Traffic to the routers, same rules in both modes
+        _router_sg = _ec2.SecurityGroup(
             self,
-            "fluentBitLogRouter",
-            instance_type=_ec2.InstanceType(
-                instance_type_identifier=f"{ec2_instance_type}"),
-            instance_name="fluent_bit_log_router_01",
-            machine_image=amzn_linux_ami,
+            "logRouterSecurityGroup",
             vpc=vpc,
-            vpc_subnets=_ec2.SubnetSelection(
-                subnet_type=_ec2.SubnetType.PUBLIC
-            ),
-            role=_instance_role,
-            user_data=_ec2.UserData.custom(
-                user_data)
+            description="Fluent Bit log routers",
+            allow_all_outbound=True
         )
-
-        # Allow Web Traffic to WebServer
-        self.fluent_bit_server.connections.allow_from_any_ipv4(
-            _ec2.Port.tcp(80),
+        _router_sg.add_ingress_rule(
+            peer=_ec2.Peer.any_ipv4(),
+            connection=_ec2.Port.tcp(80),
             description="Allow Incoming HTTP Traffic"
         )
-
-        self.fluent_bit_server.connections.allow_from(
-            other=_ec2.Peer.ipv4(vpc.vpc_cidr_block),
-            port_range=_ec2.Port.tcp(443),
+        _router_sg.add_ingress_rule(
+            peer=_ec2.Peer.ipv4(vpc.vpc_cidr_block),
+            connection=_ec2.Port.tcp(443),
             description="Allow Incoming FluentBit Traffic"
         )
 
+        self.fluent_bit_server = None
+        self.log_router_fleet = None
+        if router_fleet.get("enabled"):
+            # Auto Scaling group of routers, scaled on the Fluent Bit backlog & retries
+            self.log_router_fleet = CreateLogRouterFleet(
+                self,
+                "logRouterFleet",
+                vpc=vpc,
+                instance_type=f"{ec2_instance_type}",
+                machine_image=amzn_linux_ami,
+                role=_instance_role,
+                security_group=_router_sg,
+                user_data=user_data,
+                fleet_tag=fleet_tag,
+                metric_namespace=MonitoringArgs.METRIC_NAMESPACE,
+                backlog_metric_name=MonitoringArgs.BACKLOG_METRIC,
+                retries_metric_name=MonitoringArgs.RETRIES_METRIC,
+                min_capacity=int(router_fleet.get("min_capacity", 1)),
+                max_capacity=int(router_fleet.get("max_capacity", 4)),
+                backlog_chunks_target=int(router_fleet.get("backlog_chunks_target", 64)),
+                retries_scale_out_threshold=int(router_fleet.get("retries_scale_out_threshold", 100))
+            )
+        else:
+            # fluent_bit_server Instance
+            self.fluent_bit_server = _ec2.Instance(
+                self,
+                "fluentBitLogRouter",
+                instance_type=_ec2.InstanceType(
+                    instance_type_identifier=f"{ec2_instance_type}"),
+                instance_name="fluent_bit_log_router_01",
+                machine_image=amzn_linux_ami,
+                vpc=vpc,
+                vpc_subnets=_ec2.SubnetSelection(
+                    subnet_type=_ec2.SubnetType.PUBLIC
+                ),
+                role=_instance_role,
+                security_group=_router_sg,
+                user_data=_ec2.UserData.custom(
+                    user_data)
+            )
+            core.Tags.of(self.fluent_bit_server).add(fleet_tag["key"], fleet_tag["value"])
+
         # Allow CW Agent to create Logs
         _instance_role.add_to_policy(_iam.PolicyStatement(
             actions=[
@@ -125,126 +250,104 @@ class FluentBitOnEc2Stack(core.Stack):
         ))
 
         # Let us prepare our FluentBit Configuration Script
+        es_endpoint = _ssm.StringParameter.value_for_string_parameter(
+            self, es_endpoint_param_name
+        )
+        es_region = _ssm.StringParameter.value_for_string_parameter(
+            self, es_region_param_name
+        )
+
+        forward_to = None
+        if aggregator_endpoint_param_name:
+            forward_to = {
+                "host": _ssm.StringParameter.value_for_string_parameter(
+                    self, aggregator_endpoint_param_name
+                )
+            }
+
+        # Streams, widgets & alarms only for the lanes the routers run
+        router_lanes = rendered_lanes(log_metrics=log_metrics)
+
+        # Firehose buffers, retries & delivers to the domain, away from the routers
+        self.firehose_to_es = None
+        firehose_to = None
+        if delivery_mode == "firehose":
+            self.firehose_to_es = CreateFirehoseToEs(
+                self,
+                "firehoseToEs",
+                es_domain_name=es_domain_name,
+                streams={
+                    lane: dict(ROUTER_LANES[lane]["firehose"], index=ROUTER_LANES[lane]["index"])
+                    for lane in router_lanes
+                },
+                backup_retention_days=int(delivery.get("backup_retention_days", 14))
+            )
+            _instance_role.add_to_policy(_iam.PolicyStatement(
+                actions=[
+                    "firehose:PutRecordBatch",
+                ],
+                resources=self.firehose_to_es.stream_arns
+            ))
+            firehose_to = {"region": core.Aws.REGION, "streams": self.firehose_to_es.stream_names}
+
+        # Long range history in S3 as Parquet, queryable with Athena outside the domain
+        self.log_archive = None
+        archive_to = None
+        if log_archive.get("enabled"):
+            self.log_archive = CreateLogArchive(
+                self,
+                "logArchive",
+                lanes=[lane for lane in router_lanes if ROUTER_LANES[lane].get("archive", True)],
+                buffer_seconds=int(log_archive.get("buffer_seconds", 900)),
+                buffer_mb=int(log_archive.get("buffer_mb", 128)),
+                retention_days=int(log_archive.get("retention_days", 365))
+            )
+            _instance_role.add_to_policy(_iam.PolicyStatement(
+                actions=[
+                    "firehose:PutRecordBatch",
+                ],
+                resources=self.log_archive.stream_arns
+            ))
+            archive_to = {"region": core.Aws.REGION, "streams": self.log_archive.stream_names}
+
+        # Assemble the script from the typed pipeline, rendering validates the config
+        fluent_bit_pipeline = build_router_pipeline(
+            es_endpoint=es_endpoint,
+            es_region=es_region,
+            profile=fluent_bit_profile,
+            durable_buffering=fluent_bit_durable_buffering,
+            forward_to=forward_to,
+            es_tuning=None if forward_to or firehose_to else es_tuning,
+            firehose_to=firehose_to,
+            archive_to=archive_to,
+            multiline=multiline,
+            sampling=sampling,
+            log_metrics=log_metrics
+        )
 
-        # Use the script below, if you have a pre-written script, if not use the parts below to ASSEMBLE the script
-        # Read BootStrap Script):
+        # Publish the backlog & retry metrics every minute, the fleet scales on them
         try:
-            with open("elastic_fluent_bit_kibana/stacks/back_end/bootstrap_scripts/configure_fluent_bit.sh",
+            with open("elastic_fluent_bit_kibana/stacks/back_end/bootstrap_scripts/publish_fluent_bit_metrics.py",
                       encoding="utf-8",
                       mode="r"
                       ) as f:
-                bash_commands_to_run = f.read()
+                metrics_publisher = f.read()
         except OSError as e:
-            print("Unable to read bash commands file")
+            print("Unable to read metrics publisher script")
             raise e
 
-        es_endpoint = _ssm.StringParameter.value_for_string_parameter(
-            self, es_endpoint_param_name
+        # The publisher also adapts the sampling rate to the output retries
+        support_files = metrics_publisher_files(
+            metrics_publisher,
+            sampling=sampling if sampling.get("enabled", True) else None
         )
-        es_region = _ssm.StringParameter.value_for_string_parameter(
-            self, es_region_param_name
+        if ingest_canary:
+            support_files += canary_emitter_files()
+        bash_commands_to_run = build_configure_script(
+            fluent_bit_pipeline,
+            support_files=support_files
         )
 
-        bash_commands_to_run_01 = """
-#!/bin/bash
-set -ex
-set -o pipefail
-
-# version: 22Nov2020
-
-##################################################
-#############     SET GLOBALS     ################
-##################################################
-
-REPO_NAME="elastic-fluent-bit-kibana"
-
-GIT_REPO_URL="https://github.com/miztiik/$REPO_NAME.git"
-
-APP_DIR="/var/$REPO_NAME"
-
-LOG_FILE="/var/log/miztiik-automation-configure-fluent-bit.log"
-
-function install_fluent_bit(){
-# https://docs.fluentbit.io/manual/installation/linux/amazon-linux
-cat > '/etc/yum.repos.d/td-agent-bit.repo' << "EOF"
-[td-agent-bit]
-name = TD Agent Bit
-baseurl = https://packages.fluentbit.io/amazonlinux/2/$basearch/
-gpgcheck=1
-gpgkey=https://packages.fluentbit.io/fluentbit.key
-enabled=1
-EOF
-
-# Install the agent
-sudo yum -y install td-agent-bit
-sudo service td-agent-bit start
-service td-agent-bit status
-}
-
-function create_config_files(){
-    mkdir -p ${APP_DIR}
-    cd ${APP_DIR}
-
-echo "
-[INPUT]
-    name            tail
-    path            /var/log/httpd/*log
-    tag             automate_log_parse
-    Path_Key        filename
-[FILTER]
-    Name    record_modifier
-    Match   *
-    Record  hostname    ${HOSTNAME}
-    Record  project     elastic-fluent-bit-kibana-demo
-    Add     user        Mystique
-" > ${APP_DIR}/es.conf
-"""
-
-        bash_commands_to_run_02 = f"""
-echo "
-[OUTPUT]
-    Name            es
-    Match           automate_log*
-    Host            {es_endpoint}
-    Port            443
-    tls             On
-    AWS_Auth        On
-    AWS_Region      {es_region}
-    Index           miztiik_automation
-    Type            app_logs
-    Include_Tag_Key On
-" >> ${{APP_DIR}}/es.conf
-}}
-        """
-
-        bash_commands_to_run_03 = """
-
-function configure_fluent_bit(){
-# Stop the agent
-sudo service td-agent-bit stop
-
-# DO NOT DO THIS IN ANY SERIOUS CONFIG FILE
-# Null the defaults and start fresh
-> /etc/td-agent-bit/td-agent-bit.conf
-
-echo "
-[SERVICE]
-    Flush 3
-@INCLUDE ${APP_DIR}/es.conf
-" > /etc/td-agent-bit/td-agent-bit.conf
-
-sudo service td-agent-bit start
-sudo service td-agent-bit status
-}
-
-install_fluent_bit >> "${LOG_FILE}"
-create_config_files >> "${LOG_FILE}"
-configure_fluent_bit >> "${LOG_FILE}"
-"""
-
-        bash_commands_to_run = bash_commands_to_run_01 + \
-            bash_commands_to_run_02 + bash_commands_to_run_03
-
         # Configure Fluent Bit using SSM Run Commands
         config_fluenbit_doc = CreateSsmRunCommandDocument(
             self,
@@ -252,20 +355,195 @@ configure_fluent_bit >> "${LOG_FILE}"
             run_document_name="configureFluentBitToEs",
             _doc_desc="Bash script to configure FluentBit to send logs to ES",
             bash_commands_to_run=bash_commands_to_run,
-            enable_log=False
+            enable_log=False,
+            execution_timeout_seconds=BootstrapArgs.RUN_COMMAND_TIMEOUT_SECONDS
         )
 
         # Create SSM Association to trigger SSM doucment to target (EC2)
+        # Target by tag, so routers launched by scaling out get configured too.
+        # Rolled out a batch at a time, a failing config stops at `max_errors`
         _run_commands_on_ec2 = _ssm.CfnAssociation(
             self,
             "runCommandsOnEc2",
             name=config_fluenbit_doc.get_ssm_linux_document_name,
             targets=[{
-                "key": "InstanceIds",
-                "values": [self.fluent_bit_server.instance_id]
-            }]
+                "key": f"tag:{fleet_tag['key']}",
+                "values": [fleet_tag["value"]]
+            }],
+            max_concurrency=str(config_rollout.get("max_concurrency", GlobalArgs.ROLLOUT_MAX_CONCURRENCY)),
+            max_errors=str(config_rollout.get("max_errors", GlobalArgs.ROLLOUT_MAX_ERRORS))
         )
 
+        # Pipeline dashboard & alarms, backlog from our publisher, the rest from the CW Agent
+        if self.log_router_fleet:
+            tier_dimensions = {"AutoScalingGroupName": self.log_router_fleet.get_asg_name}
+        else:
+            tier_dimensions = {"InstanceId": self.fluent_bit_server.instance_id}
+        if firehose_to:
+            output_alias_prefix = RouterArgs.FIREHOSE_OUTPUT_ALIAS
+        elif forward_to:
+            output_alias_prefix = RouterArgs.FORWARD_OUTPUT_ALIAS
+        else:
+            output_alias_prefix = RouterArgs.ES_OUTPUT_ALIAS
+        fluent_bit_dashboard = CreateFluentBitDashboard(
+            self,
+            "fluentBitDashboard",
+            dashboard_name=f"{id}-pipeline",
+            metric_namespace=MonitoringArgs.METRIC_NAMESPACE,
+            tier_dimensions=tier_dimensions,
+            input_aliases=[lane_alias(RouterArgs.INPUT_ALIAS, lane) for lane in router_lanes],
+            output_aliases={
+                lane: lane_alias(output_alias_prefix, lane)
+                for lane in router_lanes
+            },
+            metric_names=PIPELINE_METRIC_NAMES,
+            # With the aggregator tier, the aggregators talk to the domain
+            es_domain_name=None if forward_to else es_domain_name
+        )
+
+        if self.firehose_to_es:
+            fluent_bit_dashboard.dashboard.add_widgets(
+                _cloudwatch.GraphWidget(
+                    title="Firehose delivery to ES, records",
+                    left=[
+                        _cloudwatch.Metric(
+                            namespace="AWS/Firehose",
+                            metric_name=metric_name,
+                            dimensions={"DeliveryStreamName": stream_name},
+                            statistic="Sum",
+                            label=f"{lane} {label}",
+                            period=core.Duration.minutes(1)
+                        )
+                        for lane, stream_name in self.firehose_to_es.stream_names.items()
+                        for metric_name, label in (
+                            ("IncomingRecords", "incoming"),
+                            ("DeliveryToElasticsearch.Records", "delivered"),
+                        )
+                    ],
+                    width=12
+                ),
+                _cloudwatch.GraphWidget(
+                    title="Firehose delivery to ES, success & freshness",
+                    left=[
+                        _cloudwatch.Metric(
+                            namespace="AWS/Firehose",
+                            metric_name="DeliveryToElasticsearch.Success",
+                            dimensions={"DeliveryStreamName": stream_name},
+                            statistic="Average",
+                            label=f"{lane} success ratio",
+                            period=core.Duration.minutes(1)
+                        ) for lane, stream_name in self.firehose_to_es.stream_names.items()
+                    ],
+                    right=[
+                        _cloudwatch.Metric(
+                            namespace="AWS/Firehose",
+                            metric_name="DeliveryToElasticsearch.DataFreshness",
+                            dimensions={"DeliveryStreamName": stream_name},
+                            statistic="Maximum",
+                            label=f"{lane} oldest record age",
+                            period=core.Duration.minutes(1)
+                        ) for lane, stream_name in self.firehose_to_es.stream_names.items()
+                    ],
+                    width=12
+                )
+            )
+
+        if self.log_archive:
+            fluent_bit_dashboard.dashboard.add_widgets(
+                _cloudwatch.GraphWidget(
+                    title="Log archive, records to S3 as Parquet",
+                    left=[
+                        _cloudwatch.Metric(
+                            namespace="AWS/Firehose",
+                            metric_name=metric_name,
+                            dimensions={"DeliveryStreamName": stream_name},
+                            statistic="Sum",
+                            label=f"{lane} {label}",
+                            period=core.Duration.minutes(5)
+                        )
+                        for lane, stream_name in self.log_archive.stream_names.items()
+                        for metric_name, label in (
+                            ("DeliveryToS3.Records", "archived"),
+                            ("FailedConversion.Records", "failed conversion"),
+                        )
+                    ],
+                    right=[
+                        _cloudwatch.Metric(
+                            namespace="AWS/Firehose",
+                            metric_name="DeliveryToS3.DataFreshness",
+                            dimensions={"DeliveryStreamName": stream_name},
+                            statistic="Maximum",
+                            label=f"{lane} oldest record age",
+                            period=core.Duration.minutes(5)
+                        ) for lane, stream_name in self.log_archive.stream_names.items()
+                    ],
+                    width=24
+                )
+            )
+
+        if sampling.get("enabled", True):
+            fluent_bit_dashboard.dashboard.add_widgets(
+                _cloudwatch.GraphWidget(
+                    title="Success sampling rate, adapted to the output retries",
+                    left=[
+                        _cloudwatch.Metric(
+                            namespace=MonitoringArgs.METRIC_NAMESPACE,
+                            metric_name=MonitoringArgs.SAMPLING_RATE_METRIC,
+                            dimensions=tier_dimensions,
+                            statistic=stat,
+                            label=f"Sampling rate {stat}",
+                            period=core.Duration.minutes(1)
+                        ) for stat in ("Minimum", "Average")
+                    ],
+                    right=[
+                        _cloudwatch.Metric(
+                            namespace=MonitoringArgs.METRIC_NAMESPACE,
+                            metric_name=MonitoringArgs.RETRIES_METRIC,
+                            dimensions=tier_dimensions,
+                            statistic="Sum",
+                            label="Output retries",
+                            period=core.Duration.minutes(1)
+                        )
+                    ],
+                    width=24
+                )
+            )
+
+        if ingest_canary:
+            # Scheduled probe, publishes the log-to-searchable latency per router
+            ingest_canary_probe = CreateIngestCanaryProbe(
+                self,
+                "ingestCanaryProbe",
+                es_endpoint_param_name=es_endpoint_param_name,
+                es_index=RouterArgs.ES_INDEX,
+                canary_marker=CanaryArgs.MARKER,
+                metric_namespace=MonitoringArgs.METRIC_NAMESPACE
+            )
+            fluent_bit_dashboard.dashboard.add_widgets(
+                _cloudwatch.GraphWidget(
+                    title="Log to searchable latency, ingest canary",
+                    left=[
+                        _cloudwatch.Metric(
+                            namespace=MonitoringArgs.METRIC_NAMESPACE,
+                            metric_name="IngestLatency",
+                            statistic=stat,
+                            label=f"Latency {stat}",
+                            period=core.Duration.minutes(1)
+                        ) for stat in ("p50", "p99", "Maximum")
+                    ],
+                    right=[
+                        _cloudwatch.Metric(
+                            namespace=MonitoringArgs.METRIC_NAMESPACE,
+                            metric_name="FreshestCanaryAge",
+                            statistic="Maximum",
+                            label="Newest searchable canary age",
+                            period=core.Duration.minutes(1)
+                        )
+                    ],
+                    width=24
+                )
+            )
+
         ###########################################
         ################# OUTPUTS #################
         ###########################################
@@ -275,24 +553,6 @@ configure_fluent_bit >> "${LOG_FILE}"
             value=f"{GlobalArgs.SOURCE_INFO}",
             description="To know more about this automation stack, check out our github page."
         )
-        output_1 = core.CfnOutput(
-            self,
-            "FluentBitPrivateIp",
-            value=f"http://{self.fluent_bit_server.instance_private_ip}",
-            description=f"Private IP of Fluent Bit Server on EC2"
-        )
-        output_2 = core.CfnOutput(
-            self,
-            "FluentBitInstance",
-            value=(
-                f"https://console.aws.amazon.com/ec2/v2/home?region="
-                f"{core.Aws.REGION}"
-                f"#Instances:search="
-                f"{self.fluent_bit_server.instance_id}"
-                f";sort=instanceId"
-            ),
-            description=f"Login to the instance using Systems Manager and use curl to access the Instance"
-        )
         output_3 = core.CfnOutput(
             self,
             "AwsForFluentBit",
@@ -301,27 +561,100 @@ configure_fluent_bit >> "${LOG_FILE}"
             ),
             description=f"Amazon docs on fluent bit"
         )
-
-        output_4 = core.CfnOutput(
+        output_7 = core.CfnOutput(
             self,
-            "WebServerUrl",
-            value=f"{self.fluent_bit_server.instance_public_dns_name}",
-            description=f"Public IP of Web Server on EC2"
-        )
-        output_5 = core.CfnOutput(
-            self,
-            "GenerateAccessTraffic",
-            value=f"ab -n 10 -c 1 http://{self.fluent_bit_server.instance_public_dns_name}/",
-            description=f"Public IP of Web Server on EC2"
-        )
-        output_6 = core.CfnOutput(
-            self,
-            "GenerateFailedTraffic",
-            value=f"ab -n 10 -c 1 http://{self.fluent_bit_server.instance_public_dns_name}/${{RANDOM}}",
-            description=f"Public IP of Web Server on EC2"
+            "FluentBitDashboard",
+            value=(
+                f"https://console.aws.amazon.com/cloudwatch/home?region="
+                f"{core.Aws.REGION}"
+                f"#dashboards:name="
+                f"{fluent_bit_dashboard.get_dashboard_name}"
+            ),
+            description=f"Fluent Bit records in/out, retries & backlog next to the domain write thread pool"
         )
 
+        if self.firehose_to_es:
+            output_8 = core.CfnOutput(
+                self,
+                "FirehoseFailedDocumentsBucket",
+                value=(
+                    f"https://console.aws.amazon.com/s3/buckets/"
+                    f"{self.firehose_to_es.get_backup_bucket_name}"
+                ),
+                description=f"Documents Firehose could not deliver to Elasticsearch"
+            )
+
+        if self.log_archive:
+            output_9 = core.CfnOutput(
+                self,
+                "LogArchiveBucket",
+                value=(
+                    f"https://console.aws.amazon.com/s3/buckets/"
+                    f"{self.log_archive.get_archive_bucket_name}"
+                ),
+                description=f"Router logs archived as Snappy compressed Parquet"
+            )
+            output_10 = core.CfnOutput(
+                self,
+                "LogArchiveAthenaQuery",
+                value=(
+                    f"SELECT dt, lane, count(*) FROM {ArchiveArgs.DATABASE_NAME}.{ArchiveArgs.TABLE_NAME} "
+                    f"WHERE dt >= date_format(current_date - interval '30' day, '%Y-%m-%d') GROUP BY 1, 2 ORDER BY 1"
+                ),
+                description=f"Athena query over the last 30 days of the log archive"
+            )
+
+        if self.log_router_fleet:
+            output_1 = core.CfnOutput(
+                self,
+                "LogRouterFleet",
+                value=(
+                    f"https://console.aws.amazon.com/ec2autoscaling/home?region="
+                    f"{core.Aws.REGION}"
+                    f"#/details/"
+                    f"{self.log_router_fleet.get_asg_name}"
+                ),
+                description=f"Auto Scaling group of Fluent Bit log routers"
+            )
+        else:
+            output_1 = core.CfnOutput(
+                self,
+                "FluentBitPrivateIp",
+                value=f"http://{self.fluent_bit_server.instance_private_ip}",
+                description=f"Private IP of Fluent Bit Server on EC2"
+            )
+            output_2 = core.CfnOutput(
+                self,
+                "FluentBitInstance",
+                value=(
+                    f"https://console.aws.amazon.com/ec2/v2/home?region="
+                    f"{core.Aws.REGION}"
+                    f"#Instances:search="
+                    f"{self.fluent_bit_server.instance_id}"
+                    f";sort=instanceId"
+                ),
+                description=f"Login to the instance using Systems Manager and use curl to access the Instance"
+            )
+            output_4 = core.CfnOutput(
+                self,
+                "WebServerUrl",
+                value=f"{self.fluent_bit_server.instance_public_dns_name}",
+                description=f"Public IP of Web Server on EC2"
+            )
+            output_5 = core.CfnOutput(
+                self,
+                "GenerateAccessTraffic",
+                value=f"ab -n 10 -c 1 http://{self.fluent_bit_server.instance_public_dns_name}/",
+                description=f"Public IP of Web Server on EC2"
+            )
+            output_6 = core.CfnOutput(
+                self,
+                "GenerateFailedTraffic",
+                value=f"ab -n 10 -c 1 http://{self.fluent_bit_server.instance_public_dns_name}/${{RANDOM}}",
+                description=f"Public IP of Web Server on EC2"
+            )
+
     # properties to share with other stacks
     @property
     def get_inst_id(self):
-        return self.fluent_bit_server.instance_id
+        return self.fluent_bit_server.instance_id if self.fluent_bit_server else None
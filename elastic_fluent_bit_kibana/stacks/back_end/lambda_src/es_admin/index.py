@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
+
+import boto3
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    OWNER = "MystiqueAutomation"
+    ENVIRONMENT = "production"
+    MODULE_NAME = "es_admin"
+    VERSION = "2020_11_22"
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    # A freshly created domain can answer 5xx for a little while
+    RETRIES = 6
+    RETRY_WAIT_SECONDS = 10
+
+
+def set_logging(lv=GlobalArgs.LOG_LEVEL):
+    logging.basicConfig(level=lv)
+    logger = logging.getLogger()
+    logger.setLevel(lv)
+    return logger
+
+
+LOG = set_logging()
+_session = boto3.session.Session()
+
+
+class EsError(Exception):
+    def __init__(self, status: int, body: str):
+        super().__init__(f"{status}: {body}")
+        self.status = status
+        self.body = body
+
+
+def es_request(endpoint: str, method: str, path: str, body: dict = None) -> dict:
+    """
+    SigV4 signed request to the Elasticsearch domain, retried on 5xx
+    :raises EsError: on 4xx, or 5xx once the retries are used up
+    """
+    url = f"https://{endpoint}{path}"
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    for attempt in range(GlobalArgs.RETRIES):
+        req = AWSRequest(method=method, url=url, data=data, headers={"Content-Type": "application/json"})
+        SigV4Auth(_session.get_credentials(), "es", _session.region_name).add_auth(req)
+        signed = urllib.request.Request(url, data=data, headers=dict(req.headers), method=method)
+        try:
+            with urllib.request.urlopen(signed, timeout=30) as resp:
+                payload = resp.read().decode("utf-8")
+                return json.loads(payload) if payload else {}
+        except urllib.error.HTTPError as e:
+            err = EsError(e.code, e.read().decode("utf-8"))
+            if e.code < 500 or attempt == GlobalArgs.RETRIES - 1:
+                raise err
+            LOG.warning(f"{method} {path} failed with {err}, retrying")
+        except urllib.error.URLError as e:
+            if attempt == GlobalArgs.RETRIES - 1:
+                raise
+            LOG.warning(f"{method} {path} failed with {e}, retrying")
+        time.sleep(GlobalArgs.RETRY_WAIT_SECONDS)
+
+
+def exists(endpoint: str, path: str) -> bool:
+    try:
+        es_request(endpoint, "HEAD", path)
+        return True
+    except EsError as e:
+        if e.status == 404:
+            return False
+        raise
+
+
+def put_versioned(endpoint: str, path: str, body: dict) -> dict:
+    """
+    ISM policies & rollup jobs are versioned, an update must name the sequence number it replaces
+    """
+    try:
+        current = es_request(endpoint, "GET", path)
+    except EsError as e:
+        if e.status != 404:
+            raise
+        return es_request(endpoint, "PUT", path, body)
+    return es_request(
+        endpoint, "PUT",
+        f"{path}?if_seq_no={current['_seq_no']}&if_primary_term={current['_primary_term']}",
+        body
+    )
+
+
+def run_step(endpoint: str, step: dict) -> str:
+    if step.get("skip_if_exists") and exists(endpoint, step["skip_if_exists"]):
+        return f"skipped {step['path']}, {step['skip_if_exists']} exists"
+    if step.get("fail_if_exists") and exists(endpoint, step["fail_if_exists"]):
+        raise Exception(
+            f"{step['fail_if_exists']} already exists, remove or reindex it before applying {step['path']}")
+    if step["kind"] in ("ism_policy", "rollup_job"):
+        put_versioned(endpoint, step["path"], step["body"])
+    else:
+        es_request(endpoint, step["method"], step["path"], step.get("body"))
+    return f"applied {step['path']}"
+
+
+def lambda_handler(event, context):
+    """
+    Custom resource handler, applies the `Steps` to the domain in order on
+    create & update. Delete leaves the domain as is, the data outlives the stack.
+    """
+    LOG.info(json.dumps({k: v for k, v in event.items() if k != "ResponseURL"}))
+    props = event["ResourceProperties"]
+    physical_id = event.get("PhysicalResourceId", f"es-admin-{props['Endpoint']}")
+    if event["RequestType"] == "Delete":
+        return {"PhysicalResourceId": physical_id}
+
+    results = [run_step(props["Endpoint"], step) for step in json.loads(props["Steps"])]
+    LOG.info(json.dumps(results))
+    return {"PhysicalResourceId": physical_id, "Data": {"Applied": len(results)}}
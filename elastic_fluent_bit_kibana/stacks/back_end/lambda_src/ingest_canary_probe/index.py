@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import re
+import time
+import urllib.request
+
+import boto3
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+
+
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    OWNER = "MystiqueAutomation"
+    ENVIRONMENT = "production"
+    MODULE_NAME = "ingest_canary_probe"
+    VERSION = "2020_11_22"
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    ES_ENDPOINT_PARAM_NAME = os.getenv("ES_ENDPOINT_PARAM_NAME", "/miztiik-automation/es/endpoint")
+    ES_INDEX = os.getenv("ES_INDEX", "miztiik_automation")
+    CANARY_MARKER = os.getenv("CANARY_MARKER", "miztiik-ingest-canary")
+    METRIC_NAMESPACE = os.getenv("METRIC_NAMESPACE", "MiztiikAutomation/FluentBit")
+    # Poll for new markers this long, keep it under the function timeout
+    PROBE_SECONDS = int(os.getenv("PROBE_SECONDS", 50))
+    POLL_SECONDS = float(os.getenv("POLL_SECONDS", 2))
+    LOOKBACK_MINUTES = int(os.getenv("LOOKBACK_MINUTES", 15))
+
+
+MARKER_PATTERN = re.compile(r"id=(?P<id>\S+) emitted_ms=(?P<emitted_ms>\d+)")
+
+
+def set_logging(lv=GlobalArgs.LOG_LEVEL):
+    logging.basicConfig(level=lv)
+    logger = logging.getLogger()
+    logger.setLevel(lv)
+    return logger
+
+
+LOG = set_logging()
+_session = boto3.session.Session()
+_ssm = boto3.client("ssm")
+_cw = boto3.client("cloudwatch")
+
+
+def es_request(endpoint: str, method: str, path: str, body: dict = None) -> dict:
+    """
+    SigV4 signed request to the Elasticsearch domain
+    """
+    url = f"https://{endpoint}{path}"
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = AWSRequest(method=method, url=url, data=data, headers={"Content-Type": "application/json"})
+    SigV4Auth(_session.get_credentials(), "es", _session.region_name).add_auth(req)
+    signed = urllib.request.Request(url, data=data, headers=dict(req.headers), method=method)
+    with urllib.request.urlopen(signed, timeout=10) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def searchable_markers(endpoint: str) -> dict:
+    """
+    :return: Searchable canary markers, `{marker_id: (router, emitted_ms)}`
+    """
+    query = {
+        "size": 1000,
+        "_source": ["log", "hostname"],
+        "query": {
+            "bool": {
+                "filter": [
+                    {"match_phrase": {"log": GlobalArgs.CANARY_MARKER}},
+                    {"range": {"@timestamp": {"gte": f"now-{GlobalArgs.LOOKBACK_MINUTES}m"}}},
+                ]
+            }
+        },
+    }
+    resp = es_request(endpoint, "POST", f"/{GlobalArgs.ES_INDEX}*/_search", query)
+    markers = {}
+    for hit in resp.get("hits", {}).get("hits", []):
+        src = hit.get("_source", {})
+        m = MARKER_PATTERN.search(src.get("log", ""))
+        if m:
+            markers[m.group("id")] = (src.get("hostname", "unknown"), int(m.group("emitted_ms")))
+    return markers
+
+
+def publish(latencies: dict, freshest: dict, now_ms: int):
+    """
+    Per router metrics, plus fleet wide ones without the `Router` dimension for alarms
+    """
+    metric_data = []
+    for router, values in latencies.items():
+        for v in values:
+            metric_data.append({
+                "MetricName": "IngestLatency",
+                "Dimensions": [{"Name": "Router", "Value": router}],
+                "Value": v,
+                "Unit": "Milliseconds",
+            })
+            metric_data.append({"MetricName": "IngestLatency", "Value": v, "Unit": "Milliseconds"})
+    for router, emitted_ms in freshest.items():
+        age = (now_ms - emitted_ms) / 1000
+        metric_data.append({
+            "MetricName": "FreshestCanaryAge",
+            "Dimensions": [{"Name": "Router", "Value": router}],
+            "Value": age,
+            "Unit": "Seconds",
+        })
+    if freshest:
+        metric_data.append({
+            "MetricName": "FreshestCanaryAge",
+            "Value": (now_ms - min(freshest.values())) / 1000,
+            "Unit": "Seconds",
+        })
+    # PutMetricData takes at most 20 metrics per call
+    for i in range(0, len(metric_data), 20):
+        _cw.put_metric_data(Namespace=GlobalArgs.METRIC_NAMESPACE, MetricData=metric_data[i:i + 20])
+
+
+def lambda_handler(event, context):
+    resp = {"status": False, "latencies": {}}
+    endpoint = _ssm.get_parameter(Name=GlobalArgs.ES_ENDPOINT_PARAM_NAME)["Parameter"]["Value"]
+
+    # Markers searchable already were measured by an earlier run, only time the new ones
+    seen = searchable_markers(endpoint)
+    latencies = {}
+    deadline = time.time() + GlobalArgs.PROBE_SECONDS
+    while time.time() < deadline:
+        time.sleep(GlobalArgs.POLL_SECONDS)
+        now_ms = int(time.time() * 1000)
+        markers = searchable_markers(endpoint)
+        for marker_id, (router, emitted_ms) in markers.items():
+            if marker_id not in seen:
+                latencies.setdefault(router, []).append(now_ms - emitted_ms)
+        seen.update(markers)
+
+    # Age of the newest searchable marker, catches lags longer than one probe run
+    freshest = {}
+    for router, emitted_ms in seen.values():
+        freshest[router] = max(freshest.get(router, 0), emitted_ms)
+    publish(latencies, freshest, int(time.time() * 1000))
+
+    LOG.info(json.dumps({"latencies_ms": latencies, "freshest_emitted_ms": freshest}))
+    resp["status"] = True
+    resp["latencies"] = latencies
+    return resp
@@ -1,6 +1,9 @@
 from aws_cdk import aws_ec2 as _ec2
+from aws_cdk import aws_ssm as _ssm
 from aws_cdk import core
 
+from elastic_fluent_bit_kibana.constructs.create_ssm_parameter_construct import CreateSsmStringParameter
+
 
 class GlobalArgs:
     """
@@ -13,6 +16,12 @@ class GlobalArgs:
     SOURCE_INFO = f"https://github.com/miztiik/{REPO_NAME}"
     VERSION = "2020_11_22"
     MIZTIIK_SUPPORT_EMAIL = ["mystique@example.com", ]
+    MAX_AZS = 2
+    # Published for the stacks synthesized without this one, see `import_vpc`
+    VPC_ID_PARAM_NAME = "/miztiik-automation/vpc/id"
+    VPC_CIDR_PARAM_NAME = "/miztiik-automation/vpc/cidr"
+    VPC_AZS_PARAM_NAME = "/miztiik-automation/vpc/azs"
+    VPC_PUBLIC_SUBNETS_PARAM_NAME = "/miztiik-automation/vpc/public-subnet-ids"
 
 
 class VpcStack(core.Stack):
@@ -37,7 +46,7 @@ class VpcStack(core.Stack):
                 self,
                 "miztiikLogProcessorVpc",
                 cidr="10.10.0.0/16",
-                max_azs=2,
+                max_azs=GlobalArgs.MAX_AZS,
                 nat_gateways=0,
                 enable_dns_support=True,
                 enable_dns_hostnames=True,
@@ -54,6 +63,23 @@ class VpcStack(core.Stack):
                 ]
             )
 
+        # Let the other stacks import the VPC when they are synthesized on their own
+        for param_id, param_name, param_desc, param_value in (
+            ("vpcIdSsmParameter", GlobalArgs.VPC_ID_PARAM_NAME, "VPC Id", self.vpc.vpc_id),
+            ("vpcCidrSsmParameter", GlobalArgs.VPC_CIDR_PARAM_NAME, "VPC CIDR", self.vpc.vpc_cidr_block),
+            ("vpcAzsSsmParameter", GlobalArgs.VPC_AZS_PARAM_NAME, "VPC AZs, comma separated",
+             core.Fn.join(",", self.vpc.availability_zones)),
+            ("vpcPublicSubnetsSsmParameter", GlobalArgs.VPC_PUBLIC_SUBNETS_PARAM_NAME,
+             "VPC public subnet ids, comma separated", core.Fn.join(",", self.get_vpc_public_subnet_ids)),
+        ):
+            CreateSsmStringParameter(
+                self,
+                param_id,
+                _param_desc=param_desc,
+                _param_name=param_name,
+                _param_value=param_value
+            )
+
         output_0 = core.CfnOutput(
             self,
             "AutomationFrom",
@@ -77,3 +103,24 @@ class VpcStack(core.Stack):
         return self.vpc.select_subnets(
             subnet_type=_ec2.SubnetType.PRIVATE
         ).subnet_ids
+
+
+def import_vpc(scope: core.Construct, max_azs: int = GlobalArgs.MAX_AZS) -> _ec2.IVpc:
+    """
+    Stand-in for `VpcStack.vpc` when the VPC stack is not synthesized, built
+    from the SSM parameters the deployed VPC stack published. Only the public
+    subnets, the ones the routers & aggregators launch in, are imported.
+    """
+    def _param(name):
+        return _ssm.StringParameter.value_for_string_parameter(scope, name)
+
+    azs = _param(GlobalArgs.VPC_AZS_PARAM_NAME)
+    public_subnets = _param(GlobalArgs.VPC_PUBLIC_SUBNETS_PARAM_NAME)
+    return _ec2.Vpc.from_vpc_attributes(
+        scope,
+        "importedVpc",
+        vpc_id=_param(GlobalArgs.VPC_ID_PARAM_NAME),
+        vpc_cidr_block=_param(GlobalArgs.VPC_CIDR_PARAM_NAME),
+        availability_zones=[core.Fn.select(i, core.Fn.split(",", azs)) for i in range(max_azs)],
+        public_subnet_ids=[core.Fn.select(i, core.Fn.split(",", public_subnets)) for i in range(max_azs)]
+    )
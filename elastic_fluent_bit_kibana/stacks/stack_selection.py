@@ -0,0 +1,30 @@
+class GlobalArgs:
+    """
+    Helper to define global statics
+    """
+
+    CONTEXT_KEY = "stacks"
+    ALL = "all"
+    # Short names accepted in `-c stacks=`, in deployment order
+    STACK_KEYS = ("vpc", "cognito", "es", "router-ami", "fluent-bit-aggregator", "fluent-bit")
+
+
+def selected_stacks(selection) -> set:
+    """
+    Stacks to construct & synthesize. The others are not built at all, the
+    stacks that depend on them import their outputs from SSM instead.
+    :param selection: The `stacks` context key, `all`, a comma separated
+                      string like `es,fluent-bit` or a list
+    """
+    if selection is None or selection == GlobalArgs.ALL:
+        return set(GlobalArgs.STACK_KEYS)
+    if isinstance(selection, str):
+        selection = selection.split(",")
+    names = {str(s).strip() for s in selection if str(s).strip()}
+    if GlobalArgs.ALL in names:
+        return set(GlobalArgs.STACK_KEYS)
+    unknown = sorted(names - set(GlobalArgs.STACK_KEYS))
+    if unknown or not names:
+        raise ValueError(
+            f"stacks '{','.join(sorted(names))}' must be {GlobalArgs.ALL} or from {GlobalArgs.STACK_KEYS}")
+    return names